@@ -1,10 +1,26 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
-from models.database import db, Product, Customer, Bill, BillItem, Coupon, Offer, Transaction, InventoryLog
+from models.database import db, enable_wal, Product, Customer, Bill, BillItem, Coupon, Offer, Transaction, InventoryLog
 from routes.products import products_bp
 from routes.bills import bills_bp
 from routes.customers import customers_bp
 from routes.discounts import discounts_bp
+from routes.catalog import catalog_bp
+from routes.events import events_bp
+from routes.reports import reports_bp
+from routes.admin import admin_bp
+from routes.stores import stores_bp
+from routes.taxes import taxes_bp
+from commands import register_commands
+from services.analytics import resolve_window
+from services.reports import report_executor, dashboard_sections
+from services.backup import backup_metrics, start_backup_scheduler
+from services.profiling import request_profiler
+from services.slow_queries import slow_query_log
+from services.loyalty import start_loyalty_reconciler
+from services.inventory import start_inventory_snapshotter
+from services.replication import start_catalog_replicator
+from services.stores import configure_stores, select_store, use_store, init_store_schema, StoreError, STORE_HEADER
 import os
 from datetime import datetime
 
@@ -12,19 +28,55 @@ app = Flask(__name__)
 
 # Configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'supermart.db')
+# Databases, archives, backups and profiles live here; SUPERMART_DATA_DIR moves them (the tests use a scratch directory)
+datadir = os.environ.get('SUPERMART_DATA_DIR', basedir)
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(datadir, 'supermart.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JSON_SORT_KEYS'] = False
+app.config['COLUMNAR_DIR'] = os.path.join(datadir, 'columnar')
+app.config['ARCHIVE_DIR'] = os.path.join(datadir, 'archive')
+app.config['BACKUP_DIR'] = os.path.join(datadir, 'backups')
+app.config['BACKUP_INTERVAL_MINUTES'] = 60
+app.config['LOYALTY_RECONCILE_SECONDS'] = 30
+app.config['INVENTORY_SNAPSHOT_HOURS'] = 24
+app.config['STORE_DB_DIR'] = os.path.join(datadir, 'stores')
+# Head office catalog to replicate from: a server URL, or store:<id> for a store served here
+app.config['CATALOG_SOURCE'] = os.environ.get('SUPERMART_CATALOG_SOURCE', '')
+app.config['CATALOG_PULL_SECONDS'] = 5
+# On-demand request profiles (X-Profile header or /api/admin/profiling), newest PROFILE_KEEP kept
+app.config['PROFILE_DIR'] = os.path.join(datadir, 'profiles')
+app.config['PROFILE_KEEP'] = 50
+app.config['PROFILE_MAX_PER_MINUTE'] = 6
+# Statements at least this slow are aggregated, with their query plan, at /api/admin/slow-queries
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SUPERMART_SLOW_QUERY_MS', 50))
+app.config['SLOW_QUERY_EXPLAIN'] = True
+
+# One SQLite database per store, so each branch's lanes only contend with each other
+configure_stores(app, os.environ.get('SUPERMART_STORES', '').split(','))
 
 # Initialize extensions
 db.init_app(app)
-CORS(app)
+with app.app_context():
+    enable_wal()
+CORS(app, expose_headers=['ETag', 'Last-Modified', 'X-Profile-Capture', 'X-Profile-Skipped'])
+backup_metrics.init_app(app)
+request_profiler.init_app(app)
+slow_query_log.init_app(app)
 
 # Register blueprints
 app.register_blueprint(products_bp)
 app.register_blueprint(bills_bp)
 app.register_blueprint(customers_bp)
 app.register_blueprint(discounts_bp)
+app.register_blueprint(catalog_bp)
+app.register_blueprint(events_bp)
+app.register_blueprint(reports_bp)
+app.register_blueprint(admin_bp)
+app.register_blueprint(stores_bp)
+app.register_blueprint(taxes_bp)
+
+# CLI commands
+register_commands(app)
 
 # Health check
 @app.route('/api/health', methods=['GET'])
@@ -37,11 +89,19 @@ def init_db():
     """Initialize database on first request"""
     pass
 
+@app.before_request
+def route_store():
+    """Send the request's queries to the store named by X-Store-Id (or ?store=), the default store otherwise"""
+    try:
+        select_store(request.headers.get(STORE_HEADER) or request.args.get('store'))
+    except StoreError as e:
+        return jsonify({'error': e.message}), e.status
+
 @app.route('/api/init-db', methods=['POST'])
 def initialize_database():
     """Initialize database with sample data"""
     try:
-        db.create_all()
+        init_store_schema()
         
         # Check if data already exists
         if Product.query.first():
@@ -126,46 +186,34 @@ def internal_error(error):
 # Dashboard stats
 @app.route('/api/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
-    """Get dashboard statistics"""
-    from sqlalchemy import func
-    from datetime import datetime, timedelta
-    
-    today = datetime.utcnow().date()
-    
-    # Today's stats
-    today_bills = Bill.query.filter(
-        func.date(Bill.created_at) == today,
-        Bill.status == 'completed'
-    ).all()
-    
-    today_sales = sum(b.total for b in today_bills)
-    today_transactions = len(today_bills)
-    
-    # Get total products and customers
-    total_products = Product.query.count()
-    total_customers = Customer.query.count()
+    """Get dashboard statistics, each section read in parallel"""
+    # Top selling products from daily aggregates, completed bills only
+    top_window = request.args.get('top_window', '30d')
+    try:
+        start_day, end_day = resolve_window(top_window)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Get top selling products
-    top_products = db.session.query(
-        Product.name,
-        func.sum(BillItem.quantity).label('total_qty')
-    ).join(BillItem).group_by(Product.id).order_by(func.sum(BillItem.quantity).desc()).limit(5).all()
+    data, sections = report_executor.run(dashboard_sections(start_day, end_day), params=(top_window,))
     
     return jsonify({
         'success': True,
-        'data': {
-            'today': {
-                'sales': today_sales,
-                'transactions': today_transactions,
-                'average_bill': today_sales / today_transactions if today_transactions > 0 else 0
-            },
-            'total_products': total_products,
-            'total_customers': total_customers,
-            'top_products': [{'name': p[0], 'quantity': p[1]} for p in top_products]
-        }
+        'data': data,
+        'sections': sections
     })
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
+    for store in app.config['STORES']:
+        with use_store(store, app):
+            init_store_schema()
+    # Only the reloader's child process serves requests, so run background jobs there
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        if app.config['BACKUP_INTERVAL_MINUTES']:
+            start_backup_scheduler(app, app.config['BACKUP_INTERVAL_MINUTES'])
+        if app.config['LOYALTY_RECONCILE_SECONDS']:
+            start_loyalty_reconciler(app, app.config['LOYALTY_RECONCILE_SECONDS'])
+        if app.config['INVENTORY_SNAPSHOT_HOURS']:
+            start_inventory_snapshotter(app, app.config['INVENTORY_SNAPSHOT_HOURS'])
+        if app.config['CATALOG_SOURCE'] and app.config['CATALOG_PULL_SECONDS']:
+            start_catalog_replicator(app, app.config['CATALOG_SOURCE'], app.config['CATALOG_PULL_SECONDS'])
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,78 @@
+"""ASGI entry point serving the read-heavy endpoints to many mostly idle connections.
+
+Run from backend/ alongside the main server: uvicorn asgi:app --port 5001
+
+Open connections are held by the event loop instead of a thread each. A
+request only takes a thread from a bounded pool while the Flask app serves
+it, with its own session and pooled WAL connection, so responses (ETags,
+store routing, CORS) are the same as from the main server. Writes, the
+event stream and everything else stay on the main server.
+"""
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Response
+from app import app as flask_app
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import re
+
+READ_THREADS = 16
+
+READ_ROUTES = [re.compile(pattern) for pattern in (
+    r'^/api/products/barcode/[^/]+$',
+    r'^/api/products/search$',
+    r'^/api/customers/search$',
+    r'^/api/customers/mobile/[^/]+$',
+    r'^/api/discounts/offers(/[^/]+)?$',
+    r'^/api/catalog/snapshot$',
+    r'^/api/dashboard/stats$',
+    r'^/api/health$'
+)]
+
+NOT_SERVED = b'{"error": "Not served on the read path, use the main server"}'
+
+_pool = ThreadPoolExecutor(max_workers=READ_THREADS, thread_name_prefix='asgi-read')
+
+def is_read_route(method, path):
+    return method in ('GET', 'HEAD', 'OPTIONS') and any(route.match(path) for route in READ_ROUTES)
+
+def serve(scope):
+    """Run one request through the Flask app on a pool thread; returns the buffered response"""
+    client = scope.get('client') or ('127.0.0.1', 0)
+    environ = EnvironBuilder(
+        path=scope['path'],
+        method=scope['method'],
+        headers=[(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']],
+        query_string=scope['query_string'].decode('latin-1'),
+        environ_base={'REMOTE_ADDR': client[0]}
+    ).get_environ()
+    
+    return Response.from_app(flask_app.wsgi_app, environ, buffered=True)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    
+    if is_read_route(scope['method'], scope['path']):
+        response = await asyncio.get_running_loop().run_in_executor(_pool, serve, scope)
+        status, headers, body = response.status_code, response.headers.to_wsgi_list(), response.get_data()
+    else:
+        status, headers, body = 404, [('Content-Type', 'application/json')], NOT_SERVED
+    
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
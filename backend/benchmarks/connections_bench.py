@@ -0,0 +1,97 @@
+"""Read latency while many idle connections are held open, sync server against the async read path.
+
+Start the servers from backend/ first, e.g.
+    python app.py                                   # sync, port 5000
+    uvicorn asgi:app --port 5001                    # async read path
+then: python benchmarks/connections_bench.py --url http://127.0.0.1:5000 --url http://127.0.0.1:5001
+
+Idle connections send a partial request and wait, as a scanner or back-office
+screen with a keep-alive connection would. A server with a thread per
+connection spends a thread on each; under a fixed thread count (gunicorn
+--threads N) the active clients then queue behind them.
+"""
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import time
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else float('nan')
+
+async def hold(host, port, seconds, held):
+    """Open a connection, start a request and stall until the run ends"""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(f'GET /api/health HTTP/1.1\r\nHost: {host}\r\n'.encode())
+        await writer.drain()
+        held.append(1)
+        await asyncio.sleep(seconds)
+        writer.close()
+    except OSError:
+        pass
+
+async def fetch(host, port, path, timeout):
+    """One request on a fresh connection; returns latency in ms or None on failure"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        if b' 200 ' not in status:
+            return None
+    except (OSError, asyncio.TimeoutError):
+        return None
+    return (time.perf_counter() - started) * 1000
+
+async def client(host, port, path, requests, timeout, latencies, failures):
+    for _ in range(requests):
+        latency = await fetch(host, port, path, timeout)
+        if latency is None:
+            failures.append(1)
+        else:
+            latencies.append(latency)
+
+async def run(url, args):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    
+    held = []
+    holders = [asyncio.create_task(hold(host, port, args.hold_seconds, held)) for _ in range(args.idle)]
+    await asyncio.sleep(1)
+    
+    latencies, failures = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, args.path, args.requests, args.timeout, latencies, failures)
+        for _ in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - started
+    
+    for task in holders:
+        task.cancel()
+    await asyncio.gather(*holders, return_exceptions=True)
+    
+    latencies.sort()
+    print(f'{url:<28} idle {len(held):>5}  ok {len(latencies):>6}  failed {len(failures):>5}  '
+          f'{len(latencies) / elapsed:>8,.0f} req/s  p50 {percentile(latencies, 50):>7.1f} ms  '
+          f'p95 {percentile(latencies, 95):>7.1f} ms  p99 {percentile(latencies, 99):>7.1f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', action='append', required=True, help='Server to measure, repeatable')
+    parser.add_argument('--path', default='/api/products/barcode/1001')
+    parser.add_argument('--idle', type=int, default=500, help='Idle connections held open during the run')
+    parser.add_argument('--clients', type=int, default=50, help='Concurrent active clients')
+    parser.add_argument('--requests', type=int, default=40, help='Requests per active client')
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--hold-seconds', type=float, default=120.0)
+    args = parser.parse_args()
+    
+    for url in args.url:
+        asyncio.run(run(url, args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Quotes per second for the pricing engine, read-only against the configured database.
+
+Run from backend/: python benchmarks/quote_bench.py [--carts 200] [--items 8] [--rounds 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models.database import Product
+from services.pricing import pricing_catalog, price_cart, price_line
+
+def make_carts(product_ids, count, items, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'items': [{
+            'product_id': product_id,
+            'quantity': rng.randint(1, 4),
+            'discount': 0
+        } for product_id in rng.sample(product_ids, min(items, len(product_ids)))]
+    } for _ in range(count)]
+
+def rate(label, carts, rounds, run):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {carts * rounds / elapsed:>12,.0f} quotes/s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--carts', type=int, default=200)
+    parser.add_argument('--items', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    
+    with app.app_context():
+        product_ids = [p.id for p in Product.query.with_entities(Product.id).all()]
+        if not product_ids:
+            sys.exit('No products; POST /api/init-db first')
+        
+        carts = make_carts(product_ids, args.carts, args.items)
+        snapshot = pricing_catalog.snapshot()
+        client = app.test_client()
+        
+        rate('price_cart, no memo', args.carts, args.rounds,
+             lambda: [price_cart(snapshot, c['items'], line_pricer=price_line) for c in carts])
+        rate('price_cart, memoized lines', args.carts, args.rounds,
+             lambda: [pricing_catalog.quote(c, snapshot) for c in carts])
+        rate('snapshot check + quote', args.carts, args.rounds,
+             lambda: [pricing_catalog.quote(c) for c in carts])
+        rate('POST /api/bills/quote', args.carts, args.rounds,
+             lambda: client.post('/api/bills/quote', json={'carts': carts}))
+
+if __name__ == '__main__':
+    main()
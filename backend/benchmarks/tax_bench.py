@@ -0,0 +1,70 @@
+"""Pricing and GST breakup of large baskets, flat default rate against per-category slabs.
+
+Run from backend/: python benchmarks/tax_bench.py [--lines 100 --lines 1000 --lines 5000] [--rounds 20]
+
+Runs on an in-memory catalog, so no database is needed. The difference
+between the two rows of a size is the cost of looking up each line's slab
+and keeping the per-slab totals.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pricing import CatalogSnapshot, ProductPrice, price_cart, price_line
+from services.tax import TaxTable, TaxSlab, GST_SLABS
+
+CATEGORIES = 40
+PRODUCTS = 20000
+
+def make_snapshot(taxes, seed=7):
+    rng = random.Random(seed)
+    products = {
+        str(i): ProductPrice(str(i), f'Product {i}', f'Category {i % CATEGORIES}', round(rng.uniform(5, 500), 2))
+        for i in range(PRODUCTS)
+    }
+    return CatalogSnapshot({}, products, {}, {}, None, None, taxes)
+
+def slab_table(seed=7):
+    rng = random.Random(seed)
+    return TaxTable({
+        f'Category {i}': TaxSlab(rng.choice(GST_SLABS), f'{rng.randint(1000, 9999)}') for i in range(CATEGORIES)
+    })
+
+def make_basket(lines, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'product_id': product_id,
+        'quantity': rng.randint(1, 6),
+        'discount': 0
+    } for product_id in rng.sample([str(i) for i in range(PRODUCTS)], lines)]
+
+def rate(label, lines, rounds, run):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {lines:>6} lines  {elapsed / rounds * 1000:>8.2f} ms/basket  '
+          f'{lines * rounds / elapsed:>12,.0f} lines/s')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, action='append', help='Basket size, repeatable')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    
+    flat = make_snapshot(TaxTable())
+    slabs = make_snapshot(slab_table())
+    
+    for lines in args.lines or [100, 1000, 5000]:
+        basket = make_basket(lines)
+        rate('flat default rate', lines, args.rounds,
+             lambda: price_cart(flat, basket, discount=50, line_pricer=price_line))
+        rate('per-category slabs', lines, args.rounds,
+             lambda: price_cart(slabs, basket, discount=50, line_pricer=price_line))
+
+if __name__ == '__main__':
+    main()
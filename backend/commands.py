@@ -0,0 +1,232 @@
+from models.database import DEFAULT_STORE
+from services.stores import use_store, store_dir, store_ids, normalize_store
+from datetime import datetime
+import click
+import functools
+
+def store_option(command):
+    """Add --store and run the command against that store's database"""
+    @click.option('--store', default=DEFAULT_STORE, show_default=True, help='Store whose database to use')
+    @functools.wraps(command)
+    def run(store, **kwargs):
+        if normalize_store(store) not in store_ids():
+            raise click.ClickException(f"Unknown store {store}, expected any of {', '.join(store_ids())}")
+        
+        with use_store(store):
+            return command(**kwargs)
+    return run
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI"""
+    
+    @app.cli.command('init-stores')
+    def init_stores():
+        """Create missing tables and indexes in every configured store's database"""
+        from services.stores import init_store_schema
+        
+        for store in store_ids():
+            with use_store(store):
+                init_store_schema()
+            click.echo(f'{store}: ready')
+    
+    @app.cli.command('rebuild-sales')
+    @store_option
+    @click.option('--since', help='Only rebuild days from this ISO date on')
+    def rebuild_sales(since):
+        """Recompute per-product daily sales aggregates from bills"""
+        from services.analytics import rebuild_daily_sales
+        
+        since_day = datetime.fromisoformat(since).date() if since else None
+        groups = rebuild_daily_sales(since_day)
+        click.echo(f'Rebuilt {groups} product-day aggregates')
+    
+    @app.cli.command('export-columnar')
+    @store_option
+    @click.option('--include-today', is_flag=True, help='Also snapshot the current (open) day')
+    @click.option('--rebuild', is_flag=True, help='Drop the store and export all days again')
+    def export_columnar(include_today, rebuild):
+        """Append days missing from the columnar reporting snapshot"""
+        from services.columnar import ColumnarStore
+        
+        store = ColumnarStore(store_dir('COLUMNAR_DIR'))
+        for day in store.export_pending(include_today=include_today, rebuild=rebuild):
+            click.echo(f"{day['day']}: {day['bills']} bills, {day['items']} items")
+    
+    @app.cli.command('backup')
+    @store_option
+    def backup():
+        """Take an online, compressed and checksummed backup of the live database"""
+        from services.backup import create_backup
+        
+        manifest = create_backup(store_dir('BACKUP_DIR'))
+        click.echo(f"{manifest['file']}: {manifest['pages']} pages, "
+                   f"{manifest['duration_ms']} ms, sha256 {manifest['sha256']}")
+    
+    @app.cli.command('verify-backup')
+    @store_option
+    @click.argument('name', required=False)
+    def verify_backup_command(name):
+        """Restore a backup (latest by default) into a scratch file and verify it"""
+        from services.backup import verify_backup, BackupError
+        
+        try:
+            result = verify_backup(store_dir('BACKUP_DIR'), name)
+        except BackupError as e:
+            raise click.ClickException(e.message)
+        
+        click.echo(f"{result['name']}: " + ', '.join(f"{k} {'ok' if v else 'FAILED'}" for k, v in result['checks'].items()))
+        if not result['ok']:
+            raise click.ClickException('Backup verification failed')
+    
+    @app.cli.command('reconcile-loyalty')
+    @store_option
+    def reconcile_loyalty():
+        """Fold pending loyalty ledger entries into cached customer balances"""
+        from services.loyalty import reconcile_balances
+        
+        click.echo(f'Applied {reconcile_balances()} ledger entries')
+    
+    @app.cli.command('reconcile-payments')
+    @store_option
+    @click.option('--date', help='ISO date to reconcile, defaults to today')
+    def reconcile_payments(date):
+        """Print the end-of-day tender reconciliation"""
+        from services.payments import reconcile_day
+        
+        report = reconcile_day(datetime.fromisoformat(date).date() if date else datetime.utcnow().date())
+        for tender in report['tenders']:
+            click.echo(f"{tender['payment_mode']:<8} {tender['transactions']:>5} tenders {tender['amount']:>12.2f}")
+        click.echo(f"Tendered {report['tendered']:.2f}, billed {report['billed']:.2f}, "
+                   f"outstanding {report['outstanding']:.2f} on {report['unpaid_bills']} bills")
+    
+    @app.cli.command('snapshot-inventory')
+    @store_option
+    def snapshot_inventory():
+        """Write per-product ledger stock snapshots and report drift from products.quantity"""
+        from services.inventory import take_snapshot
+        
+        written, mismatches = take_snapshot()
+        click.echo(f'Wrote {written} stock snapshots')
+        for mismatch in mismatches:
+            click.echo(f"{mismatch['product_id']}: quantity is {mismatch['drift']:+d} off the ledger")
+    
+    @app.cli.command('reconcile-inventory')
+    @store_option
+    def reconcile_inventory():
+        """List products whose quantity disagrees with the inventory ledger"""
+        from services.inventory import reconcile_stock
+        
+        result = reconcile_stock()
+        mismatches = result['mismatches']
+        for mismatch in mismatches:
+            click.echo(f"{mismatch['name']:<30} quantity {mismatch['quantity']:>6}, ledger {mismatch['ledger_quantity']:>6} ({mismatch['drift']:+d})")
+        if result['unanchored']:
+            click.echo(f"{len(result['unanchored'])} products have no snapshot or opening entry and were not checked; "
+                       'run snapshot-inventory to anchor them')
+        if mismatches:
+            raise click.ClickException(f'{len(mismatches)} products drifted from the ledger')
+        click.echo('Stock matches the ledger' + (' for the rest' if result['unanchored'] else ''))
+    
+    @app.cli.command('pull-catalog')
+    @store_option
+    @click.option('--source', help='Server URL or store:<id> to pull from (default CATALOG_SOURCE)')
+    def pull_catalog_command(source):
+        """Apply product, offer and coupon changes from the head office catalog"""
+        from flask import current_app
+        from services.replication import pull_catalog, ReplicationError
+        
+        source = source or current_app.config['CATALOG_SOURCE']
+        if not source:
+            raise click.ClickException('No source given and CATALOG_SOURCE is not set')
+        
+        try:
+            result = pull_catalog(source)
+        except ReplicationError as e:
+            raise click.ClickException(e.message)
+        
+        applied = ', '.join(f'{count} {entity}' for entity, count in result['applied'].items())
+        click.echo(f"{source}: {result['pages']} pages up to {result['cursor']}, applied {applied}")
+    
+    @app.cli.command('verify-bill-log')
+    @store_option
+    @click.option('--segment', type=int, default=0, show_default=True, help='First segment to check')
+    def verify_bill_log(segment):
+        """Recompute the bill log's hash chain and check every sealed segment"""
+        from services.bill_log import verify_chain
+        
+        result = verify_chain(segment)
+        if not result['ok']:
+            raise click.ClickException(f"Chain broken at event {result['broken_at']}: {result.get('error', 'hash mismatch')}")
+        click.echo(f"{result['events']} events, {result['segments']} sealed segments, head {result['head']}")
+    
+    @app.cli.command('replay-bill-log')
+    @store_option
+    @click.option('--date', help='Audit the bills of this ISO date against their rows')
+    def replay_bill_log(date):
+        """Rebuild every bill's state from the log, or audit one day's bills"""
+        from services.bill_log import replay, audit_day
+        import time
+        
+        if date:
+            result = audit_day(datetime.fromisoformat(date).date())
+            click.echo(f"{result['day']}: {result['bills']} bills, {result['matched']} match the log, "
+                       f"{len(result['mismatches'])} differ, {len(result['unlogged'])} not logged")
+            for mismatch in result['mismatches']:
+                click.echo(f"  {mismatch['bill_id']}: {mismatch['differences']}")
+            return
+        
+        started = time.perf_counter()
+        states, events = replay()
+        elapsed = time.perf_counter() - started
+        click.echo(f'{events} events replayed into {len(states)} bills in {elapsed:.2f}s '
+                   f'({events / elapsed if elapsed else 0:,.0f} events/s)')
+    
+    @app.cli.command('backfill-bill-log')
+    @store_option
+    def backfill_bill_log_command():
+        """Log a snapshot of each bill made before the bill log existed"""
+        from services.bill_log import backfill_bill_log
+        
+        click.echo(f'Logged {backfill_bill_log()} bills')
+    
+    @app.cli.command('archive')
+    @store_option
+    @click.option('--keep-months', default=3, show_default=True, help='Months (including the current one) kept live')
+    @click.option('--month', help='Archive only this closed YYYY-MM month')
+    @click.option('--vacuum', is_flag=True, help='VACUUM the live database afterwards')
+    def archive(keep_months, month, vacuum):
+        """Move bills of closed months into per-month archive databases"""
+        from services.archive import archivable_months, archive_month, vacuum_live
+        
+        for name in [month] if month else archivable_months(keep_months):
+            try:
+                moved = archive_month(name)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            click.echo(f"{name}: {moved['bills']} bills, {moved['bill_items']} items, "
+                       f"{moved['transactions']} transactions, {moved['inventory_logs']} inventory logs")
+        
+        if vacuum:
+            vacuum_live()
+            click.echo('Vacuumed live database')
+    
+    @app.cli.command('generate-data')
+    @store_option
+    @click.option('--products', default=100000, show_default=True, help='Catalog size')
+    @click.option('--customers', default=1000000, show_default=True, help='Loyalty members')
+    @click.option('--days', default=730, show_default=True, help='Days of trading history, ending yesterday')
+    @click.option('--bills-per-day', default=1000, show_default=True, help='Average bills a day before season and growth')
+    @click.option('--seed', default=42, show_default=True, help='Random seed; the same seed gives the same data')
+    def generate_data(products, customers, days, bills_per_day, seed):
+        """Fill a store with a synthetic catalog, customers and trading history for scale testing"""
+        from services.synthetic import SyntheticStore, GeneratorError
+        
+        generator = SyntheticStore(products, customers, days, bills_per_day, seed=seed, progress=click.echo)
+        try:
+            result = generator.generate()
+        except GeneratorError as e:
+            raise click.ClickException(e.message)
+        
+        click.echo(f"{result['start']} to {result['end']}: {result['products']} products, {result['customers']} customers, "
+                   f"{result['bills']} bills, {result['bill_items']} items, {result['returns']} returns, "
+                   f"{result['inventory_logs']} inventory logs in {result['seconds']}s")
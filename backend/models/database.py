@@ -1,8 +1,65 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, inspect, DDL
 from datetime import datetime
 import uuid
 
-db = SQLAlchemy()
+DEFAULT_STORE = 'main'
+
+def store_bind_key(store=None):
+    """Bind key of a store's database, None for the default store in supermart.db"""
+    if store is None:
+        store = g.get('store') if has_app_context() else None
+    return None if store in (None, DEFAULT_STORE) else f'store_{store}'
+
+class StoreSession(Session):
+    """Session that sends every statement to the database of the current store"""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        key = store_bind_key() if bind is None else None
+        if key:
+            return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': StoreSession})
+
+def store_engine(store=None):
+    """Engine of the current (or given) store, for work outside the session"""
+    key = store_bind_key(store)
+    return db.engines[key] if key else db.engine
+
+def _use_wal(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+def enable_wal():
+    """Open every store database in WAL mode, so report reads and checkout writes do not block each other"""
+    for engine in db.engines.values():
+        if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _use_wal):
+            event.listen(engine, 'connect', _use_wal)
+
+# Fix-ups for rows written before a unique index existed, run just before it is first created
+INDEX_PREPARATION = {
+    'ix_transactions_reference': (
+        "UPDATE transactions SET reference_number = NULL WHERE reference_number = ''",
+        # Every later use of a reference keeps it, suffixed with its own id; the first keeps it as is
+        "UPDATE transactions SET reference_number = reference_number || '#' || id "
+        'WHERE reference_number IS NOT NULL AND rowid NOT IN '
+        '(SELECT MIN(rowid) FROM transactions WHERE reference_number IS NOT NULL GROUP BY reference_number)'
+    )
+}
+
+def create_missing_indexes():
+    """Create indexes added to tables that already existed, which create_all skips"""
+    engine = store_engine()
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            with engine.begin() as connection:
+                for statement in INDEX_PREPARATION.get(index.name, ()):
+                    connection.exec_driver_sql(statement)
+                index.create(connection)
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -92,6 +149,11 @@ class Offer(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_created_mode', 'created_at', 'payment_mode'),
+        db.Index('ix_transactions_bill', 'bill_id'),
+        db.Index('ix_transactions_reference', 'reference_number', unique=True),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=False)
@@ -105,6 +167,9 @@ class Transaction(db.Model):
 
 class InventoryLog(db.Model):
     __tablename__ = 'inventory_logs'
+    __table_args__ = (
+        db.Index('ix_inventory_logs_product_created', 'product_id', 'created_at'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     product_id = db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False)
@@ -113,4 +178,233 @@ class InventoryLog(db.Model):
     bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    product = db.relationship('Product', backref='inventory_logs')
+    # Deleting a product keeps its ledger rows for stock history
+    product = db.relationship('Product', backref=db.backref('inventory_logs', passive_deletes='all'))
+
+class EntityVersion(db.Model):
+    __tablename__ = 'entity_versions'
+    
+    entity = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_entity_version', 'entity', 'version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.String(36), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), default='upsert')  # upsert, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BillSequence(db.Model):
+    __tablename__ = 'bill_sequences'
+    
+    lane = db.Column(db.String(20), primary_key=True)
+    high = db.Column(db.Integer, nullable=False, default=0)  # last number reserved for the lane
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductSupplier(db.Model):
+    __tablename__ = 'product_suppliers'
+    
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), primary_key=True)
+    supplier = db.Column(db.String(200), nullable=False)
+    pack_size = db.Column(db.Integer, default=1)  # reorder in multiples of this
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ProductDailySales(db.Model):
+    __tablename__ = 'product_daily_sales'
+    __table_args__ = (
+        db.Index('ix_product_daily_sales_day', 'day'),
+    )
+    
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    bills = db.Column(db.Integer, nullable=False, default=0)
+
+class ArchiveMonth(db.Model):
+    __tablename__ = 'archive_months'
+    
+    month = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    path = db.Column(db.String(500), nullable=False)
+    bills = db.Column(db.Integer, default=0)
+    bill_items = db.Column(db.Integer, default=0)
+    transactions = db.Column(db.Integer, default=0)
+    inventory_logs = db.Column(db.Integer, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ArchivedBill(db.Model):
+    __tablename__ = 'archived_bills'
+    __table_args__ = (
+        db.Index('ix_archived_bills_customer', 'customer_id', 'created_at'),
+        db.Index('ix_archived_bills_number', 'bill_number'),
+    )
+    
+    # Routing index kept in the live database for bills moved to an archive
+    bill_id = db.Column(db.String(36), primary_key=True)
+    bill_number = db.Column(db.String(50), nullable=False)
+    customer_id = db.Column(db.String(36), nullable=True)
+    month = db.Column(db.String(7), db.ForeignKey('archive_months.month'), nullable=False)
+    status = db.Column(db.String(20))
+    total = db.Column(db.Float, default=0)
+    items_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime)
+
+class LoyaltyEntry(db.Model):
+    __tablename__ = 'loyalty_ledger'
+    __table_args__ = (
+        db.Index('ix_loyalty_ledger_customer', 'customer_id', 'applied'),
+        db.Index('ix_loyalty_ledger_pending', 'applied', 'id'),
+        db.Index('ix_loyalty_ledger_bill', 'bill_id'),
+    )
+    
+    # Signed point and purchase deltas; applied once folded into customers.points
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    customer_id = db.Column(db.String(36), db.ForeignKey('customers.id'), nullable=False)
+    bill_id = db.Column(db.String(36), nullable=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    reason = db.Column(db.String(20), nullable=False)  # accrual, redemption, reversal, adjustment
+    applied = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BillReturn(db.Model):
+    __tablename__ = 'bill_returns'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=False, index=True)
+    exchange_bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=True)
+    refund_amount = db.Column(db.Float, default=0)
+    reason = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    items = db.relationship('BillReturnItem', backref='bill_return', cascade='all, delete-orphan')
+
+class BillReturnItem(db.Model):
+    __tablename__ = 'bill_return_items'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    return_id = db.Column(db.String(36), db.ForeignKey('bill_returns.id'), nullable=False)
+    bill_item_id = db.Column(db.String(36), db.ForeignKey('bill_items.id'), nullable=False, index=True)
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+
+class HeldCart(db.Model):
+    __tablename__ = 'held_carts'
+    
+    # Write-through copy of the in-memory held cart store
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    lane = db.Column(db.String(20), nullable=False, index=True)
+    customer_id = db.Column(db.String(36), nullable=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON bill request
+    total = db.Column(db.Float, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class InventorySnapshot(db.Model):
+    __tablename__ = 'inventory_snapshots'
+    __table_args__ = (
+        db.Index('ix_inventory_snapshots_product_taken', 'product_id', 'taken_at', unique=True),
+        db.Index('ix_inventory_snapshots_taken', 'taken_at'),
+    )
+    
+    # Ledger stock of a product as of taken_at; drift is products.quantity minus the ledger when taken
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    drift = db.Column(db.Integer, nullable=False, default=0)
+    source = db.Column(db.String(20), nullable=False, default='ledger')  # baseline, ledger
+
+class CatalogTombstone(db.Model):
+    __tablename__ = 'catalog_tombstones'
+    
+    # Natural key (barcode, coupon code) of a deleted catalog row, so replicas can match it by more than the id
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.String(36), nullable=False, index=True)
+    natural_key = db.Column(db.String(100), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReplicationCursor(db.Model):
+    __tablename__ = 'replication_cursors'
+    
+    # Last change feed position applied from a source catalog
+    source = db.Column(db.String(200), primary_key=True)
+    cursor = db.Column(db.Integer, nullable=False, default=0)
+    applied = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TaxRate(db.Model):
+    __tablename__ = 'tax_rates'
+    
+    # GST slab of a product category; categories without a row pay the default rate
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    category = db.Column(db.String(100), unique=True, nullable=False)
+    rate = db.Column(db.Float, nullable=False)  # percent
+    hsn_code = db.Column(db.String(20))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class BillTax(db.Model):
+    __tablename__ = 'bill_taxes'
+    __table_args__ = (
+        db.Index('ix_bill_taxes_day_rate', 'day', 'rate'),
+    )
+    
+    # Per-slab tax breakup of a bill; kept live when the bill is archived, for GST returns
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    bill_id = db.Column(db.String(36), db.ForeignKey('bills.id'), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    taxable = db.Column(db.Float, nullable=False)
+    tax = db.Column(db.Float, nullable=False)
+    
+    bill = db.relationship('Bill', backref=db.backref('taxes', passive_deletes='all'))
+
+class BillEvent(db.Model):
+    __tablename__ = 'bill_events'
+    __table_args__ = (
+        db.Index('ix_bill_events_bill', 'bill_id', 'seq'),
+        db.Index('ix_bill_events_created', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
+    
+    # Append-only, hash-chained history of every bill change; no foreign key, it outlives archived bills
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    bill_id = db.Column(db.String(36), nullable=False)
+    event = db.Column(db.String(20), nullable=False)  # created, status, payment, return, snapshot
+    payload = db.Column(db.Text, nullable=False)  # canonical JSON, hashed as stored
+    created_at = db.Column(db.DateTime, nullable=False)
+    hash = db.Column(db.String(64), nullable=False)  # sha256 over the previous event's hash and this event
+
+class BillEventSegment(db.Model):
+    __tablename__ = 'bill_event_segments'
+    
+    # A full run of events in seq order, sealed with the hash of its last event
+    segment = db.Column(db.Integer, primary_key=True)
+    first_seq = db.Column(db.Integer, nullable=False)
+    last_seq = db.Column(db.Integer, nullable=False)
+    head_hash = db.Column(db.String(64), nullable=False)
+    sealed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# The database refuses to rewrite history, whatever the client
+for _table in ('bill_events', 'bill_event_segments'):
+    for _operation in ('UPDATE', 'DELETE'):
+        event.listen(db.metadata.tables[_table], 'after_create', DDL(
+            f'CREATE TRIGGER IF NOT EXISTS {_table}_no_{_operation.lower()} BEFORE {_operation} ON {_table} '
+            f"BEGIN SELECT RAISE(ABORT, '{_table} is append-only'); END"
+        ))
@@ -0,0 +1,159 @@
+from flask import Blueprint, request, jsonify, send_file, current_app
+from services.backup import create_backup, list_backups, verify_backup, backup_metrics, BackupError
+from services.stores import store_dir
+from services.bill_log import log_status, verify_chain, audit_day
+from services.profiling import request_profiler, capture_path, ProfileError
+from services.slow_queries import slow_query_log
+from datetime import datetime
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+@admin_bp.route('/backups', methods=['GET'])
+def get_backups():
+    """List backup snapshots, newest first"""
+    return jsonify({
+        'success': True,
+        'data': list_backups(store_dir('BACKUP_DIR'))
+    })
+
+@admin_bp.route('/backups', methods=['POST'])
+def take_backup():
+    """Take an online backup of the live database now"""
+    try:
+        manifest = create_backup(store_dir('BACKUP_DIR'))
+    except BackupError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    return jsonify({
+        'success': True,
+        'message': 'Backup created',
+        'data': manifest
+    }), 201
+
+@admin_bp.route('/backups/<name>/verify', methods=['POST'])
+def verify_backup_snapshot(name):
+    """Restore a backup into a scratch file and check it against its manifest"""
+    try:
+        result = verify_backup(store_dir('BACKUP_DIR'), name)
+    except BackupError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    return jsonify({
+        'success': True,
+        'data': result
+    })
+
+@admin_bp.route('/backups/metrics', methods=['GET'])
+def get_backup_metrics():
+    """Get recent backup durations and request latency during and outside backups"""
+    return jsonify({
+        'success': True,
+        'data': backup_metrics.snapshot()
+    })
+
+@admin_bp.route('/bill-log', methods=['GET'])
+def get_bill_log_status():
+    """Get the bill log's length, head hash and sealed segments"""
+    return jsonify({
+        'success': True,
+        'data': log_status()
+    })
+
+@admin_bp.route('/bill-log/verify', methods=['POST'])
+def verify_bill_log():
+    """Recompute the bill log's hash chain, from ?segment=<n> onwards"""
+    return jsonify({
+        'success': True,
+        'data': verify_chain(request.args.get('segment', 0, type=int))
+    })
+
+@admin_bp.route('/bill-log/audit/<date>', methods=['GET'])
+def audit_bill_log(date):
+    """Replay the log for a day's bills and report any that differ from their rows"""
+    try:
+        day = datetime.fromisoformat(date).date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': audit_day(day)
+    })
+
+@admin_bp.route('/profiling', methods=['GET'])
+def get_profiling():
+    """Get armed profiling requests and the captures on disk, newest first"""
+    return jsonify({
+        'success': True,
+        'data': request_profiler.status(current_app.config['PROFILE_DIR'])
+    })
+
+@admin_bp.route('/profiling', methods=['POST'])
+def arm_profiling():
+    """Profile the next requests to a path, e.g. {"path": "/api/bills/", "method": "POST", "count": 3}"""
+    data = request.json or {}
+    
+    try:
+        arm = request_profiler.arm(
+            data.get('path'),
+            mode=data.get('mode', 'cprofile'),
+            count=int(data.get('count', 1)),
+            ttl_seconds=int(data.get('ttl_seconds', 600)),
+            method=data.get('method')
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count and ttl_seconds must be integers'}), 400
+    except ProfileError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    return jsonify({
+        'success': True,
+        'message': 'Profiling armed',
+        'data': arm
+    }), 201
+
+@admin_bp.route('/profiling', methods=['DELETE'])
+def disarm_profiling():
+    """Cancel every armed profiling request"""
+    return jsonify({
+        'success': True,
+        'message': f'{request_profiler.disarm()} armed requests cancelled'
+    })
+
+@admin_bp.route('/profiling/captures/<filename>', methods=['GET'])
+def get_profile_capture(filename):
+    """Download a capture: <name>.json (summary and SQL), <name>.prof (snakeviz) or <name>.speedscope.json"""
+    try:
+        path = capture_path(current_app.config['PROFILE_DIR'], filename)
+    except ProfileError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    return send_file(path, as_attachment=filename.endswith('.prof'))
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Get slow statements by fingerprint with call sites and query plans (?sort=total_ms|count|max_ms|last_seen, ?table_scans=true)"""
+    try:
+        report = slow_query_log.report(
+            sort=request.args.get('sort', 'total_ms'),
+            limit=request.args.get('limit', 50, type=int),
+            table_scans_only=request.args.get('table_scans', 'false').lower() == 'true'
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': report
+    })
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+def reset_slow_queries():
+    """Clear the slow-query log, optionally setting a new ?threshold_ms"""
+    cleared = slow_query_log.reset(request.args.get('threshold_ms', type=float))
+    
+    return jsonify({
+        'success': True,
+        'message': f'{cleared} fingerprints cleared',
+        'data': {'threshold_ms': slow_query_log.threshold_ms}
+    })
@@ -1,89 +1,100 @@
-from flask import Blueprint, request, jsonify
-from models.database import db, Bill, BillItem, Product, Customer, Transaction, InventoryLog, Coupon, Offer
-from datetime import datetime
+from flask import Blueprint, request, jsonify, Response
+from models.database import db, Bill, BillItem, Product, Customer, Transaction, InventoryLog, Coupon, Offer, IdempotencyKey, BillReturn, BillTax
+from services.numbering import bill_numbers
+from services.archive import find_archived_bill
+from services.analytics import daily_totals
+from services.loyalty import redeem
+from services.returns import resolve_return_lines, returned_quantities, apply_return, ReturnError
+from services.payments import post_tenders, paid_amount, reconcile_day, PaymentError
+from services.held_carts import held_carts, HeldCartError
+from services.pricing import pricing_catalog, price_cart, PricingError, QUOTE_BATCH_LIMIT
+from services.receipts import render_receipt, ReceiptError, RECEIPT_FORMATS
+from services.bill_log import bill_history
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
 import uuid
 
 bills_bp = Blueprint('bills', __name__, url_prefix='/api/bills')
 
-def calculate_bill_total(items, discount=0, coupon_code=None):
+LANE_CLOCK_SKEW = timedelta(minutes=5)
+
+def calculate_bill_total(items, discount=0, coupon_code=None, redeem_points=0):
     """Calculate bill total with discounts"""
-    subtotal = 0
-    
-    for item in items:
-        product = Product.query.get(item['product_id'])
-        if product:
-            item_total = product.price * item['quantity'] - item.get('discount', 0)
-            subtotal += item_total
-    
-    discount_amount = 0
-    
-    # Apply coupon if provided
-    if coupon_code:
-        coupon = Coupon.query.filter_by(code=coupon_code, active=True).first()
-        if coupon and coupon.current_uses < (coupon.max_uses or float('inf')):
-            if coupon.discount_type == 'percentage':
-                discount_amount = (subtotal * coupon.discount_value) / 100
-            else:
-                discount_amount = coupon.discount_value
-    
-    # Apply additional discount
-    discount_amount += discount
-    
-    tax = (subtotal - discount_amount) * 0.05  # 5% tax
-    total = subtotal - discount_amount + tax
-    
-    return {
-        'subtotal': subtotal,
-        'discount': discount_amount,
-        'tax': tax,
-        'total': total
-    }
+    return price_cart(pricing_catalog.snapshot(), items, discount, coupon_code, redeem_points, line_pricer=pricing_catalog.price_line)
 
-@bills_bp.route('/', methods=['POST'])
-def create_bill():
-    """Create a new bill"""
-    data = request.json
-    
-    if not data or 'items' not in data:
-        return jsonify({'error': 'Missing items'}), 400
+class BillingError(Exception):
+    """Raised when a bill cannot be built from the request data"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def build_bill(data, check_stock=True, lane=None, bill_number=None, created_at=None):
+    """Build a bill with items, stock updates and inventory logs in the current session.
     
-    bill_number = f"BILL-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    bill_number and created_at are only passed for bills already printed
+    at an offline lane; every other bill is numbered and stamped here.
+    """
+    if not data or not data.get('items'):
+        raise BillingError('Missing items')
     
     bill = Bill(
-        bill_number=bill_number,
+        id=str(uuid.uuid4()),
+        bill_number=bill_number or bill_numbers.next_number(lane or data.get('lane')),
         customer_id=data.get('customer_id'),
         payment_mode=data.get('payment_mode', 'cash'),
-        status='hold' if data.get('hold') else 'completed'
+        status='completed'
     )
     
+    if created_at:
+        bill.created_at = created_at
+    
+    try:
+        redeem_points = int(data.get('redeem_points') or 0)
+    except (TypeError, ValueError):
+        raise BillingError('redeem_points must be a whole number')
+    if redeem_points < 0:
+        raise BillingError('redeem_points cannot be negative')
+    if redeem_points and not bill.customer_id:
+        raise BillingError('Points can only be redeemed on a customer bill')
+    
     # Calculate totals
-    totals = calculate_bill_total(
-        data['items'],
-        data.get('discount', 0),
-        data.get('coupon_code')
-    )
+    try:
+        totals = calculate_bill_total(
+            data['items'],
+            data.get('discount', 0),
+            data.get('coupon_code'),
+            redeem_points
+        )
+    except PricingError as e:
+        raise BillingError(e.message, e.status)
     
     bill.subtotal = totals['subtotal']
     bill.discount = totals['discount']
     bill.tax = totals['tax']
     bill.total = totals['total']
     
-    # Add items to bill
-    for item in data['items']:
+    # Per-slab breakup, stored for GST returns
+    day = (bill.created_at or datetime.utcnow()).date()
+    for slab in totals['taxes']:
+        bill.taxes.append(BillTax(day=day, rate=slab['rate'], taxable=slab['taxable'], tax=slab['tax']))
+    
+    # Add items to bill, at the prices and offers the totals were computed with
+    for item, line in zip(data['items'], totals['lines']):
         product = Product.query.get(item['product_id'])
         
         if not product:
-            return jsonify({'error': f"Product {item['product_id']} not found"}), 404
+            raise BillingError(f"Product {item['product_id']} not found", 404)
         
-        if product.quantity < item['quantity']:
-            return jsonify({'error': f"Insufficient stock for {product.name}"}), 400
+        if check_stock and product.quantity < item['quantity']:
+            raise BillingError(f"Insufficient stock for {product.name}")
         
         bill_item = BillItem(
             product_id=item['product_id'],
             quantity=item['quantity'],
-            unit_price=product.price,
-            discount=item.get('discount', 0),
-            total=product.price * item['quantity'] - item.get('discount', 0)
+            unit_price=line['unit_price'],
+            discount=line['discount'] + line['offer_discount'],
+            total=line['total']
         )
         
         bill.items.append(bill_item)
@@ -107,9 +118,17 @@ def create_bill():
             coupon.current_uses += 1
     
     db.session.add(bill)
-    db.session.commit()
     
-    return jsonify({
+    # Points accrue when the bill flushes; a redemption is checked and recorded in the same statement.
+    # Only the points the bill could use are deducted, not all that were asked for.
+    points = totals['points_redeemed']
+    if points and not redeem(db.session.connection(), bill.customer_id, points, bill.id):
+        raise BillingError('Insufficient points')
+    
+    return bill
+
+def _bill_created_response(bill, replayed=False):
+    response = jsonify({
         'success': True,
         'message': 'Bill created',
         'data': {
@@ -118,10 +137,169 @@ def create_bill():
             'subtotal': bill.subtotal,
             'discount': bill.discount,
             'tax': bill.tax,
+            'taxes': [{'rate': t.rate, 'taxable': t.taxable, 'tax': t.tax} for t in bill.taxes],
             'total': bill.total,
             'status': bill.status
         }
-    }), 201
+    })
+    response.status_code = 201
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    
+    return response
+
+@bills_bp.route('/', methods=['POST'])
+def create_bill():
+    """Create a new bill; retries with the same Idempotency-Key return the original bill"""
+    key = request.headers.get('Idempotency-Key')
+    
+    # Held baskets are parked, not billed: no bill number, stock change or inventory log
+    if (request.get_json(silent=True) or {}).get('hold'):
+        return park_cart()
+    
+    if key:
+        existing = IdempotencyKey.query.get(key)
+        if existing:
+            return _bill_created_response(Bill.query.get(existing.bill_id), replayed=True)
+    
+    try:
+        bill = build_bill(request.json, lane=request.headers.get('X-Lane-Id'))
+    except BillingError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+    
+    if key:
+        db.session.add(IdempotencyKey(key=key, bill_id=bill.id))
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key committed first
+        db.session.rollback()
+        existing = IdempotencyKey.query.get(key) if key else None
+        if not existing:
+            return jsonify({'error': 'Bill conflicts with one already saved'}), 409
+        return _bill_created_response(Bill.query.get(existing.bill_id), replayed=True)
+    
+    return _bill_created_response(bill)
+
+def _offline_sale_time(value):
+    """Sale time a lane printed on an offline bill, UTC; not later than now give or take lane clock drift"""
+    if not value:
+        return None
+    try:
+        created_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BillingError('created_at must be an ISO date and time')
+    if created_at.tzinfo:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if created_at > datetime.utcnow() + LANE_CLOCK_SKEW:
+        raise BillingError('created_at is in the future')
+    return created_at
+
+@bills_bp.route('/bulk', methods=['POST'])
+def ingest_bills():
+    """Ingest bills queued by offline lanes, idempotent on each bill's client_id"""
+    data = request.json
+    
+    if not data or 'bills' not in data:
+        return jsonify({'error': 'Missing bills'}), 400
+    
+    results = []
+    
+    for bill_data in data['bills']:
+        client_id = bill_data.get('client_id')
+        
+        if not client_id:
+            results.append({'client_id': None, 'status': 'error', 'error': 'Missing client_id'})
+            continue
+        
+        existing = IdempotencyKey.query.get(client_id)
+        if existing:
+            bill = Bill.query.get(existing.bill_id)
+            results.append({
+                'client_id': client_id,
+                'status': 'duplicate',
+                'bill_id': bill.id,
+                'bill_number': bill.bill_number
+            })
+            continue
+        
+        # Each bill gets its own savepoint so one bad bill does not drop the batch.
+        # Stock is not checked: the sale already happened at the lane.
+        # Offline bills keep the number and time printed on the lane's receipt
+        savepoint = db.session.begin_nested()
+        try:
+            bill = build_bill(
+                bill_data,
+                check_stock=False,
+                bill_number=bill_data.get('bill_number') or f"OFF-{client_id}",
+                created_at=_offline_sale_time(bill_data.get('created_at'))
+            )
+            db.session.add(IdempotencyKey(key=client_id, bill_id=bill.id))
+            savepoint.commit()
+        except (BillingError, ValueError, KeyError, IntegrityError) as e:
+            savepoint.rollback()
+            if isinstance(e, IntegrityError):
+                e = BillingError('Bill conflicts with one already saved', 409)
+            results.append({
+                'client_id': client_id,
+                'status': 'error',
+                'error': e.message if isinstance(e, BillingError) else str(e)
+            })
+            continue
+        
+        results.append({
+            'client_id': client_id,
+            'status': 'created',
+            'bill_id': bill.id,
+            'bill_number': bill.bill_number,
+            'total': bill.total
+        })
+    
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'data': results
+    })
+
+@bills_bp.route('/quote', methods=['POST'])
+def quote_bills():
+    """Price one cart, or many under 'carts', without writing anything"""
+    data = request.get_json(silent=True) or {}
+    snapshot = pricing_catalog.snapshot()
+    
+    def quote(cart):
+        if not cart.get('items'):
+            raise PricingError('Missing items')
+        return pricing_catalog.quote(cart, snapshot)
+    
+    if 'carts' not in data:
+        try:
+            return jsonify({'success': True, 'data': {'version': snapshot.versions, **quote(data)}})
+        except (PricingError, ValueError, TypeError, AttributeError) as e:
+            return jsonify({'error': e.message if isinstance(e, PricingError) else str(e)}), getattr(e, 'status', 400)
+    
+    carts = data['carts'] or []
+    if len(carts) > QUOTE_BATCH_LIMIT:
+        return jsonify({'error': f'At most {QUOTE_BATCH_LIMIT} carts per quote'}), 400
+    
+    # A cart that cannot be priced gets an error entry; the rest are still quoted
+    quotes = []
+    for cart in carts:
+        try:
+            quotes.append(quote(cart))
+        except (PricingError, ValueError, TypeError, AttributeError) as e:
+            quotes.append({'error': e.message if isinstance(e, PricingError) else str(e)})
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'version': snapshot.versions,
+            'quotes': quotes
+        }
+    })
 
 @bills_bp.route('/<bill_id>', methods=['GET'])
 def get_bill(bill_id):
@@ -129,7 +307,10 @@ def get_bill(bill_id):
     bill = Bill.query.get(bill_id)
     
     if not bill:
-        return jsonify({'error': 'Bill not found'}), 404
+        archived = find_archived_bill(bill_id)
+        if not archived:
+            return jsonify({'error': 'Bill not found'}), 404
+        return jsonify({'success': True, 'data': archived})
     
     return jsonify({
         'success': True,
@@ -140,6 +321,10 @@ def get_bill(bill_id):
             'subtotal': bill.subtotal,
             'discount': bill.discount,
             'tax': bill.tax,
+            'taxes': [{'rate': t.rate, 'taxable': t.taxable, 'tax': t.tax} for t in bill.taxes if t.taxable >= 0],
+            # GST given back on partial returns, dated on the return day
+            'tax_credits': [{'rate': t.rate, 'taxable': t.taxable, 'tax': t.tax, 'day': t.day.isoformat()}
+                            for t in bill.taxes if t.taxable < 0],
             'total': bill.total,
             'payment_mode': bill.payment_mode,
             'status': bill.status,
@@ -155,182 +340,365 @@ def get_bill(bill_id):
         }
     })
 
-@bills_bp.route('/<bill_id>/hold', methods=['POST'])
-def hold_bill(bill_id):
-    """Hold/suspend a bill"""
-    bill = Bill.query.get(bill_id)
-    
-    if not bill:
-        return jsonify({'error': 'Bill not found'}), 404
+def _cart_dict(cart, items=False):
+    data = {
+        'id': cart['id'],
+        'bill_number': None,
+        'lane': cart['lane'],
+        'customer_id': cart.get('customer_id'),
+        'total': cart['total'],
+        'items_count': len(cart['items']),
+        'created_at': cart['created_at'].isoformat(),
+        'expires_at': cart['expires_at'].isoformat()
+    }
+    if items:
+        data['items'] = cart['items']
+        data['discount'] = cart.get('discount', 0)
+        data['coupon_code'] = cart.get('coupon_code')
     
-    bill.status = 'hold'
-    db.session.commit()
+    return data
+
+@bills_bp.route('/held', methods=['POST'])
+def park_cart():
+    """Park a basket at the lane for later; stock is reserved softly, not deducted"""
+    data = request.get_json(silent=True) or {}
+    
+    ttl = None
+    if data.get('ttl_minutes') is not None:
+        try:
+            ttl = timedelta(minutes=float(data['ttl_minutes']))
+        except (TypeError, ValueError, OverflowError):
+            return jsonify({'error': 'ttl_minutes must be a number'}), 400
+        if ttl <= timedelta(0):
+            return jsonify({'error': 'ttl_minutes must be positive'}), 400
+    
+    try:
+        cart, short = held_carts.park(request.headers.get('X-Lane-Id') or data.get('lane'), data, ttl)
+    except HeldCartError as e:
+        return jsonify({'error': e.message}), e.status
     
     return jsonify({
         'success': True,
-        'message': 'Bill held successfully'
+        'message': 'Bill held',
+        'data': dict(_cart_dict(cart), status='hold', short=short)
+    }), 201
+
+@bills_bp.route('/hold-list', methods=['GET'])
+def get_hold_bills():
+    """Get parked baskets, optionally for one lane"""
+    return jsonify({
+        'success': True,
+        'data': [_cart_dict(cart) for cart in held_carts.carts(request.args.get('lane'))]
     })
 
-@bills_bp.route('/<bill_id>/resume', methods=['POST'])
-def resume_bill(bill_id):
-    """Resume a held bill"""
-    bill = Bill.query.get(bill_id)
+@bills_bp.route('/held/reservations', methods=['GET'])
+def get_held_reservations():
+    """Get quantities softly reserved by parked baskets per product"""
+    return jsonify({
+        'success': True,
+        'data': held_carts.reserved()
+    })
+
+@bills_bp.route('/held/<cart_id>', methods=['GET'])
+def get_held_cart(cart_id):
+    """Get a parked basket with its items"""
+    cart = held_carts.get(cart_id)
     
-    if not bill:
-        return jsonify({'error': 'Bill not found'}), 404
+    if not cart:
+        return jsonify({'error': 'Held bill not found'}), 404
     
-    if bill.status != 'hold':
-        return jsonify({'error': 'Bill is not on hold'}), 400
+    return jsonify({
+        'success': True,
+        'data': _cart_dict(cart, items=True)
+    })
+
+@bills_bp.route('/held/<cart_id>/resume', methods=['POST'])
+def resume_held_cart(cart_id):
+    """Take a parked basket back to a lane for editing; it leaves the held store"""
+    cart = held_carts.discard(cart_id)
     
-    bill.status = 'completed'
-    db.session.commit()
+    if not cart:
+        return jsonify({'error': 'Held bill not found'}), 404
     
     return jsonify({
         'success': True,
-        'message': 'Bill resumed successfully'
+        'message': 'Bill resumed successfully',
+        'data': _cart_dict(cart, items=True)
     })
 
-@bills_bp.route('/hold-list', methods=['GET'])
-def get_hold_bills():
-    """Get all held bills"""
-    bills = Bill.query.filter_by(status='hold').all()
+@bills_bp.route('/held/<cart_id>/finalize', methods=['POST'])
+def finalize_held_cart(cart_id):
+    """Bill a parked basket through the normal bill pipeline"""
+    overrides = request.get_json(silent=True) or {}
+    cart = held_carts.take(cart_id)
+    
+    if not cart:
+        return jsonify({'error': 'Held bill not found'}), 404
+    
+    # Payment details chosen at finalize time override what was parked
+    data = dict(held_carts.request_data(cart), **overrides)
+    
+    try:
+        bill = build_bill(data, lane=request.headers.get('X-Lane-Id') or cart['lane'])
+        held_carts.delete_row(db.session.connection(), cart_id)
+        db.session.commit()
+    except Exception as e:
+        # Whatever failed, the basket goes back on hold rather than being lost
+        db.session.rollback()
+        held_carts.restore(cart)
+        if isinstance(e, BillingError):
+            return jsonify({'error': e.message}), e.status
+        raise
+    
+    return _bill_created_response(bill)
+
+@bills_bp.route('/held/<cart_id>', methods=['DELETE'])
+def discard_held_cart(cart_id):
+    """Drop a parked basket and release its reservation"""
+    if not held_carts.discard(cart_id):
+        return jsonify({'error': 'Held bill not found'}), 404
     
     return jsonify({
         'success': True,
-        'data': [{
-            'id': b.id,
-            'bill_number': b.bill_number,
-            'customer_id': b.customer_id,
-            'total': b.total,
-            'created_at': b.created_at.isoformat()
-        } for b in bills]
+        'message': 'Held bill discarded'
     })
 
 @bills_bp.route('/<bill_id>/return', methods=['POST'])
 def return_bill(bill_id):
-    """Return/exchange a bill"""
+    """Return some or all of a bill's lines, optionally exchanging them for new items"""
     bill = Bill.query.get(bill_id)
     
     if not bill:
         return jsonify({'error': 'Bill not found'}), 404
     
-    # Restore stock for all items
-    for item in bill.items:
-        product = Product.query.get(item.product_id)
-        product.quantity += item.quantity
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        resolved = resolve_return_lines(bill, data.get('items'))
         
-        log = InventoryLog(
-            product_id=item.product_id,
-            quantity_change=item.quantity,
-            reason='return',
-            bill_id=bill_id
-        )
-        db.session.add(log)
+        # The exchange bill takes its number before the return writes anything
+        exchange = None
+        if data.get('exchange_items'):
+            exchange = build_bill({
+                'customer_id': bill.customer_id,
+                'items': data['exchange_items'],
+                'payment_mode': data.get('payment_mode', bill.payment_mode)
+            }, lane=request.headers.get('X-Lane-Id'))
+        
+        bill_return = apply_return(bill, resolved, data.get('reason'), exchange)
+    except (ReturnError, BillingError) as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
     
-    bill.status = 'returned'
     db.session.commit()
     
     return jsonify({
         'success': True,
-        'message': 'Bill returned successfully'
+        'message': 'Bill returned successfully' if bill.status == 'returned' else 'Items returned successfully',
+        'data': {
+            'return_id': bill_return.id,
+            'status': bill.status,
+            'refund': bill_return.refund_amount,
+            'items': [{
+                'bill_item_id': item.bill_item_id,
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'amount': item.amount
+            } for item in bill_return.items],
+            'exchange': {
+                'bill_id': exchange.id,
+                'bill_number': exchange.bill_number,
+                'total': exchange.total
+            } if exchange else None,
+            'balance_due': round((exchange.total if exchange else 0) - bill_return.refund_amount, 2)
+        }
     })
 
-@bills_bp.route('/<bill_id>/duplicate', methods=['POST'])
-def duplicate_bill(bill_id):
-    """Create duplicate/reprint of a bill"""
-    original_bill = Bill.query.get(bill_id)
+@bills_bp.route('/<bill_id>/returns', methods=['GET'])
+def get_bill_returns(bill_id):
+    """Get returns recorded against a bill with quantities still returnable per line"""
+    bill = Bill.query.get(bill_id)
     
-    if not original_bill:
+    if not bill:
         return jsonify({'error': 'Bill not found'}), 404
     
-    new_bill = Bill(
-        bill_number=f"DUP-{original_bill.bill_number}",
-        customer_id=original_bill.customer_id,
-        subtotal=original_bill.subtotal,
-        discount=original_bill.discount,
-        tax=original_bill.tax,
-        total=original_bill.total,
-        payment_mode=original_bill.payment_mode,
-        status='completed'
-    )
+    returned = returned_quantities(bill_id)
     
-    # Copy items
-    for item in original_bill.items:
-        bill_item = BillItem(
-            product_id=item.product_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price,
-            discount=item.discount,
-            total=item.total
-        )
-        new_bill.items.append(bill_item)
+    return jsonify({
+        'success': True,
+        'data': {
+            'returns': [{
+                'id': r.id,
+                'refund': r.refund_amount,
+                'exchange_bill_id': r.exchange_bill_id,
+                'reason': r.reason,
+                'created_at': r.created_at.isoformat(),
+                'items': [{
+                    'bill_item_id': i.bill_item_id,
+                    'product_id': i.product_id,
+                    'quantity': i.quantity,
+                    'amount': i.amount
+                } for i in r.items]
+            } for r in BillReturn.query.filter_by(bill_id=bill_id).order_by(BillReturn.created_at).all()],
+            'returnable': [{
+                'bill_item_id': item.id,
+                'product_id': item.product_id,
+                'product_name': item.product.name,
+                'sold': item.quantity,
+                'returned': returned.get(item.id, 0)
+            } for item in bill.items]
+        }
+    })
+
+@bills_bp.route('/<bill_id>/events', methods=['GET'])
+def get_bill_events(bill_id):
+    """Get a bill's audit log, each event checked against the hash chain, and the state it replays to"""
+    history = bill_history(bill_id)
     
-    db.session.add(new_bill)
-    db.session.commit()
+    if not history['events']:
+        return jsonify({'error': 'No events logged for this bill'}), 404
+    
+    return jsonify({'success': True, 'data': history})
+
+@bills_bp.route('/<bill_id>/receipt', methods=['GET'])
+def get_bill_receipt(bill_id):
+    """Get a bill's receipt as ?format=text|escpos|pdf, rendered once per bill version"""
+    fmt = request.args.get('format', 'text')
+    
+    try:
+        body, version, cached = render_receipt(bill_id, fmt, request.args.get('duplicate') == 'true')
+    except ReceiptError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    response = Response(body, mimetype=RECEIPT_FORMATS[fmt])
+    response.set_etag(f'{bill_id}-{version}-{fmt}')
+    response.headers['X-Receipt-Cache'] = 'hit' if cached else 'miss'
+    if fmt == 'pdf':
+        response.headers['Content-Disposition'] = f'inline; filename="receipt-{bill_id}.pdf"'
+    
+    return response.make_conditional(request)
+
+@bills_bp.route('/<bill_id>/duplicate', methods=['POST'])
+def duplicate_bill(bill_id):
+    """Reprint a bill as a duplicate receipt, without writing anything"""
+    try:
+        body, version, cached = render_receipt(bill_id, 'text', duplicate=True)
+    except ReceiptError as e:
+        return jsonify({'error': e.message}), e.status
     
     return jsonify({
         'success': True,
-        'message': 'Bill duplicated',
+        'message': 'Duplicate receipt',
         'data': {
-            'bill_id': new_bill.id,
-            'bill_number': new_bill.bill_number
+            'bill_id': bill_id,
+            'version': version,
+            'cached': cached,
+            'receipt': body.decode('utf-8'),
+            'formats': {fmt: f'/api/bills/{bill_id}/receipt?format={fmt}&duplicate=true' for fmt in RECEIPT_FORMATS}
         }
-    }), 201
+    })
+
+def _transaction_dict(transaction, replayed=False):
+    return {
+        'transaction_id': transaction.id,
+        'payment_mode': transaction.payment_mode,
+        'amount': transaction.amount,
+        'reference_number': transaction.reference_number,
+        'status': transaction.status,
+        'replayed': replayed
+    }
 
 @bills_bp.route('/<bill_id>/payment', methods=['POST'])
 def process_payment(bill_id):
-    """Process payment for a bill"""
+    """Post one or more tenders against a bill; tenders are idempotent on reference_number"""
     bill = Bill.query.get(bill_id)
     
     if not bill:
         return jsonify({'error': 'Bill not found'}), 404
     
-    data = request.json
-    payment_mode = data.get('payment_mode', 'cash')
+    data = request.json or {}
     
-    transaction = Transaction(
-        bill_id=bill_id,
-        payment_mode=payment_mode,
-        amount=bill.total,
-        reference_number=data.get('reference_number')
-    )
+    # A single payment_mode/amount body is one tender
+    tenders = data.get('tenders') or [{
+        'payment_mode': data.get('payment_mode', 'cash'),
+        'amount': data.get('amount', bill.total - paid_amount(bill.id)),
+        'reference_number': data.get('reference_number')
+    }]
     
-    db.session.add(transaction)
-    bill.payment_mode = payment_mode
-    db.session.commit()
+    try:
+        posted, replayed, change = post_tenders(bill, tenders)
+        db.session.commit()
+    except PaymentError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+    except IntegrityError:
+        # A concurrent retry posted the same reference first
+        db.session.rollback()
+        return jsonify({'error': 'Payment with this reference is already being recorded, retry to confirm'}), 409
+    
+    paid = paid_amount(bill.id)
     
     return jsonify({
         'success': True,
         'message': 'Payment processed',
         'data': {
-            'transaction_id': transaction.id,
-            'amount': transaction.amount,
-            'status': transaction.status
+            'transactions': [_transaction_dict(t) for t in posted] + [_transaction_dict(t, True) for t in replayed],
+            'payment_mode': bill.payment_mode,
+            'paid': round(paid, 2),
+            'balance': round(max(bill.total - paid, 0), 2),
+            'change': change,
+            'status': 'paid' if paid >= bill.total - 0.005 else 'partial'
         }
     })
 
+@bills_bp.route('/<bill_id>/payments', methods=['GET'])
+def get_bill_payments(bill_id):
+    """Get the tenders recorded against a bill"""
+    bill = Bill.query.get(bill_id)
+    
+    if not bill:
+        return jsonify({'error': 'Bill not found'}), 404
+    
+    paid = paid_amount(bill.id)
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'transactions': [_transaction_dict(t) for t in sorted(bill.transactions, key=lambda t: t.created_at)],
+            'paid': round(paid, 2),
+            'balance': round(max(bill.total - paid, 0), 2)
+        }
+    })
+
+@bills_bp.route('/reconciliation/<date>', methods=['GET'])
+def get_reconciliation(date):
+    """Get the end-of-day reconciliation by tender type"""
+    try:
+        day = datetime.fromisoformat(date).date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': reconcile_day(day)
+    })
+
 @bills_bp.route('/summary/<date>', methods=['GET'])
 def get_daily_summary(date):
     """Get daily sales summary"""
-    from sqlalchemy import func
-    
-    bills = Bill.query.filter(
-        func.date(Bill.created_at) == date,
-        Bill.status == 'completed'
-    ).all()
-    
-    total_sales = sum(b.total for b in bills)
-    total_discount = sum(b.discount for b in bills)
-    total_items = sum(len(b.items) for b in bills)
+    try:
+        totals = daily_totals(datetime.fromisoformat(date).date())
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
     
     return jsonify({
         'success': True,
         'data': {
             'date': date,
-            'total_bills': len(bills),
-            'total_sales': total_sales,
-            'total_discount': total_discount,
-            'total_items': total_items,
-            'average_bill': total_sales / len(bills) if bills else 0
+            'total_bills': totals['bills'],
+            'total_sales': totals['sales'],
+            'total_discount': totals['discount'],
+            'total_items': totals['items'],
+            'average_bill': totals['sales'] / totals['bills'] if totals['bills'] else 0
         }
     })
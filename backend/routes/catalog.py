@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from models.database import db, Product, Offer
+from services.versioning import conditional_get
+from services.replication import changes_since, replication_status, FEED_BATCH
+from services.pricing import pricing_catalog
+from datetime import datetime
+
+catalog_bp = Blueprint('catalog', __name__, url_prefix='/api/catalog')
+
+PRODUCT_FIELDS = ['id', 'barcode', 'name', 'category', 'price', 'quantity']
+OFFER_FIELDS = ['id', 'name', 'offer_type', 'product_id', 'category', 'discount_value', 'min_quantity', 'valid_till']
+
+@catalog_bp.route('/snapshot', methods=['GET'])
+def get_catalog_snapshot():
+    """Get a compact versioned bundle of products, active offers and tax slabs for lane clients"""
+    pricing = pricing_catalog.snapshot()
+    
+    def build(versions):
+        now = datetime.utcnow()
+        
+        # Plain column tuples, no ORM objects, one row array per product
+        products = db.session.query(
+            Product.id, Product.barcode, Product.name,
+            Product.category, Product.price, Product.quantity
+        ).all()
+        
+        offers = db.session.query(
+            Offer.id, Offer.name, Offer.offer_type, Offer.product_id, Offer.category,
+            Offer.discount_value, Offer.min_quantity, Offer.valid_till
+        ).filter(
+            Offer.active == True,
+            Offer.valid_from <= now,
+            Offer.valid_till >= now
+        ).all()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'version': versions,
+                'generated_at': now.isoformat(),
+                'product_fields': PRODUCT_FIELDS,
+                'products': [list(p) for p in products],
+                'offer_fields': OFFER_FIELDS,
+                'offers': [list(o[:-1]) + [o[-1].isoformat()] for o in offers],
+                # Category to GST rate, so offline bills are taxed per slab as the server would
+                'tax_rates': {category: slab.rate for category, slab in pricing.taxes.slabs.items()},
+                'default_tax_rate': pricing.taxes.default.rate
+            }
+        })
+    
+    # Offers start and end by the clock without a version change; the pricing snapshot knows the next such moment
+    return conditional_get(['products', 'offers', 'tax_rates'], build, valid_until=pricing.expires_at)
+
+@catalog_bp.route('/changes', methods=['GET'])
+def get_catalog_changes():
+    """Get a page of product, offer and coupon changes after ?since=<cursor> for store nodes to apply"""
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', FEED_BATCH, type=int)
+    
+    return jsonify({
+        'success': True,
+        'data': changes_since(since, limit)
+    })
+
+@catalog_bp.route('/replication', methods=['GET'])
+def get_replication_status():
+    """Get the change feed position applied from each catalog source"""
+    return jsonify({
+        'success': True,
+        'data': replication_status()
+    })
@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify
 from models.database import db, Customer, Bill
+from services.versioning import conditional_get, get_changes_since
+from services.archive import archived_purchases
+from services.loyalty import get_balance, add_entry, redeem, redemption_value
 from datetime import datetime
 
 customers_bp = Blueprint('customers', __name__, url_prefix='/api/customers')
@@ -45,6 +48,8 @@ def get_customer_by_mobile(mobile):
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     
+    points, total_purchases = get_balance(customer.id)
+    
     return jsonify({
         'success': True,
         'data': {
@@ -52,8 +57,8 @@ def get_customer_by_mobile(mobile):
             'mobile': customer.mobile,
             'name': customer.name,
             'email': customer.email,
-            'points': customer.points,
-            'total_purchases': customer.total_purchases,
+            'points': points,
+            'total_purchases': total_purchases,
             'created_at': customer.created_at.isoformat()
         }
     })
@@ -66,6 +71,8 @@ def get_customer(customer_id):
     if not customer:
         return jsonify({'error': 'Customer not found'}), 404
     
+    points, total_purchases = get_balance(customer.id)
+    
     return jsonify({
         'success': True,
         'data': {
@@ -73,8 +80,8 @@ def get_customer(customer_id):
             'mobile': customer.mobile,
             'name': customer.name,
             'email': customer.email,
-            'points': customer.points,
-            'total_purchases': customer.total_purchases,
+            'points': points,
+            'total_purchases': total_purchases,
             'created_at': customer.created_at.isoformat()
         }
     })
@@ -94,7 +101,8 @@ def update_customer(customer_id):
     if 'email' in data:
         customer.email = data['email']
     if 'points' in data:
-        customer.points = data['points']
+        # Setting a balance is recorded as an adjustment against the current one
+        add_entry(db.session.connection(), customer.id, data['points'] - get_balance(customer.id)[0])
     
     customer.updated_at = datetime.utcnow()
     db.session.commit()
@@ -106,26 +114,45 @@ def update_customer(customer_id):
 
 @customers_bp.route('/', methods=['GET'])
 def get_all_customers():
-    """Get all customers with pagination"""
+    """Get all customers with pagination, or only changed rows with ?since=<version>"""
+    since = request.args.get('since', type=int)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     
-    paginated = Customer.query.paginate(page=page, per_page=per_page)
-    
-    return jsonify({
-        'success': True,
-        'data': [{
+    def serialize(c):
+        return {
             'id': c.id,
             'mobile': c.mobile,
             'name': c.name,
             'email': c.email,
             'points': c.points,
             'total_purchases': c.total_purchases
-        } for c in paginated.items],
-        'total': paginated.total,
-        'pages': paginated.pages,
-        'current_page': page
-    })
+        }
+    
+    def build(versions):
+        if since is not None:
+            changed, deleted = get_changes_since('customers', since)
+            customers = Customer.query.filter(Customer.id.in_(changed)).all() if changed else []
+            
+            return jsonify({
+                'success': True,
+                'data': [serialize(c) for c in customers],
+                'deleted': deleted,
+                'version': versions['customers']
+            })
+        
+        paginated = Customer.query.paginate(page=page, per_page=per_page)
+        
+        return jsonify({
+            'success': True,
+            'data': [serialize(c) for c in paginated.items],
+            'total': paginated.total,
+            'pages': paginated.pages,
+            'current_page': page,
+            'version': versions['customers']
+        })
+    
+    return conditional_get(['customers'], build)
 
 @customers_bp.route('/<customer_id>/purchase-history', methods=['GET'])
 def get_purchase_history(customer_id):
@@ -136,6 +163,7 @@ def get_purchase_history(customer_id):
         return jsonify({'error': 'Customer not found'}), 404
     
     bills = Bill.query.filter_by(customer_id=customer_id).order_by(Bill.created_at.desc()).all()
+    points, total_purchases = get_balance(customer_id)
     
     return jsonify({
         'success': True,
@@ -151,9 +179,9 @@ def get_purchase_history(customer_id):
                 'total': b.total,
                 'items_count': len(b.items),
                 'created_at': b.created_at.isoformat()
-            } for b in bills],
-            'total_purchases': customer.total_purchases,
-            'loyalty_points': customer.points
+            } for b in bills] + archived_purchases(customer_id),
+            'total_purchases': total_purchases,
+            'loyalty_points': points
         }
     })
 
@@ -168,7 +196,7 @@ def add_loyalty_points(customer_id):
     data = request.json
     points = data.get('points', 0)
     
-    customer.points += points
+    add_entry(db.session.connection(), customer.id, points)
     db.session.commit()
     
     return jsonify({
@@ -176,7 +204,7 @@ def add_loyalty_points(customer_id):
         'message': 'Points added',
         'data': {
             'customer_id': customer.id,
-            'total_points': customer.points
+            'total_points': get_balance(customer.id)[0]
         }
     })
 
@@ -191,11 +219,11 @@ def redeem_points(customer_id):
     data = request.json
     points_to_redeem = data.get('points', 0)
     
-    if customer.points < points_to_redeem:
+    if points_to_redeem <= 0 or not redeem(db.session.connection(), customer.id, points_to_redeem):
+        db.session.rollback()
         return jsonify({'error': 'Insufficient points'}), 400
     
-    customer.points -= points_to_redeem
-    discount = points_to_redeem / 10  # 1 point = 1 rupee discount
+    discount = redemption_value(points_to_redeem)
     
     db.session.commit()
     
@@ -206,7 +234,7 @@ def redeem_points(customer_id):
             'customer_id': customer.id,
             'points_redeemed': points_to_redeem,
             'discount_amount': discount,
-            'remaining_points': customer.points
+            'remaining_points': get_balance(customer.id)[0]
         }
     })
 
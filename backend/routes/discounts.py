@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from models.database import db, Coupon, Offer
+from services.versioning import conditional_get, get_changes_since
 from datetime import datetime
 
 discounts_bp = Blueprint('discounts', __name__, url_prefix='/api/discounts')
@@ -67,12 +68,11 @@ def get_coupon(code):
 
 @discounts_bp.route('/coupons', methods=['GET'])
 def get_all_coupons():
-    """Get all active coupons"""
-    coupons = Coupon.query.filter_by(active=True).all()
+    """Get all active coupons, or only changed rows with ?since=<version>"""
+    since = request.args.get('since', type=int)
     
-    return jsonify({
-        'success': True,
-        'data': [{
+    def serialize(c):
+        return {
             'id': c.id,
             'code': c.code,
             'discount_type': c.discount_type,
@@ -82,8 +82,29 @@ def get_all_coupons():
             'max_uses': c.max_uses,
             'valid_from': c.valid_from.isoformat(),
             'valid_till': c.valid_till.isoformat()
-        } for c in coupons]
-    })
+        }
+    
+    def build(versions):
+        if since is None:
+            coupons = Coupon.query.filter_by(active=True).all()
+            return jsonify({
+                'success': True,
+                'data': [serialize(c) for c in coupons],
+                'version': versions['coupons']
+            })
+        
+        changed, deleted = get_changes_since('coupons', since)
+        coupons = Coupon.query.filter(Coupon.id.in_(changed)).all() if changed else []
+        
+        # Coupons deactivated since the client's version drop out of its list
+        return jsonify({
+            'success': True,
+            'data': [serialize(c) for c in coupons if c.active],
+            'deleted': deleted + [c.id for c in coupons if not c.active],
+            'version': versions['coupons']
+        })
+    
+    return conditional_get(['coupons'], build)
 
 @discounts_bp.route('/coupons/<coupon_id>', methods=['PUT'])
 def update_coupon(coupon_id):
@@ -148,12 +169,11 @@ def create_offer():
 
 @discounts_bp.route('/offers', methods=['GET'])
 def get_all_offers():
-    """Get all active offers"""
-    offers = Offer.query.filter_by(active=True).all()
+    """Get all active offers, or only changed rows with ?since=<version>"""
+    since = request.args.get('since', type=int)
     
-    return jsonify({
-        'success': True,
-        'data': [{
+    def serialize(o):
+        return {
             'id': o.id,
             'name': o.name,
             'offer_type': o.offer_type,
@@ -163,8 +183,28 @@ def get_all_offers():
             'product_id': o.product_id,
             'valid_from': o.valid_from.isoformat(),
             'valid_till': o.valid_till.isoformat()
-        } for o in offers]
-    })
+        }
+    
+    def build(versions):
+        if since is None:
+            offers = Offer.query.filter_by(active=True).all()
+            return jsonify({
+                'success': True,
+                'data': [serialize(o) for o in offers],
+                'version': versions['offers']
+            })
+        
+        changed, deleted = get_changes_since('offers', since)
+        offers = Offer.query.filter(Offer.id.in_(changed)).all() if changed else []
+        
+        return jsonify({
+            'success': True,
+            'data': [serialize(o) for o in offers if o.active],
+            'deleted': deleted + [o.id for o in offers if not o.active],
+            'version': versions['offers']
+        })
+    
+    return conditional_get(['offers'], build)
 
 @discounts_bp.route('/offers/<offer_id>', methods=['GET'])
 def get_offer(offer_id):
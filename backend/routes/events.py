@@ -0,0 +1,57 @@
+from flask import Blueprint, request, jsonify, Response
+from services.events import event_bus, TOPICS
+from services.stores import current_store
+import json
+import queue
+
+events_bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+HEARTBEAT_SECONDS = 15
+
+@events_bp.route('/stream', methods=['GET'])
+def stream_events():
+    """Stream committed bill, stock and offer changes of the request's store (?all_stores=true for every store)"""
+    topics = [t for t in request.args.get('topics', ','.join(TOPICS)).split(',') if t in TOPICS]
+    
+    if not topics:
+        return jsonify({'error': f"Unknown topics, expected any of {', '.join(TOPICS)}"}), 400
+    
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    store = None if request.args.get('all_stores') == 'true' else current_store()
+    subscription = event_bus.subscribe(topics, last_event_id, store)
+    
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            
+            while True:
+                if subscription.overflowed:
+                    # Client missed events; it must reload full state before applying deltas again
+                    subscription.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                
+                try:
+                    entry = subscription.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                data = entry['data'] if store else dict(entry['data'], store=entry['store'])
+                yield f"id: {entry['id']}\nevent: {entry['topic']}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@events_bp.route('/stats', methods=['GET'])
+def get_event_stats():
+    """Get the number of connected event subscribers"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'subscribers': event_bus.subscriber_count()
+        }
+    })
@@ -1,9 +1,23 @@
 from flask import Blueprint, request, jsonify
-from models.database import db, Product, InventoryLog
-from datetime import datetime
+from models.database import db, Product, InventoryLog, ProductSupplier
+from services.versioning import conditional_get, get_changes_since
+from services.low_stock import low_stock
+from services.inventory import stock_at, movements, reconcile_stock
+from datetime import datetime, timedelta
 
 products_bp = Blueprint('products', __name__, url_prefix='/api/products')
 
+def _product_dict(p):
+    return {
+        'id': p.id,
+        'barcode': p.barcode,
+        'name': p.name,
+        'category': p.category,
+        'price': p.price,
+        'quantity': p.quantity,
+        'reorder_level': p.reorder_level
+    }
+
 @products_bp.route('/search', methods=['GET'])
 def search_products():
     """Search products by barcode or name"""
@@ -51,26 +65,35 @@ def get_by_barcode(barcode):
 
 @products_bp.route('/', methods=['GET'])
 def get_all_products():
-    """Get all products with pagination"""
+    """Get all products with pagination, or only changed rows with ?since=<version>"""
+    since = request.args.get('since', type=int)
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
     
-    paginated = Product.query.paginate(page=page, per_page=per_page)
+    def build(versions):
+        if since is not None:
+            changed, deleted = get_changes_since('products', since)
+            products = Product.query.filter(Product.id.in_(changed)).all() if changed else []
+            
+            return jsonify({
+                'success': True,
+                'data': [_product_dict(p) for p in products],
+                'deleted': deleted,
+                'version': versions['products']
+            })
+        
+        paginated = Product.query.paginate(page=page, per_page=per_page)
+        
+        return jsonify({
+            'success': True,
+            'data': [_product_dict(p) for p in paginated.items],
+            'total': paginated.total,
+            'pages': paginated.pages,
+            'current_page': page,
+            'version': versions['products']
+        })
     
-    return jsonify({
-        'success': True,
-        'data': [{
-            'id': p.id,
-            'barcode': p.barcode,
-            'name': p.name,
-            'category': p.category,
-            'price': p.price,
-            'quantity': p.quantity
-        } for p in paginated.items],
-        'total': paginated.total,
-        'pages': paginated.pages,
-        'current_page': page
-    })
+    return conditional_get(['products'], build)
 
 @products_bp.route('/', methods=['POST'])
 def create_product():
@@ -93,6 +116,11 @@ def create_product():
     )
     
     db.session.add(product)
+    
+    # Opening stock goes through the inventory ledger like any other change
+    if product.quantity:
+        db.session.add(InventoryLog(product=product, quantity_change=product.quantity, reason='opening'))
+    
     db.session.commit()
     
     return jsonify({
@@ -124,7 +152,12 @@ def update_product(product_id):
         product.price = data['price']
     if 'category' in data:
         product.category = data['category']
-    if 'quantity' in data:
+    if 'quantity' in data and data['quantity'] != product.quantity:
+        db.session.add(InventoryLog(
+            product_id=product.id,
+            quantity_change=data['quantity'] - (product.quantity or 0),
+            reason='adjustment'
+        ))
         product.quantity = data['quantity']
     if 'reorder_level' in data:
         product.reorder_level = data['reorder_level']
@@ -184,15 +217,128 @@ def adjust_stock(product_id):
 
 @products_bp.route('/low-stock', methods=['GET'])
 def get_low_stock():
-    """Get products with low stock"""
-    products = Product.query.filter(Product.quantity <= Product.reorder_level).all()
+    """Get products with low stock from the in-memory tracker"""
+    products = low_stock.items(request.args.get('category'))
     
     return jsonify({
         'success': True,
         'data': [{
-            'id': p.id,
-            'name': p.name,
-            'quantity': p.quantity,
-            'reorder_level': p.reorder_level
+            'id': p['id'],
+            'name': p['name'],
+            'category': p['category'],
+            'quantity': p['quantity'],
+            'reorder_level': p['reorder_level'],
+            'supplier': p['supplier']
         } for p in products]
     })
+
+@products_bp.route('/low-stock/suggestions', methods=['GET'])
+def get_reorder_suggestions():
+    """Get reorder suggestions grouped by category or supplier"""
+    group_by = request.args.get('group_by', 'category')
+    
+    if group_by not in ('category', 'supplier'):
+        return jsonify({'error': 'group_by must be category or supplier'}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': low_stock.suggestions(group_by, request.args.get('category'))
+    })
+
+def _parse_moment(value, default=None, end_of_day=True):
+    """Parse an ISO timestamp; a bare date means the end (or start) of that day"""
+    if not value:
+        return default
+    if len(value) == 10 and end_of_day:
+        return datetime.fromisoformat(value) + timedelta(days=1) - timedelta(microseconds=1)
+    return datetime.fromisoformat(value)
+
+@products_bp.route('/inventory/stock', methods=['GET'])
+def get_stock_at():
+    """Get ledger stock of all products, or one ?category, at ?at=<ISO date or timestamp>"""
+    try:
+        at = _parse_moment(request.args.get('at'), datetime.utcnow())
+    except ValueError:
+        return jsonify({'error': 'Invalid at, expected an ISO date or timestamp'}), 400
+    
+    products = Product.query.with_entities(Product.id, Product.name, Product.category)
+    if request.args.get('category'):
+        products = products.filter(Product.category == request.args['category'])
+    products = products.all()
+    
+    stock = stock_at(at, [p.id for p in products])
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'at': at.isoformat(),
+            'products': [{
+                'id': p.id,
+                'name': p.name,
+                'category': p.category,
+                'quantity': stock.get(p.id)
+            } for p in products]
+        }
+    })
+
+@products_bp.route('/inventory/reconciliation', methods=['GET'])
+def get_stock_reconciliation():
+    """Get products whose quantity disagrees with the inventory ledger"""
+    result = reconcile_stock()
+    
+    # Unanchored products have neither a snapshot nor an opening entry yet, so they could not be checked
+    return jsonify({
+        'success': True,
+        'data': {
+            'checked_at': datetime.utcnow().isoformat(),
+            'mismatches': result['mismatches'],
+            'unanchored': len(result['unanchored'])
+        }
+    })
+
+@products_bp.route('/<product_id>/movements', methods=['GET'])
+def get_stock_movements(product_id):
+    """Get opening and closing stock with changes by reason between ?start and ?end (default last 30 days)"""
+    if not Product.query.get(product_id):
+        return jsonify({'error': 'Product not found'}), 404
+    
+    try:
+        end = _parse_moment(request.args.get('end'), datetime.utcnow())
+        start = _parse_moment(request.args.get('start'), end - timedelta(days=30), end_of_day=False)
+    except ValueError:
+        return jsonify({'error': 'Invalid start or end, expected an ISO date or timestamp'}), 400
+    
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': movements(product_id, start, end)
+    })
+
+@products_bp.route('/<product_id>/supplier', methods=['PUT'])
+def set_product_supplier(product_id):
+    """Set the supplier and pack size used for reorder suggestions"""
+    product = Product.query.get(product_id)
+    
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    data = request.json
+    
+    if not data or not data.get('supplier'):
+        return jsonify({'error': 'Missing supplier'}), 400
+    
+    link = ProductSupplier.query.get(product_id) or ProductSupplier(product_id=product_id)
+    link.supplier = data['supplier']
+    link.pack_size = data.get('pack_size', link.pack_size or 1)
+    
+    db.session.add(link)
+    db.session.commit()
+    
+    low_stock.set_supplier(product_id, link.supplier, link.pack_size)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Supplier updated'
+    })
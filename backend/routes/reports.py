@@ -0,0 +1,77 @@
+from flask import Blueprint, request, jsonify
+from services.analytics import resolve_window, top_products
+from services.tax import gst_summary
+from services.columnar import ColumnarStore
+from services.stores import store_dir
+
+reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
+
+@reports_bp.route('/top-products', methods=['GET'])
+def get_top_products():
+    """Get top products by quantity or revenue for a time window"""
+    try:
+        start_day, end_day = resolve_window(
+            request.args.get('window', '30d'),
+            request.args.get('start'),
+            request.args.get('end')
+        )
+        products = top_products(
+            start_day,
+            end_day,
+            by=request.args.get('by', 'quantity'),
+            limit=request.args.get('limit', 10, type=int),
+            category=request.args.get('category')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'start': start_day.isoformat() if start_day else None,
+            'end': end_day.isoformat(),
+            'products': products
+        }
+    })
+
+@reports_bp.route('/period', methods=['GET'])
+def get_period_report():
+    """Get sales by category, hour and payment mode, basket sizes and discount effectiveness"""
+    try:
+        start_day, end_day = resolve_window(
+            request.args.get('window', 'custom'),
+            request.args.get('start'),
+            request.args.get('end')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    store = ColumnarStore(store_dir('COLUMNAR_DIR'))
+    
+    # Served from the columnar snapshot; run `flask export-columnar` to append new days
+    return jsonify({
+        'success': True,
+        'data': store.report(start_day or end_day.replace(day=1), end_day)
+    })
+
+@reports_bp.route('/gst', methods=['GET'])
+def get_gst_report():
+    """Get taxable value, CGST and SGST per slab for a window, for GST returns"""
+    try:
+        start_day, end_day = resolve_window(
+            request.args.get('window', 'custom'),
+            request.args.get('start'),
+            request.args.get('end')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Summed from the breakup stored with each bill; archived bills included
+    return jsonify({
+        'success': True,
+        'data': {
+            'start': start_day.isoformat() if start_day else None,
+            'end': end_day.isoformat(),
+            **gst_summary(start_day, end_day)
+        }
+    })
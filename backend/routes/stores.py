@@ -0,0 +1,144 @@
+from flask import Blueprint, request, jsonify
+from models.database import db, Product
+from services.stores import fan_out, store_ids
+from services.analytics import resolve_window, sales_by_barcode, daily_totals
+from datetime import datetime
+import heapq
+
+stores_bp = Blueprint('stores', __name__, url_prefix='/api/stores')
+
+# Cross-store reads: each store's database is queried on its own thread and the results merged here
+
+def _stores_param():
+    """Stores named in ?stores=a,b, all configured stores by default"""
+    requested = [s for s in request.args.get('stores', '').split(',') if s]
+    unknown = [s for s in requested if s not in store_ids()]
+    if unknown:
+        raise ValueError(f"Unknown store {unknown[0]}, expected any of {', '.join(store_ids())}")
+    return requested or store_ids()
+
+@stores_bp.route('/', methods=['GET'])
+def get_stores():
+    """List stores with product counts and today's sales"""
+    today = datetime.utcnow().date()
+    
+    def summary():
+        totals = daily_totals(today)
+        return {
+            'products': db.session.query(db.func.count(Product.id)).scalar(),
+            'today_bills': totals['bills'],
+            'today_sales': round(totals['sales'], 2)
+        }
+    
+    results = fan_out(summary)
+    
+    return jsonify({
+        'success': True,
+        'data': [dict(store=store, **result) for store, result in results.items()]
+    })
+
+@stores_bp.route('/catalog', methods=['GET'])
+def get_store_catalog():
+    """Search products across stores, merged by barcode with each store's price and stock"""
+    query = request.args.get('q', '').strip()
+    category = request.args.get('category')
+    limit = min(request.args.get('limit', 200, type=int), 1000)
+    
+    try:
+        stores = _stores_param()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def search():
+        products = db.session.query(Product.barcode, Product.name, Product.category, Product.price, Product.quantity)
+        if query:
+            products = products.filter(Product.barcode.ilike(f'%{query}%') | Product.name.ilike(f'%{query}%'))
+        if category:
+            products = products.filter(Product.category == category)
+        return products.order_by(Product.name).limit(limit).all()
+    
+    merged = {}
+    for store, rows in fan_out(search, stores).items():
+        for barcode, name, product_category, price, quantity in rows:
+            entry = merged.setdefault(barcode, {
+                'barcode': barcode,
+                'name': name,
+                'category': product_category,
+                'total_quantity': 0,
+                'stores': {}
+            })
+            entry['stores'][store] = {'price': price, 'quantity': quantity}
+            entry['total_quantity'] += quantity or 0
+    
+    return jsonify({
+        'success': True,
+        'data': sorted(merged.values(), key=lambda e: e['name'])[:limit]
+    })
+
+@stores_bp.route('/sales/<date>', methods=['GET'])
+def get_store_sales(date):
+    """Get a day's sales per store and for all stores together"""
+    try:
+        day = datetime.fromisoformat(date).date()
+        stores = _stores_param()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    results = fan_out(lambda: daily_totals(day), stores)
+    total = {k: sum(r[k] for r in results.values()) for k in ('bills', 'sales', 'discount', 'items')}
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'date': date,
+            'stores': [dict(store=store, **totals) for store, totals in results.items()],
+            'total': total
+        }
+    })
+
+@stores_bp.route('/top-products', methods=['GET'])
+def get_store_top_products():
+    """Top products over all stores for a ?window, summed by barcode before ranking"""
+    by = request.args.get('by', 'quantity')
+    if by not in ('quantity', 'revenue'):
+        return jsonify({'error': "by must be 'quantity' or 'revenue'"}), 400
+    
+    try:
+        start_day, end_day = resolve_window(
+            request.args.get('window', '30d'),
+            request.args.get('start'),
+            request.args.get('end')
+        )
+        stores = _stores_param()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    category = request.args.get('category')
+    merged = {}
+    
+    # Rank after merging full per-store totals; per-store top-N lists can miss the overall leaders
+    for store, rows in fan_out(lambda: sales_by_barcode(start_day, end_day, category), stores).items():
+        for barcode, (name, product_category, quantity, revenue) in rows.items():
+            entry = merged.setdefault(barcode, {
+                'barcode': barcode,
+                'name': name,
+                'category': product_category,
+                'quantity': 0,
+                'revenue': 0,
+                'stores': {}
+            })
+            entry['quantity'] += quantity
+            entry['revenue'] += revenue
+            entry['stores'][store] = quantity if by == 'quantity' else round(revenue, 2)
+    
+    limit = request.args.get('limit', 10, type=int)
+    top = heapq.nlargest(limit, (e for e in merged.values() if e['quantity'] > 0), key=lambda e: e[by])
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'start': start_day.isoformat() if start_day else None,
+            'end': end_day.isoformat(),
+            'products': [dict(e, revenue=round(e['revenue'], 2)) for e in top]
+        }
+    })
@@ -0,0 +1,65 @@
+from flask import Blueprint, request, jsonify
+from models.database import db, TaxRate
+from services.tax import DEFAULT_TAX_RATE, validate_rate, TaxError
+
+taxes_bp = Blueprint('taxes', __name__, url_prefix='/api/taxes')
+
+def _serialize(tax_rate):
+    return {
+        'category': tax_rate.category,
+        'rate': tax_rate.rate,
+        'hsn_code': tax_rate.hsn_code,
+        'updated_at': tax_rate.updated_at.isoformat() if tax_rate.updated_at else None
+    }
+
+@taxes_bp.route('/', methods=['GET'])
+def get_tax_rates():
+    """Get the GST slab of every category with one, and the default for the rest"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'default_rate': DEFAULT_TAX_RATE,
+            'rates': [_serialize(t) for t in TaxRate.query.order_by(TaxRate.category).all()]
+        }
+    })
+
+@taxes_bp.route('/<category>', methods=['PUT'])
+def set_tax_rate(category):
+    """Set the GST slab and HSN code of a category; pricing picks it up on the next quote"""
+    data = request.json
+    
+    if not data or 'rate' not in data:
+        return jsonify({'error': 'Missing rate'}), 400
+    
+    try:
+        rate = validate_rate(data['rate'])
+    except TaxError as e:
+        return jsonify({'error': e.message}), e.status
+    
+    tax_rate = TaxRate.query.filter_by(category=category).first()
+    if not tax_rate:
+        tax_rate = TaxRate(category=category)
+        db.session.add(tax_rate)
+    
+    tax_rate.rate = rate
+    tax_rate.hsn_code = data.get('hsn_code', tax_rate.hsn_code)
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Tax rate saved',
+        'data': _serialize(tax_rate)
+    })
+
+@taxes_bp.route('/<category>', methods=['DELETE'])
+def delete_tax_rate(category):
+    """Remove a category's slab so it pays the default rate"""
+    tax_rate = TaxRate.query.filter_by(category=category).first()
+    
+    if not tax_rate:
+        return jsonify({'error': 'Tax rate not found'}), 404
+    
+    db.session.delete(tax_rate)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Tax rate deleted'})
@@ -0,0 +1,209 @@
+from sqlalchemy import event, inspect, func, delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from models.database import db, Bill, BillItem, Product, ProductDailySales, BillReturnItem
+from services.archive import latest_archived_month, month_bounds, archived_daily_totals
+from datetime import datetime, timedelta
+import heapq
+
+WINDOWS = {'today': 1, '7d': 7, '30d': 30, '90d': 90}
+
+def add_daily_sales(connection, lines):
+    """Add (product_id, day, quantity, revenue, bills) deltas to the daily aggregates in one statement"""
+    merged = {}
+    for product_id, day, quantity, revenue, bills in lines:
+        key = (product_id, day)
+        total = merged.setdefault(key, [0, 0.0, 0])
+        total[0] += quantity
+        total[1] += revenue
+        total[2] += bills
+    
+    if not merged:
+        return
+    
+    table = ProductDailySales.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.product_id, table.c.day],
+        set_={
+            'quantity': table.c.quantity + stmt.excluded.quantity,
+            'revenue': table.c.revenue + stmt.excluded.revenue,
+            'bills': table.c.bills + stmt.excluded.bills
+        }
+    )
+    
+    connection.execute(stmt, [{
+        'product_id': product_id,
+        'day': day,
+        'quantity': quantity,
+        'revenue': revenue,
+        'bills': bills
+    } for (product_id, day), (quantity, revenue, bills) in merged.items()])
+
+def _bill_lines(bill, sign):
+    day = (bill.created_at or datetime.utcnow()).date()
+    per_product = {}
+    
+    for item in bill.items:
+        quantity, revenue = per_product.get(item.product_id, (0, 0.0))
+        per_product[item.product_id] = (quantity + item.quantity, revenue + item.total)
+    
+    return [(product_id, day, sign * quantity, sign * revenue, sign)
+            for product_id, (quantity, revenue) in per_product.items()]
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_sales(session, flush_context):
+    """Keep daily aggregates in step with completed bills inside the same transaction"""
+    lines = []
+    
+    for obj in session.new:
+        if isinstance(obj, Bill) and obj.status == 'completed':
+            lines.extend(_bill_lines(obj, 1))
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Bill):
+            continue
+        
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes():
+            continue
+        
+        was_completed = 'completed' in (history.deleted or ())
+        if obj.status == 'completed' and not was_completed:
+            lines.extend(_bill_lines(obj, 1))
+        elif was_completed and obj.status != 'completed':
+            lines.extend(_bill_lines(obj, -1))
+    
+    if lines:
+        add_daily_sales(session.connection(), lines)
+
+def resolve_window(window='30d', start=None, end=None):
+    """Turn a named window or custom start/end ISO dates into an inclusive (start, end) date range"""
+    today = datetime.utcnow().date()
+    
+    if window == 'custom':
+        if not start:
+            raise ValueError('Custom window needs a start date')
+        start_day = datetime.fromisoformat(start).date()
+        end_day = datetime.fromisoformat(end).date() if end else today
+    elif window == 'all':
+        start_day, end_day = None, today
+    elif window in WINDOWS:
+        start_day, end_day = today - timedelta(days=WINDOWS[window] - 1), today
+    else:
+        raise ValueError(f"Unknown window '{window}'")
+    
+    return start_day, end_day
+
+def top_products(start_day, end_day, by='quantity', limit=5, category=None):
+    """Top products in a date range from daily aggregates, selected with a heap"""
+    if by not in ('quantity', 'revenue'):
+        raise ValueError("by must be 'quantity' or 'revenue'")
+    
+    query = db.session.query(
+        ProductDailySales.product_id,
+        func.sum(ProductDailySales.quantity),
+        func.sum(ProductDailySales.revenue)
+    ).filter(ProductDailySales.day <= end_day)
+    
+    if start_day:
+        query = query.filter(ProductDailySales.day >= start_day)
+    if category:
+        query = query.join(Product, Product.id == ProductDailySales.product_id).filter(Product.category == category)
+    
+    rows = query.group_by(ProductDailySales.product_id).all()
+    
+    key = 1 if by == 'quantity' else 2
+    top = heapq.nlargest(limit, (r for r in rows if r[1] > 0), key=lambda r: r[key])
+    
+    products = {p.id: p for p in Product.query.filter(Product.id.in_([r[0] for r in top])).all()} if top else {}
+    
+    return [{
+        'product_id': product_id,
+        'name': products[product_id].name if product_id in products else None,
+        'category': products[product_id].category if product_id in products else None,
+        'quantity': quantity,
+        'revenue': round(revenue, 2)
+    } for product_id, quantity, revenue in top]
+
+def sales_by_barcode(start_day, end_day, category=None):
+    """Get {barcode: (name, category, quantity, revenue)} from daily aggregates, for merging across stores"""
+    query = db.session.query(
+        Product.barcode, Product.name, Product.category,
+        func.sum(ProductDailySales.quantity), func.sum(ProductDailySales.revenue)
+    ).join(Product, Product.id == ProductDailySales.product_id).filter(ProductDailySales.day <= end_day)
+    
+    if start_day:
+        query = query.filter(ProductDailySales.day >= start_day)
+    if category:
+        query = query.filter(Product.category == category)
+    
+    rows = query.group_by(Product.barcode, Product.name, Product.category).all()
+    return {barcode: (name, category, quantity, revenue) for barcode, name, category, quantity, revenue in rows}
+
+def daily_totals(day):
+    """Get bills, sales, discount and bill lines of completed bills on a day, live and archived"""
+    bills, sales, discount = db.session.query(
+        func.count(Bill.id), func.coalesce(func.sum(Bill.total), 0), func.coalesce(func.sum(Bill.discount), 0)
+    ).filter(func.date(Bill.created_at) == day.isoformat(), Bill.status == 'completed').one()
+    
+    items = db.session.query(func.count(BillItem.id)).join(Bill, Bill.id == BillItem.bill_id).filter(
+        func.date(Bill.created_at) == day.isoformat(), Bill.status == 'completed'
+    ).scalar()
+    
+    # Closed months live in the archive; add whatever was archived for this date
+    archived_bills, archived_sales, archived_discount, archived_items = archived_daily_totals(day)
+    
+    return {
+        'bills': bills + archived_bills,
+        'sales': sales + archived_sales,
+        'discount': discount + archived_discount,
+        'items': items + archived_items
+    }
+
+def rebuild_daily_sales(since=None):
+    """Recompute daily aggregates from completed bills, optionally from a start date on.
+    
+    Archived months are no longer in the bills table, so by default only the
+    days after the last archived month are rebuilt.
+    """
+    latest = latest_archived_month()
+    if latest:
+        first_live = datetime.fromisoformat(month_bounds(latest)[1]).date()
+        since = max(since, first_live) if since else first_live
+    
+    connection = db.session.connection()
+    table = ProductDailySales.__table__
+    
+    if since:
+        connection.execute(delete(table).where(table.c.day >= since))
+    else:
+        connection.execute(delete(table))
+    
+    # Partial returns leave the bill completed, so net out returned quantities per line
+    returned = (
+        select(BillReturnItem.bill_item_id, func.sum(BillReturnItem.quantity).label('quantity'))
+        .group_by(BillReturnItem.bill_item_id)
+        .subquery()
+    )
+    net = BillItem.quantity - func.coalesce(returned.c.quantity, 0)
+    
+    day = func.date(Bill.created_at)
+    query = (
+        select(BillItem.product_id, day, func.sum(net), func.sum(BillItem.total * net / BillItem.quantity), func.count(func.distinct(Bill.id)))
+        .join(Bill, Bill.id == BillItem.bill_id)
+        .outerjoin(returned, returned.c.bill_item_id == BillItem.id)
+        .where(Bill.status == 'completed', net > 0)
+        .group_by(BillItem.product_id, day)
+    )
+    if since:
+        query = query.where(Bill.created_at >= datetime.combine(since, datetime.min.time()))
+    
+    rows = connection.execute(query).all()
+    add_daily_sales(connection, [
+        (product_id, datetime.fromisoformat(d).date(), quantity, revenue, bills)
+        for product_id, d, quantity, revenue, bills in rows
+    ])
+    db.session.commit()
+    
+    return len(rows)
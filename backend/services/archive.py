@@ -0,0 +1,234 @@
+from sqlalchemy import create_engine, text
+from models.database import db, store_engine, Bill, BillItem, Transaction, InventoryLog, BillReturn, BillReturnItem, Product, ArchiveMonth, ArchivedBill, BillTax
+from services.stores import store_dir
+from contextlib import closing
+from datetime import datetime
+import os
+import sqlite3
+
+# Tables whose closed-period rows move to the monthly archive databases
+ARCHIVED_TABLES = [Bill.__table__, BillItem.__table__, Transaction.__table__, InventoryLog.__table__,
+                   BillReturn.__table__, BillReturnItem.__table__]
+
+def month_bounds(month):
+    """Get the [start, end) timestamps of a YYYY-MM month as strings comparable with created_at"""
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start.isoformat(' '), end.isoformat(' ')
+
+def archive_path(month):
+    return os.path.join(store_dir('ARCHIVE_DIR'), f'supermart-{month}.db')
+
+def archivable_months(keep_months=3):
+    """Closed months older than the last keep_months that still have bills in the live database"""
+    now = datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (keep_months - 1)
+    cutoff = datetime(index // 12, index % 12 + 1, 1).isoformat(' ')
+    
+    rows = db.session.execute(text(
+        "SELECT DISTINCT substr(created_at, 1, 7) FROM bills "
+        "WHERE created_at < :cutoff AND status != 'hold' ORDER BY 1"
+    ), {'cutoff': cutoff}).all()
+    
+    return [r[0] for r in rows]
+
+def archive_month(month):
+    """Move a closed month's bills, items, transactions and inventory logs into its archive database.
+    
+    The copy commits first and the live rows are deleted in a second
+    transaction, only where the archive holds them: with the live database
+    in WAL mode a transaction over attached databases is not atomic as a
+    whole. Copies use INSERT OR IGNORE, so re-running after an interruption
+    (or to pick up late rows) is safe. Held bills stay live.
+    """
+    start, end = month_bounds(month)
+    if end > datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat(' '):
+        raise ValueError(f'{month} is not closed yet')
+    
+    path = archive_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    # Archive tables share the live schema, so rows copy column for column
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine, tables=ARCHIVED_TABLES)
+    engine.dispose()
+    
+    params = {'start': start, 'end': end, 'month': month, 'path': path, 'now': datetime.utcnow().isoformat(' ')}
+    moving = 'SELECT id FROM temp.moving_bills'
+    
+    raw = store_engine().raw_connection()
+    try:
+        connection = raw.driver_connection
+        isolation_level = connection.isolation_level
+        connection.isolation_level = None
+        connection.execute('ATTACH DATABASE ? AS archive', (path,))
+        
+        try:
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    "CREATE TEMP TABLE moving_bills AS SELECT id FROM main.bills "
+                    "WHERE created_at >= :start AND created_at < :end AND status != 'hold'", params
+                )
+                
+                counts = {
+                    'bills': connection.execute(f'INSERT OR IGNORE INTO archive.bills SELECT * FROM main.bills WHERE id IN ({moving})').rowcount,
+                    'bill_items': connection.execute(f'INSERT OR IGNORE INTO archive.bill_items SELECT * FROM main.bill_items WHERE bill_id IN ({moving})').rowcount,
+                    'transactions': connection.execute(f'INSERT OR IGNORE INTO archive.transactions SELECT * FROM main.transactions WHERE bill_id IN ({moving})').rowcount,
+                    'inventory_logs': connection.execute(
+                        'INSERT OR IGNORE INTO archive.inventory_logs SELECT * FROM main.inventory_logs '
+                        f'WHERE created_at >= :start AND created_at < :end AND (bill_id IS NULL OR bill_id IN ({moving}))', params
+                    ).rowcount
+                }
+                
+                # Returns travel with their bill; they are not counted separately
+                connection.execute(f'INSERT OR IGNORE INTO archive.bill_returns SELECT * FROM main.bill_returns WHERE bill_id IN ({moving})')
+                connection.execute(
+                    'INSERT OR IGNORE INTO archive.bill_return_items SELECT * FROM main.bill_return_items '
+                    f'WHERE return_id IN (SELECT id FROM main.bill_returns WHERE bill_id IN ({moving}))'
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute(
+                    'INSERT INTO main.archive_months (month, path, bills, bill_items, transactions, inventory_logs, archived_at) '
+                    'VALUES (:month, :path, :bills, :bill_items, :transactions, :inventory_logs, :now) '
+                    'ON CONFLICT (month) DO UPDATE SET bills = bills + excluded.bills, bill_items = bill_items + excluded.bill_items, '
+                    'transactions = transactions + excluded.transactions, inventory_logs = inventory_logs + excluded.inventory_logs, '
+                    'archived_at = excluded.archived_at',
+                    dict(params, **counts)
+                )
+                connection.execute(
+                    'INSERT OR REPLACE INTO main.archived_bills '
+                    '(bill_id, bill_number, customer_id, month, status, total, items_count, created_at) '
+                    'SELECT b.id, b.bill_number, b.customer_id, :month, b.status, b.total, '
+                    '(SELECT COUNT(*) FROM main.bill_items i WHERE i.bill_id = b.id), b.created_at '
+                    f'FROM main.bills b WHERE b.id IN ({moving})', params
+                )
+                
+                # Rows that arrived after the copy are left for the next run
+                connection.execute(f'DELETE FROM main.idempotency_keys WHERE bill_id IN ({moving})')
+                for table in ('inventory_logs', 'transactions', 'bill_return_items', 'bill_returns', 'bill_items', 'bills'):
+                    connection.execute(f'DELETE FROM main.{table} WHERE id IN (SELECT id FROM archive.{table})')
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.execute('DROP TABLE IF EXISTS temp.moving_bills')
+            connection.execute('DETACH DATABASE archive')
+            connection.isolation_level = isolation_level
+    finally:
+        raw.close()
+    
+    return dict(counts, month=month)
+
+def vacuum_live():
+    """Rebuild the live database file so space freed by archiving is returned to the OS"""
+    raw = store_engine().raw_connection()
+    try:
+        connection = raw.driver_connection
+        isolation_level = connection.isolation_level
+        connection.isolation_level = None
+        connection.execute('VACUUM')
+        connection.isolation_level = isolation_level
+    finally:
+        raw.close()
+
+# ==================== READ ROUTING ====================
+
+def archived_month_for(day):
+    """Get the ArchiveMonth holding a date, or None if the month is still live"""
+    return ArchiveMonth.query.get(day.strftime('%Y-%m'))
+
+def latest_archived_month():
+    return db.session.query(db.func.max(ArchiveMonth.month)).scalar()
+
+def open_archive(month, attach_live=False):
+    """Read-only connection to a month's archive, optionally with the live database attached as `live`"""
+    archive = ArchiveMonth.query.get(month)
+    connection = sqlite3.connect(f'file:{archive.path}?mode=ro', uri=True)
+    
+    if attach_live:
+        connection.execute('ATTACH DATABASE ? AS live', (f'file:{store_engine().url.database}?mode=ro',))
+    
+    return connection
+
+def find_archived_bill(bill_id):
+    """Get an archived bill in the same shape as GET /api/bills/<id>, or None"""
+    entry = ArchivedBill.query.get(bill_id)
+    if not entry:
+        return None
+    
+    with closing(open_archive(entry.month)) as connection:
+        connection.row_factory = sqlite3.Row
+        bill = connection.execute('SELECT * FROM bills WHERE id = ?', (bill_id,)).fetchone()
+        items = connection.execute('SELECT * FROM bill_items WHERE bill_id = ?', (bill_id,)).fetchall()
+    
+    if not bill:
+        return None
+    
+    names = dict(db.session.query(Product.id, Product.name).filter(
+        Product.id.in_([i['product_id'] for i in items])
+    ).all())
+    
+    return {
+        'id': bill['id'],
+        'bill_number': bill['bill_number'],
+        'customer_id': bill['customer_id'],
+        'subtotal': bill['subtotal'],
+        'discount': bill['discount'],
+        'tax': bill['tax'],
+        # The tax breakup stays in the live database for GST returns
+        'taxes': [{'rate': r, 'taxable': t, 'tax': x} for r, t, x in db.session.query(
+            BillTax.rate, BillTax.taxable, BillTax.tax
+        ).filter(BillTax.bill_id == bill_id, BillTax.taxable >= 0).order_by(BillTax.rate)],
+        'total': bill['total'],
+        'payment_mode': bill['payment_mode'],
+        'status': bill['status'],
+        'created_at': datetime.fromisoformat(bill['created_at']).isoformat(),
+        'archived': True,
+        'items': [{
+            'product_id': item['product_id'],
+            'product_name': names.get(item['product_id']),
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'discount': item['discount'],
+            'total': item['total']
+        } for item in items]
+    }
+
+def archived_purchases(customer_id):
+    """Purchase history rows for a customer's archived bills, newest first, from the live index only"""
+    entries = ArchivedBill.query.filter_by(customer_id=customer_id).order_by(ArchivedBill.created_at.desc()).all()
+    
+    return [{
+        'bill_id': e.bill_id,
+        'bill_number': e.bill_number,
+        'total': e.total,
+        'items_count': e.items_count,
+        'created_at': e.created_at.isoformat(),
+        'archived': True
+    } for e in entries]
+
+def archived_daily_totals(day):
+    """Get (bills, sales, discount, items) for completed archived bills on a day"""
+    archive = archived_month_for(day)
+    if not archive:
+        return 0, 0, 0, 0
+    
+    with closing(open_archive(archive.month)) as connection:
+        bills, sales, discount = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(total), 0), COALESCE(SUM(discount), 0) FROM bills "
+            "WHERE date(created_at) = ? AND status = 'completed'", (day.isoformat(),)
+        ).fetchone()
+        items = connection.execute(
+            "SELECT COUNT(*) FROM bill_items i JOIN bills b ON b.id = i.bill_id "
+            "WHERE date(b.created_at) = ? AND b.status = 'completed'", (day.isoformat(),)
+        ).fetchone()[0]
+    
+    return bills, sales, discount, items
@@ -0,0 +1,237 @@
+from flask import g
+from models.database import store_engine
+from services.stores import use_store, store_dir, current_store, StoreLocal
+from collections import deque
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+KEEP_BACKUPS = 14
+
+# Tables counted into each manifest and compared again on verification
+COUNTED_TABLES = ('products', 'customers', 'bills', 'bill_items', 'transactions', 'inventory_logs')
+
+class BackupError(Exception):
+    """Raised when a backup cannot be taken or found"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class BackupMetrics:
+    """Backup timings plus request latency split by whether a backup of the request's store was running"""
+    def __init__(self, window=2000):
+        self._lock = threading.Lock()
+        self._backups = deque(maxlen=50)
+        self._latency = {'idle': deque(maxlen=window), 'during_backup': deque(maxlen=window)}
+        self._running = set()  # stores with a backup in progress
+    
+    @property
+    def running(self):
+        """Whether the current store is being backed up"""
+        return current_store() in self._running
+    
+    def backup_started(self, store):
+        with self._lock:
+            self._running.add(store)
+    
+    def backup_finished(self, store):
+        with self._lock:
+            self._running.discard(store)
+    
+    def init_app(self, app):
+        @app.before_request
+        def _start_timer():
+            # The request's store is not selected yet; keep every store being backed up
+            g.backup_timer = (time.perf_counter(), frozenset(self._running))
+        
+        @app.after_request
+        def _record_latency(response):
+            started = g.pop('backup_timer', None)
+            if started:
+                # A request that overlapped a backup of its store at either end counts as during
+                during_backup = current_store() in started[1] or self.running
+                self.record_request((time.perf_counter() - started[0]) * 1000, during_backup)
+            return response
+    
+    def record_request(self, milliseconds, during_backup):
+        with self._lock:
+            self._latency['during_backup' if during_backup else 'idle'].append(milliseconds)
+    
+    def record_backup(self, manifest, store):
+        with self._lock:
+            self._backups.append(dict({k: manifest[k] for k in ('name', 'created_at', 'duration_ms', 'pages', 'size')}, store=store))
+    
+    def snapshot(self):
+        store = current_store()
+        with self._lock:
+            backups = [b for b in self._backups if b['store'] == store]
+            latency = {k: sorted(v) for k, v in self._latency.items()}
+        
+        def percentile(values, p):
+            return round(values[min(len(values) - 1, int(len(values) * p / 100))], 2) if values else None
+        
+        return {
+            'running': self.running,
+            'backups': backups,
+            'latency_ms': {k: {
+                'count': len(v),
+                'p50': percentile(v, 50),
+                'p95': percentile(v, 95),
+                'p99': percentile(v, 99)
+            } for k, v in latency.items()}
+        }
+
+backup_metrics = BackupMetrics()
+# One backup at a time per store; stores are separate files and back up independently
+_backup_locks = StoreLocal(threading.Lock)
+
+def database_path():
+    return store_engine().url.database
+
+def create_backup(backup_dir, keep=KEEP_BACKUPS):
+    """Take an online snapshot of the live database, gzip it and write a checksummed manifest.
+    
+    The copy is a single backup step inside one read transaction on the
+    source, so it is the database as of that transaction. Under WAL a reader
+    never blocks writers, so checkouts keep committing meanwhile. A backup
+    in several steps restarts from the first page whenever another
+    connection writes between steps, and on a busy store may never finish.
+    """
+    store = current_store()
+    lock = _backup_locks.for_store(store)
+    if not lock.acquire(blocking=False):
+        raise BackupError(f'A backup of {store} is already running', 409)
+    
+    try:
+        backup_metrics.backup_started(store)
+        os.makedirs(backup_dir, exist_ok=True)
+        
+        created_at = datetime.utcnow()
+        name = f"supermart-{created_at.strftime('%Y%m%d-%H%M%S')}-{created_at.microsecond // 1000:03d}"
+        snapshot_path = os.path.join(backup_dir, name + '.db.tmp')
+        archive_path = os.path.join(backup_dir, name + '.db.gz')
+        
+        started = time.perf_counter()
+        source = sqlite3.connect(database_path(), isolation_level=None)
+        target = sqlite3.connect(snapshot_path)
+        try:
+            # The first read pins the WAL snapshot the whole copy is taken from
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            source.backup(target)
+            source.execute('COMMIT')
+            counts = _count_rows(target)
+            page_count = target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        duration = (time.perf_counter() - started) * 1000
+        
+        with open(snapshot_path, 'rb') as raw, gzip.open(archive_path, 'wb', compresslevel=6) as compressed:
+            shutil.copyfileobj(raw, compressed)
+        os.remove(snapshot_path)
+        
+        manifest = {
+            'name': name,
+            'file': os.path.basename(archive_path),
+            'created_at': created_at.isoformat(),
+            'sha256': _sha256(archive_path),
+            'size': os.path.getsize(archive_path),
+            'pages': page_count,
+            'duration_ms': round(duration, 2),
+            'counts': counts
+        }
+        with open(os.path.join(backup_dir, name + '.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        
+        backup_metrics.record_backup(manifest, store)
+        _prune(backup_dir, keep)
+        
+        return manifest
+    finally:
+        backup_metrics.backup_finished(store)
+        lock.release()
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _count_rows(connection):
+    existing = {r[0] for r in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {t: connection.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in COUNTED_TABLES if t in existing}
+
+def _prune(backup_dir, keep):
+    for manifest in list_backups(backup_dir)[keep:]:
+        for filename in (manifest['file'], manifest['name'] + '.json'):
+            path = os.path.join(backup_dir, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_backups(backup_dir):
+    """Get backup manifests, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    
+    manifests = []
+    for filename in os.listdir(backup_dir):
+        if filename.startswith('supermart-') and filename.endswith('.json'):
+            with open(os.path.join(backup_dir, filename)) as f:
+                manifests.append(json.load(f))
+    
+    return sorted(manifests, key=lambda m: m['created_at'], reverse=True)
+
+def verify_backup(backup_dir, name=None):
+    """Check a backup restores cleanly: checksum, integrity_check and row counts against its manifest"""
+    manifests = list_backups(backup_dir)
+    manifest = next((m for m in manifests if name in (None, m['name'], m['file'])), None)
+    if not manifest:
+        raise BackupError(f"Backup {name} not found" if name else 'No backups found', 404)
+    
+    archive_path = os.path.join(backup_dir, manifest['file'])
+    checks = {'checksum': _sha256(archive_path) == manifest['sha256']}
+    
+    if checks['checksum']:
+        with tempfile.TemporaryDirectory() as scratch:
+            restored = os.path.join(scratch, 'restored.db')
+            with gzip.open(archive_path, 'rb') as compressed, open(restored, 'wb') as raw:
+                shutil.copyfileobj(compressed, raw)
+            
+            connection = sqlite3.connect(restored)
+            try:
+                checks['integrity'] = connection.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+                checks['counts'] = _count_rows(connection) == manifest['counts']
+            finally:
+                connection.close()
+    
+    return {
+        'name': manifest['name'],
+        'ok': all(checks.values()) and len(checks) == 3,
+        'checks': checks
+    }
+
+def start_backup_scheduler(app, interval_minutes):
+    """Back up every store every interval_minutes on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval_minutes * 60)
+            for store in app.config['STORES']:
+                with use_store(store, app):
+                    try:
+                        create_backup(store_dir('BACKUP_DIR'))
+                    except Exception as e:
+                        app.logger.error(f'Scheduled backup of {store} failed: {e}')
+    
+    thread = threading.Thread(target=run, name='backup-scheduler', daemon=True)
+    thread.start()
+    return thread
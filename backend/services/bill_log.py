@@ -0,0 +1,294 @@
+from sqlalchemy import event, select, insert, func
+from sqlalchemy.orm import Session, selectinload
+from models.database import db, Bill, Transaction, BillReturn, BillEvent, BillEventSegment, ArchivedBill
+from datetime import datetime, timedelta
+import hashlib
+import json
+
+SEGMENT_SIZE = 10000  # events per sealed segment
+REPLAY_BATCH = 5000
+GENESIS_HASH = '0' * 64
+
+def canonical(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'))
+
+def chain_hash(previous, seq, bill_id, event_type, payload, created_at):
+    """Hash of one event, chained to the one before it; payload is the stored canonical JSON"""
+    return hashlib.sha256(
+        f'{previous}|{seq}|{bill_id}|{event_type}|{created_at.isoformat()}|{payload}'.encode()
+    ).hexdigest()
+
+def append_events(connection, events):
+    """Append (bill_id, event, payload) entries to the chain with one batched insert.
+    
+    Runs in the caller's transaction, after the bill change itself has
+    taken SQLite's write lock, so no other writer can read the same head.
+    Segments that fill up are sealed with the hash of their last event.
+    """
+    if not events:
+        return
+    
+    events_table = BillEvent.__table__
+    head = connection.execute(
+        select(events_table.c.seq, events_table.c.hash).order_by(events_table.c.seq.desc()).limit(1)
+    ).first()
+    seq, previous = head if head else (0, GENESIS_HASH)
+    now = datetime.utcnow()
+    
+    rows, sealed = [], []
+    for bill_id, event_type, payload in events:
+        seq += 1
+        payload = canonical(payload)
+        previous = chain_hash(previous, seq, bill_id, event_type, payload, now)
+        rows.append({'seq': seq, 'bill_id': bill_id, 'event': event_type, 'payload': payload,
+                     'created_at': now, 'hash': previous})
+        if seq % SEGMENT_SIZE == 0:
+            sealed.append({'segment': seq // SEGMENT_SIZE - 1, 'first_seq': seq - SEGMENT_SIZE + 1,
+                           'last_seq': seq, 'head_hash': previous, 'sealed_at': now})
+    
+    connection.execute(insert(events_table), rows)
+    if sealed:
+        connection.execute(insert(BillEventSegment.__table__), sealed)
+
+def bill_snapshot(bill):
+    return {
+        'bill_number': bill.bill_number,
+        'customer_id': bill.customer_id,
+        'status': bill.status,
+        'payment_mode': bill.payment_mode,
+        'subtotal': bill.subtotal,
+        'discount': bill.discount,
+        'tax': bill.tax,
+        'total': bill.total,
+        'created_at': (bill.created_at or datetime.utcnow()).isoformat(),
+        'items': [[i.product_id, i.quantity, i.unit_price, i.discount, i.total] for i in bill.items]
+    }
+
+def status_event(bill_id, previous, status):
+    return (bill_id, 'status', {'from': previous, 'to': status})
+
+@event.listens_for(Session, 'after_flush')
+def _log_bill_events(session, flush_context):
+    """Log created bills, status changes, tenders and returns flushed through the ORM"""
+    events = []
+    
+    for obj in session.new:
+        if isinstance(obj, Bill):
+            events.append((obj.id, 'created', bill_snapshot(obj)))
+    
+    for obj in session.dirty:
+        if isinstance(obj, Bill):
+            history = db.inspect(obj).attrs.status.history
+            if history.has_changes():
+                events.append(status_event(obj.id, history.deleted[0] if history.deleted else None, obj.status))
+    
+    for obj in session.new:
+        if isinstance(obj, Transaction) and obj.status == 'success':
+            events.append((obj.bill_id, 'payment', {
+                'transaction_id': obj.id,
+                'payment_mode': obj.payment_mode,
+                'amount': obj.amount,
+                'reference_number': obj.reference_number
+            }))
+        elif isinstance(obj, BillReturn):
+            events.append((obj.bill_id, 'return', {
+                'return_id': obj.id,
+                'exchange_bill_id': obj.exchange_bill_id,
+                'refund_amount': obj.refund_amount,
+                'items': [[i.product_id, i.quantity, i.amount] for i in obj.items]
+            }))
+    
+    if events:
+        append_events(session.connection(), events)
+
+# ==================== REPLAY ====================
+
+def apply_event(state, event_type, payload):
+    """Fold one event into a bill's state; state is None before its first event"""
+    if event_type in ('created', 'snapshot'):
+        state = dict(payload, paid=payload.get('paid', 0), refunded=payload.get('refunded', 0),
+                     tenders=payload.get('tenders', 0), returns=payload.get('returns', 0))
+    elif state is None:
+        # History starts before the log did; keep what the event says
+        state = {'status': None, 'total': None, 'paid': 0, 'refunded': 0, 'tenders': 0, 'returns': 0}
+    
+    if event_type == 'status':
+        state['status'] = payload['to']
+    elif event_type == 'payment':
+        state['paid'] = round(state['paid'] + payload['amount'], 2)
+        state['tenders'] += 1
+    elif event_type == 'return':
+        state['refunded'] = round(state['refunded'] + payload['refund_amount'], 2)
+        state['returns'] += 1
+    return state
+
+def iter_events(since=0, until=None, bill_ids=None, batch=REPLAY_BATCH):
+    """Events in seq order as (seq, bill_id, event, payload JSON, created_at, hash), read in keyset pages"""
+    events_table = BillEvent.__table__
+    while True:
+        query = select(
+            events_table.c.seq, events_table.c.bill_id, events_table.c.event,
+            events_table.c.payload, events_table.c.created_at, events_table.c.hash
+        ).where(events_table.c.seq > since).order_by(events_table.c.seq).limit(batch)
+        if until is not None:
+            query = query.where(events_table.c.seq <= until)
+        if bill_ids is not None:
+            query = query.where(events_table.c.bill_id.in_(bill_ids))
+        
+        rows = db.session.execute(query).all()
+        yield from rows
+        if len(rows) < batch:
+            return
+        since = rows[-1][0]
+
+def replay(since=0, until=None, bill_ids=None):
+    """Rebuild bill states from the log; returns ({bill_id: state}, events read)"""
+    states, count = {}, 0
+    for _, bill_id, event_type, payload, _, _ in iter_events(since, until, bill_ids):
+        states[bill_id] = apply_event(states.get(bill_id), event_type, json.loads(payload))
+        count += 1
+    return states, count
+
+def bill_history(bill_id):
+    """A bill's events, each checked against its predecessor in the chain, and the state they add up to"""
+    rows = db.session.execute(
+        select(BillEvent.seq, BillEvent.event, BillEvent.payload, BillEvent.created_at, BillEvent.hash)
+        .where(BillEvent.bill_id == bill_id).order_by(BillEvent.seq)
+    ).all()
+    previous = dict(db.session.execute(
+        select(BillEvent.seq, BillEvent.hash).where(BillEvent.seq.in_([r[0] - 1 for r in rows]))
+    ).all())
+    
+    events, state = [], None
+    for seq, event_type, payload, created_at, stored_hash in rows:
+        expected = chain_hash(previous.get(seq - 1, GENESIS_HASH), seq, bill_id, event_type, payload, created_at)
+        payload = json.loads(payload)
+        state = apply_event(state, event_type, payload)
+        events.append({
+            'seq': seq,
+            'event': event_type,
+            'data': payload,
+            'created_at': created_at.isoformat(),
+            'hash': stored_hash,
+            'verified': expected == stored_hash
+        })
+    
+    return {'events': events, 'state': state}
+
+def verify_chain(since_segment=0):
+    """Recompute the chain from a segment onwards; returns counts and the first broken seq, if any"""
+    segments = {s.segment: s for s in BillEventSegment.query.filter(BillEventSegment.segment >= since_segment - 1)}
+    start = since_segment * SEGMENT_SIZE
+    if start == 0:
+        previous = GENESIS_HASH
+    elif since_segment - 1 in segments:
+        previous = segments[since_segment - 1].head_hash
+    else:
+        return {'ok': False, 'events': 0, 'segments': 0, 'broken_at': start, 'error': 'Previous segment is not sealed'}
+    
+    checked = sealed = 0
+    for seq, bill_id, event_type, payload, created_at, stored_hash in iter_events(since=start):
+        expected = chain_hash(previous, seq, bill_id, event_type, payload, created_at)
+        if seq != start + checked + 1 or expected != stored_hash:
+            return {'ok': False, 'events': checked, 'segments': sealed, 'broken_at': start + checked + 1}
+        
+        checked += 1
+        previous = stored_hash
+        if seq % SEGMENT_SIZE == 0:
+            segment = segments.get(seq // SEGMENT_SIZE - 1)
+            if not segment or segment.head_hash != stored_hash:
+                return {'ok': False, 'events': checked, 'segments': sealed, 'broken_at': seq,
+                        'error': 'Segment seal does not match'}
+            sealed += 1
+    
+    return {'ok': True, 'events': checked, 'segments': sealed, 'broken_at': None, 'head': previous}
+
+def log_status():
+    head = db.session.execute(select(BillEvent.seq, BillEvent.hash).order_by(BillEvent.seq.desc()).limit(1)).first()
+    return {
+        'events': head[0] if head else 0,
+        'head': head[1] if head else GENESIS_HASH,
+        'segments': db.session.query(func.count(BillEventSegment.segment)).scalar(),
+        'segment_size': SEGMENT_SIZE
+    }
+
+def _live_state(bill_ids):
+    """Status, total, tenders and refunds of live bills, in the shape apply_event builds"""
+    paid = dict(db.session.query(Transaction.bill_id, func.sum(Transaction.amount)).filter(
+        Transaction.bill_id.in_(bill_ids), Transaction.status == 'success'
+    ).group_by(Transaction.bill_id).all())
+    refunded = dict(db.session.query(BillReturn.bill_id, func.sum(BillReturn.refund_amount)).filter(
+        BillReturn.bill_id.in_(bill_ids)
+    ).group_by(BillReturn.bill_id).all())
+    
+    return {bill_id: {
+        'status': status,
+        'total': total,
+        'paid': round(paid.get(bill_id) or 0, 2),
+        'refunded': round(refunded.get(bill_id) or 0, 2)
+    } for bill_id, status, total in db.session.query(Bill.id, Bill.status, Bill.total).filter(Bill.id.in_(bill_ids))}
+
+def audit_day(day):
+    """Replay the log for a day's bills and compare each with its row; archived bills are checked against the archive index"""
+    start = datetime.combine(day, datetime.min.time())
+    live_ids = [r[0] for r in db.session.query(Bill.id).filter(Bill.created_at >= start, Bill.created_at < start + timedelta(days=1))]
+    archived = dict(db.session.query(ArchivedBill.bill_id, ArchivedBill.status).filter(
+        ArchivedBill.created_at >= start, ArchivedBill.created_at < start + timedelta(days=1)
+    ).all())
+    
+    states, events = replay(bill_ids=live_ids + list(archived))
+    live = _live_state(live_ids)
+    
+    mismatches, unlogged = [], []
+    for bill_id in live_ids + list(archived):
+        state = states.get(bill_id)
+        if state is None:
+            unlogged.append(bill_id)
+            continue
+        
+        if bill_id in live:
+            actual = live[bill_id]
+        else:
+            actual = {'status': archived[bill_id]}
+        
+        differences = {k: {'log': state.get(k), 'bill': v} for k, v in actual.items() if state.get(k) != v}
+        if differences:
+            mismatches.append({'bill_id': bill_id, 'differences': differences})
+    
+    return {
+        'day': day.isoformat(),
+        'bills': len(live_ids) + len(archived),
+        'events': events,
+        'matched': len(live_ids) + len(archived) - len(mismatches) - len(unlogged),
+        'mismatches': mismatches,
+        'unlogged': unlogged
+    }
+
+def backfill_bill_log(batch=REPLAY_BATCH):
+    """Log a snapshot event for each live bill with no history yet, e.g. bills made before the log existed"""
+    logged = select(BillEvent.bill_id)
+    written = 0
+    while True:
+        bills = Bill.query.options(selectinload(Bill.items)).filter(
+            Bill.id.notin_(logged)
+        ).order_by(Bill.created_at).limit(batch).all()
+        if not bills:
+            return written
+        
+        live = _live_state([b.id for b in bills])
+        returns = dict(db.session.query(BillReturn.bill_id, func.count(BillReturn.id)).filter(
+            BillReturn.bill_id.in_([b.id for b in bills])
+        ).group_by(BillReturn.bill_id).all())
+        tenders = dict(db.session.query(Transaction.bill_id, func.count(Transaction.id)).filter(
+            Transaction.bill_id.in_([b.id for b in bills]), Transaction.status == 'success'
+        ).group_by(Transaction.bill_id).all())
+        
+        append_events(db.session.connection(), [(b.id, 'snapshot', dict(
+            bill_snapshot(b),
+            paid=live[b.id]['paid'],
+            refunded=live[b.id]['refunded'],
+            tenders=tenders.get(b.id, 0),
+            returns=returns.get(b.id, 0)
+        )) for b in bills])
+        db.session.commit()
+        written += len(bills)
@@ -0,0 +1,291 @@
+from models.database import db
+from sqlalchemy import text
+from services.archive import archived_month_for, open_archive
+from contextlib import closing
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import numpy as np
+
+# Column layout of each day partition; string columns are dictionary-encoded
+# with codes shared across days so group-bys are plain np.bincount calls
+TABLES = {
+    'bills': ['hour', 'status', 'payment_mode', 'subtotal', 'discount', 'tax', 'total', 'lines', 'units'],
+    'items': ['bill', 'category', 'quantity', 'total', 'discount'],
+    'transactions': ['bill', 'payment_mode', 'amount']
+}
+DICTIONARIES = ('status', 'payment_mode', 'category')
+
+class ColumnarStore:
+    """Day-partitioned NumPy snapshot of bills, bill items and transactions.
+    
+    Each day is a directory of .npy files, one per column, loaded with
+    mmap_mode='r'. export_pending() appends the days missing since the last
+    export, and writes a closed day again when a return or a tender posted
+    since then touched its bills.
+    """
+    def __init__(self, root):
+        self.root = root
+        self._manifest_path = os.path.join(root, 'manifest.json')
+        self._dictionary_path = os.path.join(root, 'dictionaries.json')
+    
+    # ==================== EXPORT ====================
+    
+    def manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return {'days': {}}
+        with open(self._manifest_path) as f:
+            return json.load(f)
+    
+    def dictionaries(self):
+        if not os.path.exists(self._dictionary_path):
+            return {name: [] for name in DICTIONARIES}
+        with open(self._dictionary_path) as f:
+            return json.load(f)
+    
+    def export_pending(self, include_today=False, rebuild=False):
+        """Export every day after the last exported one; today only when asked (it is not closed)"""
+        if rebuild and os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        
+        manifest = self.manifest()
+        started = datetime.utcnow()
+        today = started.date()
+        last_day = today if include_today else today - timedelta(days=1)
+        
+        # Days exported while still open are exported again until closed
+        open_days = [d for d, meta in manifest['days'].items() if not meta.get('closed')]
+        
+        if open_days:
+            first_day = datetime.fromisoformat(min(open_days)).date()
+        elif manifest['days']:
+            first_day = max(datetime.fromisoformat(d).date() for d in manifest['days']) + timedelta(days=1)
+        else:
+            first = db.session.execute(text(
+                'SELECT MIN(created_at) FROM (SELECT created_at FROM bills UNION ALL SELECT created_at FROM archived_bills)'
+            )).scalar()
+            if not first:
+                return []
+            first_day = datetime.fromisoformat(str(first)).date()
+        
+        exported = []
+        for day in self._changed_days(manifest, first_day):
+            exported.append(self.export_day(day, manifest))
+        
+        day = first_day
+        while day <= last_day:
+            exported.append(self.export_day(day, manifest))
+            day += timedelta(days=1)
+        
+        # Changes from here on are picked up by the next run
+        manifest['exported_at'] = started.isoformat()
+        self._write_json(self._manifest_path, manifest)
+        
+        return exported
+    
+    def _changed_days(self, manifest, first_day):
+        """Exported days before first_day whose bills got a return or tender after the last export"""
+        if not manifest.get('exported_at'):
+            return []
+        
+        rows = db.session.execute(text(
+            'SELECT date(b.created_at) FROM bill_returns r JOIN bills b ON b.id = r.bill_id WHERE r.created_at >= :since '
+            'UNION SELECT date(b.created_at) FROM transactions t JOIN bills b ON b.id = t.bill_id WHERE t.created_at >= :since'
+        ), {'since': datetime.fromisoformat(manifest['exported_at']).isoformat(' ')}).scalars()
+        
+        days = {datetime.fromisoformat(day).date() for day in rows if day}
+        return sorted(d for d in days if d < first_day and d.isoformat() in manifest['days'])
+    
+    def export_day(self, day, manifest=None):
+        manifest = manifest if manifest is not None else self.manifest()
+        dictionaries = self.dictionaries()
+        codes = {name: {v: i for i, v in enumerate(values)} for name, values in dictionaries.items()}
+        
+        def encode(name, values):
+            lookup = codes[name]
+            for value in values:
+                if value not in lookup:
+                    lookup[value] = len(dictionaries[name])
+                    dictionaries[name].append(value)
+            return np.array([lookup[v] for v in values], dtype=np.int16)
+        
+        start = datetime.combine(day, datetime.min.time())
+        params = {'start': start.isoformat(' '), 'end': (start + timedelta(days=1)).isoformat(' ')}
+        
+        bills, items, transactions = self._fetch_day(params, archived_month_for(day))
+        bill_index = {row[0]: i for i, row in enumerate(bills)}
+        
+        columns = {
+            'bills': {
+                'hour': np.array([datetime.fromisoformat(str(r[1])).hour for r in bills], dtype=np.int8),
+                'status': encode('status', [r[2] or 'completed' for r in bills]),
+                'payment_mode': encode('payment_mode', [r[3] or 'cash' for r in bills]),
+                'subtotal': np.array([r[4] or 0 for r in bills], dtype=np.float64),
+                'discount': np.array([r[5] or 0 for r in bills], dtype=np.float64),
+                'tax': np.array([r[6] or 0 for r in bills], dtype=np.float64),
+                'total': np.array([r[7] or 0 for r in bills], dtype=np.float64),
+                'lines': np.array([r[8] for r in bills], dtype=np.int32),
+                'units': np.array([r[9] for r in bills], dtype=np.int32)
+            },
+            'items': {
+                'bill': np.array([bill_index[r[0]] for r in items], dtype=np.int32),
+                'category': encode('category', [r[1] for r in items]),
+                'quantity': np.array([r[2] for r in items], dtype=np.int32),
+                'total': np.array([r[3] for r in items], dtype=np.float64),
+                'discount': np.array([r[4] or 0 for r in items], dtype=np.float64)
+            },
+            'transactions': {
+                'bill': np.array([bill_index[r[0]] for r in transactions], dtype=np.int32),
+                'payment_mode': encode('payment_mode', [r[1] for r in transactions]),
+                'amount': np.array([r[2] for r in transactions], dtype=np.float64)
+            }
+        }
+        
+        # Write into a scratch directory and swap it in, so readers never see half a day
+        partition = os.path.join(self.root, day.isoformat())
+        scratch = partition + '.tmp'
+        shutil.rmtree(scratch, ignore_errors=True)
+        os.makedirs(scratch)
+        
+        for table, table_columns in columns.items():
+            for name, values in table_columns.items():
+                np.save(os.path.join(scratch, f'{table}.{name}.npy'), values)
+        
+        shutil.rmtree(partition, ignore_errors=True)
+        os.rename(scratch, partition)
+        
+        self._write_json(self._dictionary_path, dictionaries)
+        manifest['days'][day.isoformat()] = {
+            'bills': len(bills),
+            'items': len(items),
+            'transactions': len(transactions),
+            'closed': day < datetime.utcnow().date(),
+            'exported_at': datetime.utcnow().isoformat()
+        }
+        self._write_json(self._manifest_path, manifest)
+        
+        return {'day': day.isoformat(), 'bills': len(bills), 'items': len(items)}
+    
+    def _fetch_day(self, params, archive=None):
+        """Read a day's bill, item and transaction rows from the live database or the month's archive"""
+        queries = [
+            'SELECT b.id, b.created_at, b.status, b.payment_mode, b.subtotal, b.discount, b.tax, b.total, '
+            'COUNT(i.id), COALESCE(SUM(i.quantity), 0) '
+            'FROM bills b LEFT JOIN bill_items i ON i.bill_id = b.id '
+            'WHERE b.created_at >= :start AND b.created_at < :end '
+            'GROUP BY b.id ORDER BY b.created_at',
+            'SELECT i.bill_id, p.category, i.quantity, i.total, i.discount '
+            'FROM bill_items i JOIN bills b ON b.id = i.bill_id JOIN {products} p ON p.id = i.product_id '
+            'WHERE b.created_at >= :start AND b.created_at < :end',
+            'SELECT t.bill_id, t.payment_mode, t.amount '
+            'FROM transactions t JOIN bills b ON b.id = t.bill_id '
+            'WHERE b.created_at >= :start AND b.created_at < :end'
+        ]
+        
+        if archive is None:
+            return [db.session.execute(text(q.format(products='products')), params).all() for q in queries]
+        
+        # Archived months keep bills only; categories still come from the live products table
+        with closing(open_archive(archive.month, attach_live=True)) as connection:
+            return [connection.execute(q.format(products='live.products'), params).fetchall() for q in queries]
+    
+    def _write_json(self, path, data):
+        os.makedirs(self.root, exist_ok=True)
+        scratch = path + '.tmp'
+        with open(scratch, 'w') as f:
+            json.dump(data, f)
+        os.replace(scratch, path)
+    
+    # ==================== READ ====================
+    
+    def load(self, start_day, end_day):
+        """Load all partitions in an inclusive day range as {table: {column: array}}"""
+        exported = self.manifest()['days']
+        days = sorted(d for d in exported if start_day.isoformat() <= d <= end_day.isoformat())
+        parts = {table: {column: [] for column in columns} for table, columns in TABLES.items()}
+        offset = 0
+        
+        for day in days:
+            partition = os.path.join(self.root, day)
+            for table, columns in TABLES.items():
+                for column in columns:
+                    values = np.load(os.path.join(partition, f'{table}.{column}.npy'), mmap_mode='r')
+                    # Bill references are per day; shift them into the concatenated index space
+                    if column == 'bill':
+                        values = values + offset
+                    parts[table][column].append(values)
+            offset += exported[day]['bills']
+        
+        empty = {'hour': np.int8, 'status': np.int16, 'payment_mode': np.int16, 'category': np.int16,
+                 'lines': np.int32, 'units': np.int32, 'bill': np.int32, 'quantity': np.int32}
+        
+        return {table: {
+            column: np.concatenate(chunks) if chunks else np.array([], dtype=empty.get(column, np.float64))
+            for column, chunks in columns.items()
+        } for table, columns in parts.items()}, days
+    
+    def report(self, start_day, end_day):
+        """Month-end style report computed with vectorized group-bys over the snapshot"""
+        data, days = self.load(start_day, end_day)
+        dictionaries = self.dictionaries()
+        bills, items, transactions = data['bills'], data['items'], data['transactions']
+        
+        statuses = dictionaries['status']
+        completed_code = statuses.index('completed') if 'completed' in statuses else -1
+        completed = bills['status'] == completed_code
+        item_completed = completed[items['bill']] if len(items['bill']) else np.array([], dtype=bool)
+        tender_completed = completed[transactions['bill']] if len(transactions['bill']) else np.array([], dtype=bool)
+        
+        totals = bills['total'][completed]
+        units = bills['units'][completed]
+        discounts = bills['discount'][completed]
+        
+        def grouped(codes, weights, names):
+            sums = np.bincount(codes, weights=weights, minlength=len(names))
+            counts = np.bincount(codes, minlength=len(names))
+            return [{'name': names[i], 'amount': round(float(sums[i]), 2), 'count': int(counts[i])}
+                    for i in np.argsort(-sums) if counts[i] > 0]
+        
+        hourly = np.bincount(bills['hour'][completed].astype(np.int64), weights=totals, minlength=24)
+        hourly_count = np.bincount(bills['hour'][completed].astype(np.int64), minlength=24)
+        
+        discounted = discounts > 0
+        
+        def summary(mask):
+            count = int(mask.sum())
+            return {
+                'bills': count,
+                'sales': round(float(totals[mask].sum()), 2),
+                'average_bill': round(float(totals[mask].mean()), 2) if count else 0,
+                'average_units': round(float(units[mask].mean()), 2) if count else 0
+            }
+        
+        gross = float(bills['subtotal'][completed].sum())
+        
+        return {
+            'start': start_day.isoformat(),
+            'end': end_day.isoformat(),
+            'days': len(days),
+            'bills': int(completed.sum()),
+            'sales': round(float(totals.sum()), 2),
+            'by_category': grouped(items['category'][item_completed].astype(np.int64),
+                                   items['total'][item_completed], dictionaries['category']),
+            'by_hour': [{'hour': h, 'amount': round(float(hourly[h]), 2), 'count': int(hourly_count[h])}
+                        for h in range(24) if hourly_count[h] > 0],
+            'by_payment_mode': grouped(bills['payment_mode'][completed].astype(np.int64), totals,
+                                       dictionaries['payment_mode']),
+            'tendered': grouped(transactions['payment_mode'][tender_completed].astype(np.int64),
+                                transactions['amount'][tender_completed], dictionaries['payment_mode']),
+            'basket_size': {
+                'histogram': np.bincount(np.clip(units, 0, 20)).tolist() if len(units) else [],
+                'percentiles': {str(p): float(np.percentile(units, p)) for p in (25, 50, 75, 90, 99)} if len(units) else {},
+                'mean': round(float(units.mean()), 2) if len(units) else 0
+            },
+            'discounts': {
+                'total_discount': round(float(discounts.sum()), 2),
+                'discount_rate': round(float(discounts.sum()) / gross, 4) if gross else 0,
+                'with_discount': summary(discounted),
+                'without_discount': summary(~discounted)
+            }
+        }
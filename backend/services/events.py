@@ -0,0 +1,197 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from services.stores import current_store
+from collections import deque
+from datetime import datetime
+import itertools
+import queue
+import threading
+
+TOPICS = ('bill', 'stock', 'offer', 'low_stock')
+
+class Subscription:
+    """One subscriber's queue of pending events, for one store or all of them"""
+    def __init__(self, topics, max_queue, store=None):
+        self.topics = set(topics)
+        self.store = store
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+    
+    def wants(self, entry):
+        return entry['topic'] in self.topics and self.store in (None, entry['store'])
+    
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+class EventBus:
+    """In-process publish/subscribe feeding the SSE stream.
+    
+    Keeps a short history so reconnecting clients can resume from Last-Event-ID.
+    A subscriber that falls behind is marked overflowed and told to resync
+    instead of blocking publishers.
+    """
+    def __init__(self, history_size=1000, max_queue=500):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._listeners = {}
+        self._history = deque(maxlen=history_size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def subscribe(self, topics=None, last_event_id=None, store=None):
+        subscription = Subscription(topics or TOPICS, self.max_queue, store)
+        
+        with self._lock:
+            if last_event_id is not None:
+                missed = [e for e in self._history if e['id'] > last_event_id and subscription.wants(e)]
+                newest = self._history[-1]['id'] if self._history else 0
+                expired = bool(self._history) and self._history[0]['id'] > last_event_id + 1
+                # Ids restart with the process, so an id newer than any issued here predates a restart
+                if expired or last_event_id > newest or len(missed) > self.max_queue:
+                    subscription.overflowed = True
+                for e in missed[:self.max_queue]:
+                    subscription.queue.put_nowait(e)
+            self._subscribers.add(subscription)
+        
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def add_listener(self, topic, callback):
+        """Call callback(payload) synchronously for every event published on topic"""
+        with self._lock:
+            self._listeners.setdefault(topic, []).append(callback)
+    
+    def publish(self, topic, payload, store=None):
+        with self._lock:
+            listeners = list(self._listeners.get(topic, []))
+            
+            # Listeners run in the publishing store's context, so follow-up events keep its store
+            entry = {'id': next(self._ids), 'topic': topic, 'store': store or current_store(), 'data': payload}
+            self._history.append(entry)
+            
+            for subscription in self._subscribers:
+                if not subscription.wants(entry):
+                    continue
+                try:
+                    subscription.queue.put_nowait(entry)
+                except queue.Full:
+                    subscription.overflowed = True
+        
+        # Outside the lock, listeners may publish follow-up events
+        for callback in listeners:
+            callback(payload)
+        
+        return entry['id']
+    
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+event_bus = EventBus()
+
+# ==================== COMMIT HOOKS ====================
+# Events are collected while a transaction flushes and published only after
+# the outermost commit, so subscribers never see rolled back changes.
+
+def queue_event(session, topic, payload):
+    """Queue an event to be published when the session's transaction commits"""
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault('pending_events', []).append((transaction, topic, payload))
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    """Turn flushed bill, product and offer changes into pending events"""
+    for obj in session.new:
+        table = getattr(obj, '__tablename__', None)
+        if table == 'bills':
+            queue_event(session, 'bill', bill_payload(obj, 'created'))
+        elif table == 'products':
+            queue_event(session, 'stock', stock_payload(obj))
+        elif table == 'offers':
+            queue_event(session, 'offer', _offer_payload(obj, 'upsert'))
+    
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table == 'bills' and _changed(obj, 'status'):
+            previous = inspect(obj).attrs.status.history.deleted
+            payload = bill_payload(obj, 'status')
+            payload['previous_status'] = previous[0] if previous else None
+            queue_event(session, 'bill', payload)
+        elif table == 'products' and (_changed(obj, 'quantity') or _changed(obj, 'reorder_level')):
+            queue_event(session, 'stock', stock_payload(obj))
+        elif table == 'offers' and session.is_modified(obj, include_collections=False):
+            queue_event(session, 'offer', _offer_payload(obj, 'upsert'))
+    
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table == 'offers':
+            queue_event(session, 'offer', {'action': 'delete', 'id': obj.id})
+        elif table == 'products':
+            queue_event(session, 'stock', {'product_id': obj.id, 'deleted': True})
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_events(session, previous_transaction):
+    """Drop events queued inside a transaction or savepoint that rolled back"""
+    pending = session.info.get('pending_events')
+    if not pending:
+        return
+    
+    def rolled_back(transaction):
+        while transaction is not None:
+            if transaction is previous_transaction:
+                return True
+            transaction = transaction.parent
+        return False
+    
+    session.info['pending_events'] = [p for p in pending if not rolled_back(p[0])]
+
+@event.listens_for(Session, 'after_commit')
+def _publish_events(session):
+    if session.get_nested_transaction():
+        return
+    
+    pending = session.info.pop('pending_events', [])
+    for _, topic, payload in pending:
+        event_bus.publish(topic, payload)
+
+def bill_payload(bill, action):
+    return {
+        'action': action,
+        'id': bill.id,
+        'bill_number': bill.bill_number,
+        'customer_id': bill.customer_id,
+        'status': bill.status,
+        'total': bill.total,
+        'created_at': (bill.created_at or datetime.utcnow()).isoformat()
+    }
+
+def stock_payload(product):
+    return {
+        'product_id': product.id,
+        'name': product.name,
+        'category': product.category,
+        'quantity': product.quantity,
+        'reorder_level': product.reorder_level,
+        'low': product.quantity is not None and product.reorder_level is not None
+               and product.quantity <= product.reorder_level
+    }
+
+def _offer_payload(offer, action):
+    return {
+        'action': action,
+        'id': offer.id,
+        'name': offer.name,
+        'offer_type': offer.offer_type,
+        'product_id': offer.product_id,
+        'category': offer.category,
+        'discount_value': offer.discount_value,
+        'min_quantity': offer.min_quantity,
+        'active': offer.active,
+        'valid_till': offer.valid_till.isoformat() if offer.valid_till else None
+    }
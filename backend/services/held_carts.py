@@ -0,0 +1,223 @@
+from sqlalchemy import insert, delete
+from models.database import store_engine, Product, HeldCart
+from services.numbering import normalize_lane
+from services.stores import StoreLocal
+from datetime import datetime, timedelta
+import heapq
+import json
+import threading
+import uuid
+
+HOLD_TTL = timedelta(hours=2)
+
+# Bill request fields kept with a parked basket and replayed on finalize
+CART_FIELDS = ('customer_id', 'discount', 'coupon_code', 'redeem_points', 'payment_mode')
+
+class HeldCartError(Exception):
+    """Raised when a basket cannot be parked"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _clean_items(items):
+    """Validate a basket's items as billing does, before anything is looked up"""
+    if not items or not isinstance(items, list):
+        raise HeldCartError('Missing items')
+    
+    cleaned = []
+    for item in items:
+        if not isinstance(item, dict) or item.get('product_id') is None:
+            raise HeldCartError('Each item needs a product_id')
+        try:
+            quantity = int(item.get('quantity', 0))
+            discount = float(item.get('discount', 0) or 0)
+        except (TypeError, ValueError):
+            raise HeldCartError(f"Quantity and discount for product {item['product_id']} must be numbers")
+        if quantity <= 0:
+            raise HeldCartError(f"Quantity for product {item['product_id']} must be positive")
+        cleaned.append({'product_id': item['product_id'], 'quantity': quantity, 'discount': discount})
+    return cleaned
+
+class HeldCartStore:
+    """Baskets parked at a lane, held in memory and written through to held_carts.
+    
+    Parking never touches stock or inventory logs; it only reserves the
+    quantities softly so other lanes can see what is spoken for. Lookups by
+    id are dict reads, and expired baskets are dropped from a heap ordered
+    by expiry.
+    """
+    def __init__(self, ttl=HOLD_TTL):
+        self.ttl = ttl
+        self._carts = {}  # id -> cart dict
+        self._lanes = {}  # lane -> {id: None}, in parking order
+        self._reserved = {}  # product_id -> quantity
+        self._expiry = []  # heap of (expires_at, id)
+        self._loaded = False
+        self._lock = threading.RLock()
+    
+    def ensure_loaded(self):
+        """Load unexpired carts from the table; needs an app context on first call"""
+        if self._loaded:
+            return
+        
+        with self._lock:
+            if self._loaded:
+                return
+            
+            for row in HeldCart.query.filter(HeldCart.expires_at > datetime.utcnow()).all():
+                self._add({
+                    'id': row.id,
+                    'lane': row.lane,
+                    'total': row.total,
+                    'created_at': row.created_at,
+                    'expires_at': row.expires_at,
+                    **json.loads(row.payload)
+                })
+            self._loaded = True
+    
+    def park(self, lane, data, ttl=None):
+        """Park a basket for a lane and write it through; returns the cart and any soft shortfalls"""
+        self.ensure_loaded()
+        
+        items = _clean_items((data or {}).get('items'))
+        
+        products = {p.id: p for p in Product.query.filter(Product.id.in_([i['product_id'] for i in items])).all()}
+        missing = [i['product_id'] for i in items if i['product_id'] not in products]
+        if missing:
+            raise HeldCartError(f'Product {missing[0]} not found', 404)
+        
+        for item in items:
+            product = products[item['product_id']]
+            item['product_name'] = product.name
+            item['unit_price'] = product.price
+            item['total'] = product.price * item['quantity'] - item['discount']
+        
+        now = datetime.utcnow()
+        cart = {
+            'id': str(uuid.uuid4()),
+            'lane': normalize_lane(lane),
+            'total': round(sum(i['total'] for i in items), 2),
+            'created_at': now,
+            'expires_at': now + (ttl or self.ttl),
+            'items': items,
+            **{field: data.get(field) for field in CART_FIELDS if data.get(field) is not None}
+        }
+        
+        with store_engine().begin() as connection:
+            connection.execute(insert(HeldCart.__table__).values(
+                id=cart['id'],
+                lane=cart['lane'],
+                customer_id=cart.get('customer_id'),
+                payload=json.dumps({k: v for k, v in cart.items() if k in CART_FIELDS or k == 'items'}),
+                total=cart['total'],
+                created_at=cart['created_at'],
+                expires_at=cart['expires_at']
+            ))
+        
+        with self._lock:
+            # Soft reservation: report what other parked baskets already claim, never block
+            short = [{
+                'product_id': i['product_id'],
+                'product_name': i['product_name'],
+                'requested': i['quantity'],
+                'available': products[i['product_id']].quantity - self._reserved.get(i['product_id'], 0)
+            } for i in items if products[i['product_id']].quantity - self._reserved.get(i['product_id'], 0) < i['quantity']]
+            self._add(cart)
+        
+        return cart, short
+    
+    def get(self, cart_id):
+        self.ensure_loaded()
+        self.purge_expired()
+        
+        with self._lock:
+            return self._carts.get(cart_id)
+    
+    def take(self, cart_id):
+        """Remove a cart from memory and release its reservation; None if another lane took it first"""
+        self.ensure_loaded()
+        self.purge_expired()
+        
+        with self._lock:
+            cart = self._carts.pop(cart_id, None)
+            if cart:
+                self._lanes.get(cart['lane'], {}).pop(cart_id, None)
+                self._release(cart)
+        
+        return cart
+    
+    def restore(self, cart):
+        """Put back a cart taken for a finalize that failed"""
+        with self._lock:
+            self._add(cart)
+    
+    def delete_row(self, connection, cart_id):
+        """Delete the write-through row, inside the caller's transaction when finalizing"""
+        connection.execute(delete(HeldCart.__table__).where(HeldCart.__table__.c.id == cart_id))
+    
+    def discard(self, cart_id):
+        cart = self.take(cart_id)
+        if cart:
+            with store_engine().begin() as connection:
+                self.delete_row(connection, cart_id)
+        return cart
+    
+    def carts(self, lane=None):
+        """Get parked carts, oldest first, for one lane or all"""
+        self.ensure_loaded()
+        self.purge_expired()
+        
+        with self._lock:
+            if lane:
+                return [self._carts[i] for i in self._lanes.get(normalize_lane(lane), {})]
+            return sorted(self._carts.values(), key=lambda c: c['created_at'])
+    
+    def reserved(self):
+        with self._lock:
+            return {product_id: quantity for product_id, quantity in self._reserved.items() if quantity > 0}
+    
+    def purge_expired(self):
+        now = datetime.utcnow()
+        expired = []
+        
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, cart_id = heapq.heappop(self._expiry)
+                cart = self._carts.get(cart_id)
+                # Heap entries of carts already taken are skipped
+                if cart and cart['expires_at'] <= now:
+                    self._carts.pop(cart_id)
+                    self._lanes.get(cart['lane'], {}).pop(cart_id, None)
+                    self._release(cart)
+                    expired.append(cart_id)
+        
+        if expired:
+            with store_engine().begin() as connection:
+                connection.execute(delete(HeldCart.__table__).where(HeldCart.__table__.c.expires_at <= now))
+        
+        return expired
+    
+    def request_data(self, cart):
+        """Bill request body for a cart, as accepted by build_bill"""
+        return {
+            'items': [{
+                'product_id': i['product_id'],
+                'quantity': i['quantity'],
+                'discount': i['discount']
+            } for i in cart['items']],
+            **{field: cart[field] for field in CART_FIELDS if field in cart}
+        }
+    
+    def _add(self, cart):
+        self._carts[cart['id']] = cart
+        self._lanes.setdefault(cart['lane'], {})[cart['id']] = None
+        heapq.heappush(self._expiry, (cart['expires_at'], cart['id']))
+        for item in cart['items']:
+            self._reserved[item['product_id']] = self._reserved.get(item['product_id'], 0) + item['quantity']
+    
+    def _release(self, cart):
+        for item in cart['items']:
+            self._reserved[item['product_id']] = self._reserved.get(item['product_id'], 0) - item['quantity']
+
+held_carts = StoreLocal(HeldCartStore)
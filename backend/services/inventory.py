@@ -0,0 +1,249 @@
+from sqlalchemy import text, insert, func
+from models.database import db, Product, InventorySnapshot, ArchiveMonth
+from services.archive import open_archive
+from services.stores import use_store
+from contextlib import closing
+from datetime import datetime, timedelta
+import threading
+import time
+
+# Snapshots are taken this far in the past so a writer that stamped its log
+# row just before the snapshot but committed just after is still counted
+SNAPSHOT_LAG = timedelta(minutes=1)
+WINDOW_CHUNK = 300
+FAR_FUTURE = datetime(9999, 12, 31)
+BEGINNING = datetime(1970, 1, 1)
+
+_DELTAS = (
+    'WITH w(product_id, lo, hi) AS (VALUES {values}) '
+    'SELECT w.product_id, l.reason, SUM(l.quantity_change), COUNT(*) FROM w '
+    'JOIN inventory_logs l ON l.product_id = w.product_id AND l.created_at > w.lo AND l.created_at <= w.hi '
+    'GROUP BY w.product_id, l.reason'
+)
+
+def _ts(value):
+    """Timestamp string comparable with stored created_at values"""
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def window_deltas(windows, by_reason=False):
+    """Sum inventory log changes per product over (lo, hi] windows, live and archived.
+    
+    Windows are (product_id, lo, hi) datetimes, at most one per product.
+    Returns {product_id: change}, or {product_id: {reason: (change, rows)}}
+    with by_reason.
+    """
+    totals = {}
+    if not windows:
+        return totals
+    
+    windows = [(product_id, _ts(lo), _ts(hi)) for product_id, lo, hi in windows]
+    lo_month = min(w[1] for w in windows)[:7]
+    hi_month = max(w[2] for w in windows)[:7]
+    archives = [m.month for m in ArchiveMonth.query.filter(
+        ArchiveMonth.month >= lo_month, ArchiveMonth.month <= hi_month
+    ).all()]
+    
+    def add(rows):
+        for product_id, reason, change, count in rows:
+            if by_reason:
+                change_sum, count_sum = totals.setdefault(product_id, {}).get(reason, (0, 0))
+                totals[product_id][reason] = (change_sum + change, count_sum + count)
+            else:
+                totals[product_id] = totals.get(product_id, 0) + change
+    
+    for start in range(0, len(windows), WINDOW_CHUNK):
+        chunk = windows[start:start + WINDOW_CHUNK]
+        params = {f'p{i}': value for i, value in enumerate(v for window in chunk for v in window)}
+        values = ', '.join(f'(:p{3 * i}, :p{3 * i + 1}, :p{3 * i + 2})' for i in range(len(chunk)))
+        add(db.session.execute(text(_DELTAS.format(values=values)), params).all())
+        
+        # Months moved out by the archive job keep their log rows in the month's file
+        for month in archives:
+            with closing(open_archive(month)) as connection:
+                add(connection.execute(_DELTAS.format(values=values), params).fetchall())
+    
+    return totals
+
+def _latest_snapshots(product_ids=None, before=None):
+    """Get {product_id: (taken_at, quantity)} of each product's last snapshot, optionally at or before a time"""
+    latest = db.session.query(
+        InventorySnapshot.product_id, func.max(InventorySnapshot.taken_at).label('taken_at')
+    )
+    if before:
+        latest = latest.filter(InventorySnapshot.taken_at <= before)
+    if product_ids is not None:
+        latest = latest.filter(InventorySnapshot.product_id.in_(product_ids))
+    latest = latest.group_by(InventorySnapshot.product_id).subquery()
+    
+    rows = db.session.query(InventorySnapshot.product_id, InventorySnapshot.taken_at, InventorySnapshot.quantity).join(
+        latest, (latest.c.product_id == InventorySnapshot.product_id) & (latest.c.taken_at == InventorySnapshot.taken_at)
+    ).all()
+    
+    return {product_id: (taken_at, quantity) for product_id, taken_at, quantity in rows}
+
+def _next_snapshots(product_ids, after):
+    """Get {product_id: (taken_at, quantity)} of each product's first snapshot after a time"""
+    first = db.session.query(
+        InventorySnapshot.product_id, func.min(InventorySnapshot.taken_at).label('taken_at')
+    ).filter(
+        InventorySnapshot.taken_at > after,
+        InventorySnapshot.product_id.in_(product_ids)
+    ).group_by(InventorySnapshot.product_id).subquery()
+    
+    rows = db.session.query(InventorySnapshot.product_id, InventorySnapshot.taken_at, InventorySnapshot.quantity).join(
+        first, (first.c.product_id == InventorySnapshot.product_id) & (first.c.taken_at == InventorySnapshot.taken_at)
+    ).all()
+    
+    return {product_id: (taken_at, quantity) for product_id, taken_at, quantity in rows}
+
+def stock_at(at, product_ids=None):
+    """Ledger stock of products at a point in time, as the nearest snapshot plus a bounded replay.
+    
+    The last snapshot at or before `at` is rolled forward. A product first
+    snapshotted after `at` is rolled back from that snapshot, and one never
+    snapshotted is rolled back from its current quantity.
+    """
+    if product_ids is None:
+        product_ids = [p for (p,) in db.session.query(Product.id).all()]
+    if not product_ids:
+        return {}
+    
+    anchors = {}  # product_id -> (quantity, sign, lo, hi)
+    for product_id, (taken_at, quantity) in _latest_snapshots(product_ids, before=at).items():
+        anchors[product_id] = (quantity, 1, taken_at, at)
+    
+    missing = [p for p in product_ids if p not in anchors]
+    if missing:
+        for product_id, (taken_at, quantity) in _next_snapshots(missing, at).items():
+            anchors[product_id] = (quantity, -1, at, taken_at)
+    
+    missing = [p for p in product_ids if p not in anchors]
+    if missing:
+        for product_id, quantity in db.session.query(Product.id, Product.quantity).filter(Product.id.in_(missing)).all():
+            anchors[product_id] = (quantity or 0, -1, at, FAR_FUTURE)
+    
+    deltas = window_deltas([(product_id, lo, hi) for product_id, (_, _, lo, hi) in anchors.items()])
+    
+    return {
+        product_id: quantity + sign * deltas.get(product_id, 0)
+        for product_id, (quantity, sign, _, _) in anchors.items()
+    }
+
+def movements(product_id, start, end):
+    """Opening and closing stock of a product over (start, end] with the changes between by reason"""
+    opening = stock_at(start, [product_id]).get(product_id)
+    closing_stock = stock_at(end, [product_id]).get(product_id)
+    reasons = window_deltas([(product_id, start, end)], by_reason=True).get(product_id, {})
+    
+    return {
+        'product_id': product_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'opening': opening,
+        'closing': closing_stock,
+        'change': sum(change for change, _ in reasons.values()),
+        'by_reason': [{
+            'reason': reason,
+            'change': change,
+            'entries': count
+        } for reason, (change, count) in sorted(reasons.items(), key=lambda r: r[1][0])]
+    }
+
+def _ledger_now(as_of):
+    """Get {product_id: (products.quantity, ledger as of as_of, ledger now, anchor)} for every product.
+    
+    The anchor is 'snapshot' when the ledger runs from the product's last
+    snapshot, 'opening' when its whole log, archives included, starts with
+    an opening entry, and None when neither exists and the ledger is only
+    the current quantity.
+    """
+    products = dict(db.session.query(Product.id, Product.quantity).all())
+    latest = _latest_snapshots()
+    
+    to_as_of = window_deltas([(product_id, taken_at, as_of) for product_id, (taken_at, _) in latest.items()])
+    history = window_deltas([(product_id, BEGINNING, as_of) for product_id in products if product_id not in latest], by_reason=True)
+    
+    # Changes after as_of are recent and never archived
+    after = dict(db.session.execute(text(
+        'SELECT product_id, SUM(quantity_change) FROM inventory_logs WHERE created_at > :as_of GROUP BY product_id'
+    ), {'as_of': _ts(as_of)}).all())
+    
+    ledger = {}
+    for product_id, quantity in products.items():
+        quantity = quantity or 0
+        if product_id in latest:
+            at_as_of = latest[product_id][1] + to_as_of.get(product_id, 0)
+            ledger[product_id] = (quantity, at_as_of, at_as_of + after.get(product_id, 0), 'snapshot')
+        elif 'opening' in history.get(product_id, {}):
+            at_as_of = sum(change for change, _ in history[product_id].values())
+            ledger[product_id] = (quantity, at_as_of, at_as_of + after.get(product_id, 0), 'opening')
+        else:
+            # Stock from before the ledger: the current quantity is taken as the baseline, nothing to check against
+            ledger[product_id] = (quantity, quantity - after.get(product_id, 0), quantity, None)
+    
+    return ledger
+
+def reconcile_stock():
+    """Products whose quantity disagrees with the ledger, and those with no snapshot or opening entry to check against; no writes"""
+    now = datetime.utcnow()
+    ledger = _ledger_now(now)
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_([
+        product_id for product_id, (quantity, _, expected, _) in ledger.items() if quantity != expected
+    ])).all())
+    
+    return {
+        'mismatches': [{
+            'product_id': product_id,
+            'name': names.get(product_id),
+            'quantity': quantity,
+            'ledger_quantity': expected,
+            'drift': quantity - expected
+        } for product_id, (quantity, _, expected, _) in ledger.items() if quantity != expected],
+        'unanchored': [product_id for product_id, (_, _, _, anchor) in ledger.items() if anchor is None]
+    }
+
+def take_snapshot(now=None):
+    """Write one ledger snapshot per product and record drift against products.quantity.
+    
+    Returns (snapshots written, mismatches). Products already snapshotted
+    at or after the snapshot time are skipped.
+    """
+    as_of = (now or datetime.utcnow()) - SNAPSHOT_LAG
+    ledger = _ledger_now(as_of)
+    done = {p for (p,) in db.session.query(InventorySnapshot.product_id).filter(InventorySnapshot.taken_at >= as_of).all()}
+    
+    rows = [{
+        'product_id': product_id,
+        'taken_at': as_of,
+        'quantity': at_as_of,
+        'drift': quantity - expected,
+        'source': 'ledger' if anchor else 'baseline'
+    } for product_id, (quantity, at_as_of, expected, anchor) in ledger.items() if product_id not in done]
+    
+    if rows:
+        db.session.execute(insert(InventorySnapshot.__table__), rows)
+    db.session.commit()
+    
+    mismatches = [{'product_id': r['product_id'], 'drift': r['drift']} for r in rows if r['drift']]
+    return len(rows), mismatches
+
+def start_inventory_snapshotter(app, interval_hours):
+    """Snapshot stock of every store every interval_hours on a daemon thread, logging products that drifted"""
+    def run():
+        while True:
+            time.sleep(interval_hours * 3600)
+            for store in app.config['STORES']:
+                with use_store(store, app):
+                    try:
+                        _, mismatches = take_snapshot()
+                        if mismatches:
+                            app.logger.warning(f'Inventory drift on {len(mismatches)} products in {store}: ' + ', '.join(
+                                f"{m['product_id']} ({m['drift']:+d})" for m in mismatches[:20]
+                            ))
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.error(f'Inventory snapshot of {store} failed: {e}')
+    
+    thread = threading.Thread(target=run, name='inventory-snapshotter', daemon=True)
+    thread.start()
+    return thread
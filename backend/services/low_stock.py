@@ -0,0 +1,131 @@
+from models.database import db, Product, ProductSupplier
+from services.events import event_bus
+from services.stores import StoreLocal
+import math
+import threading
+
+class LowStockTracker:
+    """In-memory set of products at or below their reorder level.
+    
+    Loaded once, then kept current from committed stock events, so low-stock
+    reads and reorder suggestions never rescan the products table. Crossing
+    the reorder level in either direction publishes a low_stock event.
+    """
+    def __init__(self):
+        self._items = {}  # product_id -> entry dict
+        self._suppliers = {}  # product_id -> (supplier, pack_size)
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def ensure_loaded(self):
+        """Load the current low-stock set; needs an app context on first call"""
+        if self._loaded:
+            return
+        
+        with self._lock:
+            if self._loaded:
+                return
+            
+            products = db.session.query(
+                Product.id, Product.name, Product.category, Product.quantity, Product.reorder_level
+            ).filter(Product.quantity <= Product.reorder_level).all()
+            
+            suppliers = db.session.query(
+                ProductSupplier.product_id, ProductSupplier.supplier, ProductSupplier.pack_size
+            ).all()
+            
+            self._suppliers = {s.product_id: (s.supplier, s.pack_size or 1) for s in suppliers}
+            self._items = {p.id: self._entry(p.id, p.name, p.category, p.quantity, p.reorder_level) for p in products}
+            self._loaded = True
+    
+    def observe(self, stock):
+        """Apply a stock event; returns 'below', 'above' or None when no threshold was crossed"""
+        if not self._loaded:
+            return None
+        
+        product_id = stock['product_id']
+        
+        with self._lock:
+            was_low = product_id in self._items
+            
+            if stock.get('deleted'):
+                self._items.pop(product_id, None)
+                self._suppliers.pop(product_id, None)
+                return None
+            
+            if stock['low']:
+                self._items[product_id] = self._entry(
+                    product_id, stock['name'], stock['category'], stock['quantity'], stock['reorder_level']
+                )
+            else:
+                self._items.pop(product_id, None)
+        
+        if stock['low'] and not was_low:
+            return 'below'
+        if was_low and not stock['low']:
+            return 'above'
+        return None
+    
+    def set_supplier(self, product_id, supplier, pack_size=1):
+        with self._lock:
+            self._suppliers[product_id] = (supplier, pack_size or 1)
+            if product_id in self._items:
+                self._items[product_id]['supplier'] = supplier
+    
+    def items(self, category=None):
+        self.ensure_loaded()
+        
+        with self._lock:
+            entries = [dict(e) for e in self._items.values()]
+        
+        if category:
+            entries = [e for e in entries if e['category'] == category]
+        
+        return sorted(entries, key=lambda e: (e['quantity'] - e['reorder_level'], e['name']))
+    
+    def suggestions(self, group_by='category', category=None):
+        """Group low-stock products by category or supplier with a suggested order quantity"""
+        groups = {}
+        
+        for entry in self.items(category):
+            supplier, pack_size = self._suppliers.get(entry['id'], (None, 1))
+            
+            # Refill to twice the reorder level, rounded up to whole packs
+            needed = max(entry['reorder_level'] * 2 - entry['quantity'], 1)
+            order_quantity = math.ceil(needed / pack_size) * pack_size
+            
+            key = entry['category'] if group_by == 'category' else (supplier or 'Unassigned')
+            groups.setdefault(key, []).append(dict(entry, order_quantity=order_quantity, pack_size=pack_size))
+        
+        return [{
+            'group': key,
+            'products': products,
+            'total_units': sum(p['order_quantity'] for p in products)
+        } for key, products in sorted(groups.items())]
+    
+    def _entry(self, product_id, name, category, quantity, reorder_level):
+        return {
+            'id': product_id,
+            'name': name,
+            'category': category,
+            'quantity': quantity,
+            'reorder_level': reorder_level,
+            'supplier': self._suppliers.get(product_id, (None, 1))[0]
+        }
+
+low_stock = StoreLocal(LowStockTracker)
+
+def _on_stock_event(stock):
+    crossed = low_stock.observe(stock)
+    
+    if crossed:
+        event_bus.publish('low_stock', {
+            'product_id': stock['product_id'],
+            'name': stock['name'],
+            'category': stock['category'],
+            'quantity': stock['quantity'],
+            'reorder_level': stock['reorder_level'],
+            'crossed': crossed
+        })
+
+event_bus.add_listener('stock', _on_stock_event)
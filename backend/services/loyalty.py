@@ -0,0 +1,177 @@
+from sqlalchemy import event, inspect, insert, select, func, text
+from sqlalchemy.orm import Session
+from models.database import db, store_engine, Bill, Customer, LoyaltyEntry
+from services.versioning import bump_version
+from services.stores import use_store
+from datetime import datetime
+import threading
+import time
+
+RUPEES_PER_POINT = 100  # accrual: 1 point per ₹100 of bill total
+POINT_VALUE = 0.1       # redemption: 10 points = ₹1 off
+RECONCILE_BATCH = 500
+
+# Cached balance plus entries not yet folded into it
+_BALANCE = (
+    '(SELECT points FROM customers WHERE id = :customer_id) + '
+    'COALESCE((SELECT SUM(points) FROM loyalty_ledger WHERE customer_id = :customer_id AND applied = 0), 0)'
+)
+
+def accrued_points(total):
+    return int((total or 0) // RUPEES_PER_POINT)
+
+def redemption_value(points):
+    return round(points * POINT_VALUE, 2)
+
+def points_needed(points, payable):
+    """Whole points of a requested redemption that go towards payable; the rest stay on the balance"""
+    return max(min(points, int(round(payable / POINT_VALUE, 6))), 0)
+
+def get_balances(customer_ids):
+    """Get {customer_id: (points, total_purchases)} including unreconciled ledger entries, in one query"""
+    ledger = LoyaltyEntry.__table__
+    rows = db.session.execute(
+        select(
+            Customer.id,
+            func.coalesce(Customer.points, 0) + func.coalesce(func.sum(ledger.c.points), 0),
+            func.coalesce(Customer.total_purchases, 0) + func.coalesce(func.sum(ledger.c.amount), 0)
+        )
+        .outerjoin(ledger, (ledger.c.customer_id == Customer.id) & (ledger.c.applied == False))
+        .where(Customer.id.in_(customer_ids))
+        .group_by(Customer.id)
+    ).all()
+    
+    return {customer_id: (points, round(purchases, 2)) for customer_id, points, purchases in rows}
+
+def get_balance(customer_id):
+    return get_balances([customer_id]).get(customer_id, (0, 0))
+
+def add_entry(connection, customer_id, points, amount=0, reason='adjustment', bill_id=None):
+    """Append a ledger entry; balances change by increment only, never read-modify-write"""
+    connection.execute(insert(LoyaltyEntry.__table__).values(
+        customer_id=customer_id,
+        bill_id=bill_id,
+        points=points,
+        amount=amount,
+        reason=reason,
+        applied=False,
+        created_at=datetime.utcnow()
+    ))
+
+def redeem(connection, customer_id, points, bill_id=None):
+    """Append a redemption only if the balance covers it, as one conditional INSERT; False if it does not"""
+    result = connection.execute(text(
+        'INSERT INTO loyalty_ledger (customer_id, bill_id, points, amount, reason, applied, created_at) '
+        "SELECT :customer_id, :bill_id, -:points, 0, 'redemption', 0, :now "
+        f'WHERE {_BALANCE} >= :points'
+    ), {'customer_id': customer_id, 'bill_id': bill_id, 'points': points, 'now': datetime.utcnow()})
+    
+    return result.rowcount == 1
+
+# ==================== ACCRUAL ====================
+
+@event.listens_for(Session, 'after_flush')
+def _accrue_points(session, flush_context):
+    """Accrue points for customer bills becoming completed and reverse them when a bill leaves completed"""
+    accrued = []
+    reversed_bills = []
+    
+    for obj in session.new:
+        if isinstance(obj, Bill) and obj.status == 'completed' and obj.customer_id:
+            accrued.append(obj)
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Bill) or not obj.customer_id:
+            continue
+        
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes():
+            continue
+        
+        was_completed = 'completed' in (history.deleted or ())
+        if obj.status == 'completed' and not was_completed:
+            accrued.append(obj)
+        elif was_completed and obj.status != 'completed':
+            reversed_bills.append(obj.id)
+    
+    if not accrued and not reversed_bills:
+        return
+    
+    connection = session.connection()
+    now = datetime.utcnow()
+    
+    if accrued:
+        connection.execute(insert(LoyaltyEntry.__table__), [{
+            'customer_id': bill.customer_id,
+            'bill_id': bill.id,
+            'points': accrued_points(bill.total),
+            'amount': bill.total or 0,
+            'reason': 'accrual',
+            'applied': False,
+            'created_at': now
+        } for bill in accrued])
+    
+    for bill_id in reversed_bills:
+        reverse_bill(connection, bill_id)
+
+def reverse_bill(connection, bill_id):
+    """Undo everything a bill did to its customer's balance, including points redeemed on it"""
+    connection.execute(text(
+        'INSERT INTO loyalty_ledger (customer_id, bill_id, points, amount, reason, applied, created_at) '
+        "SELECT customer_id, bill_id, -SUM(points), -SUM(amount), 'reversal', 0, :now "
+        'FROM loyalty_ledger WHERE bill_id = :bill_id GROUP BY customer_id, bill_id '
+        'HAVING SUM(points) != 0 OR SUM(amount) != 0'
+    ), {'bill_id': bill_id, 'now': datetime.utcnow()})
+
+# ==================== RECONCILIATION ====================
+
+def reconcile_balances(batch_size=RECONCILE_BATCH):
+    """Fold unapplied ledger entries into customers.points and total_purchases, one batch per transaction"""
+    applied = 0
+    
+    while True:
+        with store_engine().begin() as connection:
+            high = connection.execute(text(
+                'SELECT MAX(id) FROM (SELECT id FROM loyalty_ledger WHERE applied = 0 ORDER BY id LIMIT :batch)'
+            ), {'batch': batch_size}).scalar()
+            if high is None:
+                break
+            
+            customers = [r[0] for r in connection.execute(text(
+                'SELECT DISTINCT customer_id FROM loyalty_ledger WHERE applied = 0 AND id <= :high'
+            ), {'high': high})]
+            
+            connection.execute(text(
+                'UPDATE customers SET '
+                'points = COALESCE(points, 0) + (SELECT COALESCE(SUM(points), 0) FROM loyalty_ledger l '
+                'WHERE l.customer_id = customers.id AND l.applied = 0 AND l.id <= :high), '
+                'total_purchases = COALESCE(total_purchases, 0) + (SELECT COALESCE(SUM(amount), 0) FROM loyalty_ledger l '
+                'WHERE l.customer_id = customers.id AND l.applied = 0 AND l.id <= :high), '
+                'updated_at = :now '
+                'WHERE id IN (SELECT customer_id FROM loyalty_ledger WHERE applied = 0 AND id <= :high)'
+            ), {'high': high, 'now': datetime.utcnow()})
+            
+            applied += connection.execute(text(
+                'UPDATE loyalty_ledger SET applied = 1 WHERE applied = 0 AND id <= :high'
+            ), {'high': high}).rowcount
+            
+            # Customer listings are served from the cached balances
+            bump_version(connection, 'customers', [(customer_id, 'upsert') for customer_id in customers])
+    
+    return applied
+
+def start_loyalty_reconciler(app, interval_seconds):
+    """Reconcile loyalty balances of every store every interval_seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            for store in app.config['STORES']:
+                with use_store(store, app):
+                    try:
+                        reconcile_balances()
+                    except Exception as e:
+                        app.logger.error(f'Loyalty reconciliation of {store} failed: {e}')
+    
+    thread = threading.Thread(target=run, name='loyalty-reconciler', daemon=True)
+    thread.start()
+    return thread
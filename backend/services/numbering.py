@@ -0,0 +1,70 @@
+from sqlalchemy import update, insert, select
+from sqlalchemy.exc import IntegrityError
+from models.database import store_engine, BillSequence
+from services.stores import StoreLocal
+from datetime import datetime
+import re
+import threading
+
+DEFAULT_LANE = 'MAIN'
+BLOCK_SIZE = 50
+
+class BillNumberAllocator:
+    """Hands out bill numbers per lane from sequence blocks reserved in batches.
+    
+    Each block is claimed in its own short transaction, so the counter row is
+    written once per BLOCK_SIZE bills instead of once per bill. Numbers left in
+    a block when the process stops are skipped, never reused.
+    """
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self._blocks = {}  # lane -> [next, last]
+        self._lock = threading.Lock()
+    
+    def next_number(self, lane=None):
+        """Get the next bill number for a lane; call before the bill's transaction writes"""
+        lane = normalize_lane(lane)
+        
+        with self._lock:
+            block = self._blocks.get(lane)
+            if not block or block[0] > block[1]:
+                block = self._reserve_block(lane)
+                self._blocks[lane] = block
+            
+            sequence = block[0]
+            block[0] += 1
+        
+        return f"BILL-{lane}-{sequence:07d}"
+    
+    def _reserve_block(self, lane):
+        table = BillSequence.__table__
+        now = datetime.utcnow()
+        
+        with store_engine().begin() as connection:
+            result = connection.execute(
+                update(table)
+                .where(table.c.lane == lane)
+                .values(high=table.c.high + self.block_size, updated_at=now)
+            )
+            if result.rowcount == 0:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(table).values(lane=lane, high=self.block_size, updated_at=now))
+                except IntegrityError:
+                    # Another process created the lane row first
+                    connection.execute(
+                        update(table)
+                        .where(table.c.lane == lane)
+                        .values(high=table.c.high + self.block_size, updated_at=now)
+                    )
+            
+            high = connection.execute(select(table.c.high).where(table.c.lane == lane)).scalar()
+        
+        return [high - self.block_size + 1, high]
+
+def normalize_lane(lane):
+    """Upper-case alphanumeric lane id, falling back to the default lane"""
+    lane = re.sub(r'[^A-Za-z0-9]', '', lane or '').upper()[:10]
+    return lane or DEFAULT_LANE
+
+bill_numbers = StoreLocal(BillNumberAllocator)
@@ -0,0 +1,125 @@
+from sqlalchemy import text, func
+from models.database import db, Transaction
+from datetime import datetime, timedelta
+
+PAYMENT_MODES = ('cash', 'upi', 'card', 'wallet')
+TOLERANCE = 0.005
+
+class PaymentError(Exception):
+    """Raised when tenders cannot be posted against a bill"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def paid_amount(bill_id):
+    return db.session.query(func.coalesce(func.sum(Transaction.amount), 0)).filter(
+        Transaction.bill_id == bill_id,
+        Transaction.status == 'success'
+    ).scalar()
+
+def post_tenders(bill, tenders):
+    """Add one transaction per tender in the current session.
+    
+    A tender whose reference_number is already recorded against this bill is
+    a retry and is returned as replayed instead of being posted again. Cash
+    may exceed what is due (the excess is change); other tenders may not.
+    Returns (transactions, replayed, change).
+    """
+    if bill.status != 'completed':
+        raise PaymentError(f'Cannot take payment on a {bill.status} bill', 409)
+    if not isinstance(tenders, list) or not all(isinstance(t, dict) for t in tenders):
+        raise PaymentError('tenders must be a list of objects')
+    
+    references = [t['reference_number'] for t in tenders if t.get('reference_number')]
+    if len(references) != len(set(references)):
+        raise PaymentError('Duplicate reference_number in request')
+    
+    existing = {t.reference_number: t for t in Transaction.query.filter(
+        Transaction.reference_number.in_(references)
+    ).all()} if references else {}
+    
+    due = round(bill.total - paid_amount(bill.id), 2)
+    posted, replayed, change = [], [], 0
+    
+    for tender in tenders:
+        reference = tender.get('reference_number')
+        if reference in existing:
+            if existing[reference].bill_id != bill.id:
+                raise PaymentError(f'Reference {reference} is already used by another bill', 409)
+            replayed.append(existing[reference])
+            continue
+        
+        mode = tender.get('payment_mode', 'cash')
+        if mode not in PAYMENT_MODES:
+            raise PaymentError(f"Unknown payment mode {mode}, expected any of {', '.join(PAYMENT_MODES)}")
+        
+        try:
+            amount = round(float(tender.get('amount', due)), 2)
+        except (TypeError, ValueError):
+            raise PaymentError('Tender amount must be a number')
+        if amount <= 0:
+            raise PaymentError('Tender amount must be positive')
+        
+        if amount > due + TOLERANCE:
+            if mode != 'cash':
+                raise PaymentError(f'{mode} tender of {amount} exceeds the {max(due, 0)} due')
+            change += round(amount - max(due, 0), 2)
+            amount = max(due, 0)
+            if amount <= 0:
+                continue
+        
+        transaction = Transaction(
+            bill_id=bill.id,
+            payment_mode=mode,
+            amount=amount,
+            reference_number=reference
+        )
+        db.session.add(transaction)
+        posted.append(transaction)
+        due = round(due - amount, 2)
+    
+    modes = {t.payment_mode for t in bill.transactions + posted}
+    if modes:
+        bill.payment_mode = modes.pop() if len(modes) == 1 else 'split'
+    
+    return posted, replayed, round(change, 2)
+
+def reconcile_day(day):
+    """End-of-day totals by tender with billed versus tendered amounts, one aggregate per side"""
+    start = datetime.combine(day, datetime.min.time())
+    params = {'start': start.isoformat(' '), 'end': (start + timedelta(days=1)).isoformat(' ')}
+    
+    # Served by ix_transactions_created_mode
+    tenders = db.session.execute(text(
+        'SELECT payment_mode, COUNT(*), COUNT(DISTINCT bill_id), SUM(amount) FROM transactions '
+        "WHERE created_at >= :start AND created_at < :end AND status = 'success' "
+        'GROUP BY payment_mode ORDER BY SUM(amount) DESC'
+    ), params).all()
+    
+    billed = db.session.execute(text(
+        'SELECT COUNT(*), COALESCE(SUM(total), 0), '
+        f'COALESCE(SUM(CASE WHEN paid < total - {TOLERANCE} THEN total - paid ELSE 0 END), 0), '
+        f'COALESCE(SUM(CASE WHEN paid < total - {TOLERANCE} THEN 1 ELSE 0 END), 0) '
+        'FROM (SELECT b.total AS total, COALESCE(SUM(t.amount), 0) AS paid FROM bills b '
+        "LEFT JOIN transactions t ON t.bill_id = b.id AND t.status = 'success' "
+        "WHERE b.created_at >= :start AND b.created_at < :end AND b.status = 'completed' GROUP BY b.id)"
+    ), params).one()
+    
+    tendered = sum(row[3] for row in tenders)
+    
+    return {
+        'date': day.isoformat(),
+        'tenders': [{
+            'payment_mode': mode,
+            'transactions': count,
+            'bills': bills,
+            'amount': round(amount, 2)
+        } for mode, count, bills, amount in tenders],
+        'tendered': round(tendered, 2),
+        'billed': round(billed[1], 2),
+        'bills': billed[0],
+        'outstanding': round(billed[2], 2),
+        'unpaid_bills': billed[3],
+        'difference': round(tendered - billed[1], 2)
+    }
@@ -0,0 +1,263 @@
+from sqlalchemy import select
+from models.database import db, Product, Offer, Coupon
+from services.versioning import get_versions, get_changes_since
+from services.loyalty import redemption_value, points_needed
+from services.tax import TaxTable, load_tax_table, tax_breakup
+from services.stores import StoreLocal
+from collections import namedtuple
+from datetime import datetime
+import threading
+
+MAX_MEMO_LINES = 50000
+QUOTE_BATCH_LIMIT = 500
+
+# Pricing attributes only; stock changes bump the products version but never change a price
+ProductPrice = namedtuple('ProductPrice', 'id name category price')
+OfferRule = namedtuple('OfferRule', 'id name offer_type product_id category discount_value min_quantity valid_from valid_till')
+CouponRule = namedtuple('CouponRule', 'code discount_type discount_value usable')
+
+class PricingError(Exception):
+    """Raised when a cart cannot be priced"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class CatalogSnapshot:
+    """Read-only prices, live offers, coupons and tax slabs at one set of entity versions"""
+    def __init__(self, versions, products, offers, coupons, offers_key, expires_at, taxes=None):
+        self.versions = versions
+        self.products = products
+        self.offers = offers  # product_id or ('category', name) -> tuple of OfferRule
+        self.coupons = coupons
+        self.taxes = taxes or TaxTable()
+        self.offers_key = offers_key
+        self.expires_at = expires_at
+
+def offer_discount(offer, price, quantity):
+    """Discount an offer gives a line, 0 below its minimum quantity"""
+    if quantity < (offer.min_quantity or 1):
+        return 0
+    if offer.offer_type == 'bogo':
+        # Every min_quantity units bought earn one more unit at discount_value percent off
+        free_units = quantity // ((offer.min_quantity or 1) + 1)
+        return price * free_units * offer.discount_value / 100
+    return price * quantity * offer.discount_value / 100
+
+def price_line(snapshot, product, quantity, discount=0):
+    """Price one line: returns (gross, offer, offer_discount, total), the best single offer applied"""
+    gross = product.price * quantity
+    candidates = snapshot.offers.get(product.id, ()) + snapshot.offers.get(('category', product.category), ())
+    
+    offer, best = None, 0
+    for candidate in candidates:
+        amount = offer_discount(candidate, product.price, quantity)
+        if amount > best:
+            offer, best = candidate, amount
+    
+    return gross, offer, best, gross - discount - best
+
+def coupon_discount(snapshot, coupon_code, subtotal):
+    coupon = snapshot.coupons.get(coupon_code) if coupon_code else None
+    if not coupon or not coupon.usable:
+        return 0
+    if coupon.discount_type == 'percentage':
+        return (subtotal * coupon.discount_value) / 100
+    return coupon.discount_value
+
+def price_cart(snapshot, items, discount=0, coupon_code=None, redeem_points=0, line_pricer=price_line):
+    """Price a cart against a catalog snapshot without touching the database.
+    
+    Items carry product_id, quantity and an optional line discount. Bill
+    level discount, coupon and redeemed points come off the subtotal before
+    tax, as at checkout. Line totals are summed per GST slab in the same
+    pass that prices them; bill level discounts then come off each slab,
+    and each line's tax, in proportion.
+    """
+    lines = []
+    slab_totals = {}
+    for item in items:
+        product = snapshot.products.get(item.get('product_id'))
+        if not product:
+            raise PricingError(f"Product {item.get('product_id')} not found", 404)
+        
+        quantity = int(item.get('quantity', 0))
+        if quantity <= 0:
+            raise PricingError(f'Quantity for {product.name} must be positive')
+        
+        line_discount = float(item.get('discount', 0) or 0)
+        gross, offer, offer_amount, total = line_pricer(snapshot, product, quantity, line_discount)
+        slab = snapshot.taxes.slab(product.category)
+        slab_totals[slab.rate] = slab_totals.get(slab.rate, 0) + total
+        lines.append({
+            'product_id': product.id,
+            'product_name': product.name,
+            'quantity': quantity,
+            'unit_price': product.price,
+            'discount': line_discount,
+            'offer_id': offer.id if offer else None,
+            'offer_name': offer.name if offer else None,
+            'offer_discount': offer_amount,
+            'total': total,
+            'tax_rate': slab.rate,
+            'hsn_code': slab.hsn_code
+        })
+    
+    subtotal = sum(line['total'] for line in lines)
+    discount_amount = coupon_discount(snapshot, coupon_code, subtotal) + (discount or 0)
+    
+    # Redeemed loyalty points, capped at what is left to pay; only the points used are deducted
+    points_redeemed = points_needed(redeem_points or 0, max(subtotal - discount_amount, 0))
+    points_discount = redemption_value(points_redeemed)
+    discount_amount += points_discount
+    
+    taxable_factor = max(subtotal - discount_amount, 0) / subtotal if subtotal > 0 else 0
+    taxes = tax_breakup(slab_totals, taxable_factor)
+    tax = sum(slab['tax'] for slab in taxes)
+    for line in lines:
+        line['tax'] = line['total'] * taxable_factor * line['tax_rate'] / 100
+    
+    return {
+        'lines': lines,
+        'subtotal': subtotal,
+        'discount': discount_amount,
+        'tax': tax,
+        'taxes': taxes,
+        'total': subtotal - discount_amount + tax,
+        'points_redeemed': points_redeemed,
+        'points_discount': points_discount
+    }
+
+class PricingCatalog:
+    """Keeps the current snapshot and memoizes priced lines across carts.
+    
+    A products version bump only reloads the rows named in the change log,
+    and the snapshot is kept as is when none of their prices, names or
+    categories moved, which is the case for every sale. Line results are
+    keyed by the product's pricing attributes and the offer set, so they
+    never need invalidating.
+    """
+    def __init__(self, max_lines=MAX_MEMO_LINES):
+        self.max_lines = max_lines
+        self._snapshot = None
+        self._generation = 0
+        self._lines = {}
+        self._lock = threading.Lock()
+    
+    def snapshot(self, now=None):
+        now = now or datetime.utcnow()
+        versions = get_versions('products', 'offers', 'coupons', 'tax_rates')
+        versions = {entity: version for entity, (version, _) in versions.items()}
+        
+        current = self._snapshot
+        if current and current.versions == versions and (not current.expires_at or now < current.expires_at):
+            return current
+        
+        with self._lock:
+            current = self._snapshot
+            if current and current.versions == versions and (not current.expires_at or now < current.expires_at):
+                return current
+            
+            self._snapshot = self._build(current, versions, now)
+            return self._snapshot
+    
+    def _build(self, current, versions, now):
+        if current and current.versions['products'] <= versions['products']:
+            products = self._update_products(current, versions['products'])
+        else:
+            products = {row.id: ProductPrice(*row) for row in db.session.execute(
+                select(Product.id, Product.name, Product.category, Product.price)
+            )}
+        
+        if current and current.versions['offers'] == versions['offers'] and (not current.expires_at or now < current.expires_at):
+            offers, offers_key, expires_at = current.offers, current.offers_key, current.expires_at
+        else:
+            offers, expires_at = self._load_offers(now)
+            self._generation += 1
+            offers_key = self._generation
+        
+        if current and current.versions['coupons'] == versions['coupons']:
+            coupons = current.coupons
+        else:
+            coupons = {row.code: CouponRule(
+                row.code,
+                row.discount_type,
+                row.discount_value,
+                bool(row.active) and (row.current_uses or 0) < (row.max_uses or float('inf'))
+            ) for row in db.session.execute(select(
+                Coupon.code, Coupon.discount_type, Coupon.discount_value,
+                Coupon.active, Coupon.current_uses, Coupon.max_uses
+            ))}
+        
+        if current and current.versions['tax_rates'] == versions['tax_rates']:
+            taxes = current.taxes
+        else:
+            taxes = load_tax_table()
+        
+        return CatalogSnapshot(versions, products, offers, coupons, offers_key, expires_at, taxes)
+    
+    def _update_products(self, current, version):
+        changed, deleted = get_changes_since('products', current.versions['products'])
+        if not changed and not deleted:
+            return current.products
+        
+        rows = {row.id: ProductPrice(*row) for row in db.session.execute(
+            select(Product.id, Product.name, Product.category, Product.price).where(Product.id.in_(changed))
+        )} if changed else {}
+        
+        if not deleted and all(current.products.get(product_id) == row for product_id, row in rows.items()):
+            return current.products
+        
+        products = dict(current.products)
+        products.update(rows)
+        for product_id in deleted:
+            products.pop(product_id, None)
+        return products
+    
+    def _load_offers(self, now):
+        """Offers live now, by target, and when the set next changes by the clock"""
+        rows = [OfferRule(*row) for row in db.session.execute(
+            select(
+                Offer.id, Offer.name, Offer.offer_type, Offer.product_id, Offer.category,
+                Offer.discount_value, Offer.min_quantity, Offer.valid_from, Offer.valid_till
+            ).where(Offer.active == True, Offer.valid_till >= now)
+        )]
+        
+        offers = {}
+        boundaries = []
+        for offer in rows:
+            if offer.valid_from > now:
+                boundaries.append(offer.valid_from)
+                continue
+            boundaries.append(offer.valid_till)
+            # Offers without a product or category target do not price lines
+            if offer.product_id:
+                offers[offer.product_id] = offers.get(offer.product_id, ()) + (offer,)
+            elif offer.category:
+                key = ('category', offer.category)
+                offers[key] = offers.get(key, ()) + (offer,)
+        
+        return offers, min(boundaries) if boundaries else None
+    
+    def price_line(self, snapshot, product, quantity, discount=0):
+        """Memoized price_line"""
+        key = (snapshot.offers_key, product, quantity, discount)
+        result = self._lines.get(key)
+        if result is None:
+            if len(self._lines) >= self.max_lines:
+                self._lines.clear()
+            result = self._lines[key] = price_line(snapshot, product, quantity, discount)
+        return result
+    
+    def quote(self, cart, snapshot=None):
+        """Price a cart request body against the current snapshot"""
+        return price_cart(
+            snapshot or self.snapshot(),
+            cart.get('items') or [],
+            cart.get('discount', 0) or 0,
+            cart.get('coupon_code'),
+            int(cart.get('redeem_points') or 0),
+            line_pricer=self.price_line
+        )
+
+pricing_catalog = StoreLocal(PricingCatalog)
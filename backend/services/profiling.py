@@ -0,0 +1,304 @@
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from models.database import db
+from services.stores import current_store
+from collections import deque
+from datetime import datetime
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_HEADER = 'X-Profile'
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+MAX_ARMED_REQUESTS = 20
+MAX_SQL_STATEMENTS = 500
+CAPTURE_SUFFIXES = ('.json', '.prof', '.speedscope.json')
+
+class ProfileError(Exception):
+    """Raised when profiling cannot be armed or a capture cannot be read"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval, for a speedscope sampled profile"""
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = {}  # (name, file, line) -> index
+        self.samples = []
+        self.weights = []
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                return
+            
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self.frames.setdefault((code.co_name, code.co_filename, code.co_firstlineno), len(self.frames)))
+                frame = frame.f_back
+            
+            # speedscope wants the root first
+            self.samples.append(stack[::-1])
+            self.weights.append((now - last) * 1000)
+            last = now
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+    
+    def speedscope(self, name):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': [{'name': n, 'file': f, 'line': l} for n, f, l in self.frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights
+            }],
+            'name': name,
+            'exporter': 'supermart'
+        }
+
+class RequestProfiler:
+    """Opt-in profiles of single requests, with the SQL they ran.
+    
+    A request is captured when it carries `X-Profile: cprofile|sample`, or
+    when it matches a path armed from the admin endpoint. Captures run one
+    at a time and at most PROFILE_MAX_PER_MINUTE a minute; others are served
+    normally with an X-Profile-Skipped header. Each capture writes a JSON
+    summary plus a .prof (snakeviz) or .speedscope.json file to
+    PROFILE_DIR, keeping the newest PROFILE_KEEP.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._busy = False
+        self._recent = deque()
+        self._armed = []
+    
+    def init_app(self, app):
+        @app.before_request
+        def _start_profile():
+            mode = self._requested_mode()
+            if not mode:
+                return
+            
+            reason = self._acquire(app.config['PROFILE_MAX_PER_MINUTE'])
+            if reason:
+                g.profile_skipped = reason
+                return
+            
+            g.profile = {'mode': mode, 'sql': [], 'started': time.perf_counter(), 'at': datetime.utcnow()}
+            if mode == 'cprofile':
+                g.profile['profiler'] = cProfile.Profile()
+                g.profile['profiler'].enable()
+            else:
+                g.profile['profiler'] = StackSampler(threading.get_ident())
+                g.profile['profiler'].start()
+        
+        @app.after_request
+        def _finish_profile(response):
+            capture = g.pop('profile', None)
+            if capture:
+                try:
+                    response.headers['X-Profile-Capture'] = self._write(capture, response.status_code)
+                finally:
+                    with self._lock:
+                        self._busy = False
+            elif 'profile_skipped' in g:
+                response.headers['X-Profile-Skipped'] = g.pop('profile_skipped')
+            return response
+        
+        @app.teardown_request
+        def _abandon_profile(error=None):
+            # A request that raised past after_request still frees the profiler
+            capture = g.pop('profile', None)
+            if capture:
+                self._stop(capture)
+                with self._lock:
+                    self._busy = False
+        
+        # This app's store engines only, once each, not every Engine in the process
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'before_cursor_execute', self._before_statement):
+                    event.listen(engine, 'before_cursor_execute', self._before_statement)
+                    event.listen(engine, 'after_cursor_execute', self._after_statement)
+    
+    def _before_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and 'profile' in g:
+            context.profile_started = time.perf_counter()
+    
+    def _after_statement(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'profile_started', None)
+        capture = g.get('profile') if started and has_request_context() else None
+        if capture and len(capture['sql']) < MAX_SQL_STATEMENTS:
+            capture['sql'].append({
+                'statement': statement,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'rows': cursor.rowcount,
+                'executemany': executemany
+            })
+    
+    def _requested_mode(self):
+        mode = request.headers.get(PROFILE_HEADER)
+        if mode:
+            return mode if mode in PROFILE_MODES else None
+        
+        with self._lock:
+            now = time.time()
+            self._armed = [a for a in self._armed if a['remaining'] > 0 and a['expires'] > now]
+            for arm in self._armed:
+                if request.path.startswith(arm['path']) and (not arm['method'] or arm['method'] == request.method):
+                    arm['remaining'] -= 1
+                    return arm['mode']
+        return None
+    
+    def _acquire(self, per_minute):
+        """Claim the profiler for this request; returns why not, or None"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self._busy:
+                return 'busy'
+            if len(self._recent) >= per_minute:
+                return 'rate-limited'
+            self._busy = True
+            self._recent.append(now)
+        return None
+    
+    def _stop(self, capture):
+        if capture['mode'] == 'cprofile':
+            capture['profiler'].disable()
+        else:
+            capture['profiler'].stop()
+    
+    def _write(self, capture, status):
+        self._stop(capture)
+        elapsed = (time.perf_counter() - capture['started']) * 1000
+        directory = current_app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        
+        endpoint = (request.endpoint or 'unknown').replace('.', '-')
+        name = f"{capture['at']:%Y%m%d-%H%M%S-%f}-{endpoint}"
+        if capture['mode'] == 'cprofile':
+            profile_file = f'{name}.prof'
+            capture['profiler'].dump_stats(os.path.join(directory, profile_file))
+        else:
+            profile_file = f'{name}.speedscope.json'
+            with open(os.path.join(directory, profile_file), 'w') as f:
+                json.dump(capture['profiler'].speedscope(f'{request.method} {request.path}'), f)
+        
+        sql_ms = sum(s['ms'] for s in capture['sql'])
+        with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+            json.dump({
+                'name': name,
+                'mode': capture['mode'],
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'store': current_store(),
+                'status': status,
+                'captured_at': capture['at'].isoformat(),
+                'duration_ms': round(elapsed, 2),
+                'sql_ms': round(sql_ms, 2),
+                'sql_count': len(capture['sql']),
+                'profile': profile_file,
+                'sql': capture['sql']
+            }, f, indent=1)
+        
+        self._rotate(directory, current_app.config['PROFILE_KEEP'])
+        return name
+    
+    def _rotate(self, directory, keep):
+        summaries = sorted(f for f in os.listdir(directory) if f.endswith('.json') and not f.endswith('.speedscope.json'))
+        for summary in summaries[:max(len(summaries) - keep, 0)]:
+            name = summary[:-len('.json')]
+            for suffix in CAPTURE_SUFFIXES:
+                path = os.path.join(directory, name + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def arm(self, path, mode='cprofile', count=1, ttl_seconds=600, method=None):
+        """Profile the next count requests whose path starts with path, within ttl_seconds"""
+        if mode not in PROFILE_MODES:
+            raise ProfileError(f"Unknown mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+        if not path or not path.startswith('/'):
+            raise ProfileError('path must start with /')
+        if not 1 <= count <= MAX_ARMED_REQUESTS:
+            raise ProfileError(f'count must be between 1 and {MAX_ARMED_REQUESTS}')
+        
+        arm = {'path': path, 'method': method.upper() if method else None, 'mode': mode,
+               'remaining': count, 'expires': time.time() + ttl_seconds}
+        with self._lock:
+            self._armed.append(arm)
+        return self._describe(arm)
+    
+    def disarm(self):
+        with self._lock:
+            cleared, self._armed = len(self._armed), []
+        return cleared
+    
+    def _describe(self, arm):
+        return {
+            'path': arm['path'],
+            'method': arm['method'],
+            'mode': arm['mode'],
+            'remaining': arm['remaining'],
+            'expires_at': datetime.utcfromtimestamp(arm['expires']).isoformat()
+        }
+    
+    def status(self, directory):
+        with self._lock:
+            armed = [self._describe(a) for a in self._armed if a['remaining'] > 0 and a['expires'] > time.time()]
+            busy, recent = self._busy, len(self._recent)
+        
+        return {
+            'busy': busy,
+            'captures_last_minute': recent,
+            'armed': armed,
+            'captures': list_captures(directory)
+        }
+
+def list_captures(directory):
+    """Capture summaries without their SQL, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    
+    captures = []
+    for summary in sorted(os.listdir(directory), reverse=True):
+        if not summary.endswith('.json') or summary.endswith('.speedscope.json'):
+            continue
+        with open(os.path.join(directory, summary)) as f:
+            data = json.load(f)
+        data.pop('sql', None)
+        captures.append(data)
+    return captures
+
+def capture_path(directory, filename):
+    """Path of a capture file, refusing anything that is not one"""
+    if os.path.basename(filename) != filename or not filename.endswith(CAPTURE_SUFFIXES):
+        raise ProfileError('Not a capture file')
+    path = os.path.join(directory, filename)
+    if not os.path.isfile(path):
+        raise ProfileError('Capture not found', 404)
+    return path
+
+request_profiler = RequestProfiler()
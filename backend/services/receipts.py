@@ -0,0 +1,280 @@
+from flask import current_app
+from sqlalchemy import func
+from models.database import db, Bill, BillItem, Product, Customer, Transaction, BillReturn, BillTax
+from services.archive import find_archived_bill
+from services.stores import StoreLocal
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import threading
+
+RECEIPT_FORMATS = {
+    'text': 'text/plain; charset=utf-8',
+    'escpos': 'application/octet-stream',
+    'pdf': 'application/pdf'
+}
+RECEIPT_WIDTH = 42  # characters per line on an 80 mm printer
+RECEIPT_CACHE_SIZE = 500
+
+# ESC/POS control sequences
+ESC_INIT = b'\x1b@'
+ESC_ALIGN_LEFT = b'\x1ba\x00'
+ESC_ALIGN_CENTER = b'\x1ba\x01'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+ESC_DOUBLE_ON = b'\x1d!\x11'
+ESC_DOUBLE_OFF = b'\x1d!\x00'
+ESC_FEED_CUT = b'\x1dV\x42\x03'
+
+class ReceiptError(Exception):
+    """Raised when a receipt cannot be rendered"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def receipt_version(bill):
+    """Version of what a bill's receipt shows: the bill row, its tenders and its returns"""
+    tenders, paid = db.session.query(
+        func.count(Transaction.id), func.coalesce(func.sum(Transaction.amount), 0)
+    ).filter(Transaction.bill_id == bill.id, Transaction.status == 'success').one()
+    returns = db.session.query(func.count(BillReturn.id)).filter(BillReturn.bill_id == bill.id).scalar()
+    
+    source = f'{bill.updated_at.isoformat() if bill.updated_at else ""}|{tenders}|{paid}|{returns}'
+    return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+def receipt_data(bill):
+    """Everything a receipt prints for a live bill, read without loading ORM items"""
+    items = db.session.query(
+        Product.name, BillItem.quantity, BillItem.unit_price, BillItem.discount, BillItem.total
+    ).join(Product, Product.id == BillItem.product_id).filter(BillItem.bill_id == bill.id).all()
+    
+    tenders = db.session.query(Transaction.payment_mode, Transaction.amount).filter(
+        Transaction.bill_id == bill.id, Transaction.status == 'success'
+    ).order_by(Transaction.created_at).all()
+    
+    refunded = db.session.query(func.coalesce(func.sum(BillReturn.refund_amount), 0)).filter(
+        BillReturn.bill_id == bill.id
+    ).scalar()
+    
+    customer = db.session.query(Customer.name).filter(Customer.id == bill.customer_id).scalar() if bill.customer_id else None
+    
+    # The sale's breakup; credits for later returns have negative taxable values
+    taxes = db.session.query(BillTax.rate, BillTax.taxable, BillTax.tax).filter(
+        BillTax.bill_id == bill.id, BillTax.taxable >= 0
+    ).order_by(BillTax.rate).all()
+    
+    return {
+        'bill_number': bill.bill_number,
+        'created_at': bill.created_at,
+        'customer': customer,
+        'items': [{'name': n, 'quantity': q, 'unit_price': u, 'discount': d or 0, 'total': t} for n, q, u, d, t in items],
+        'subtotal': bill.subtotal,
+        'discount': bill.discount,
+        'tax': bill.tax,
+        'taxes': [{'rate': r, 'taxable': t, 'tax': x} for r, t, x in taxes],
+        'total': bill.total,
+        'payment_mode': bill.payment_mode,
+        'tenders': [{'payment_mode': m, 'amount': a} for m, a in tenders],
+        'refunded': refunded,
+        'status': bill.status
+    }
+
+def _archived_data(archived):
+    return {
+        'bill_number': archived['bill_number'],
+        'created_at': datetime.fromisoformat(archived['created_at']),
+        'customer': None,
+        'items': [{
+            'name': item['product_name'] or item['product_id'],
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            'discount': item['discount'] or 0,
+            'total': item['total']
+        } for item in archived['items']],
+        'subtotal': archived['subtotal'],
+        'discount': archived['discount'],
+        'tax': archived['tax'],
+        'taxes': archived['taxes'],
+        'total': archived['total'],
+        'payment_mode': archived['payment_mode'],
+        'tenders': [],
+        'refunded': 0,
+        'status': archived['status']
+    }
+
+def _columns(left, right, width=RECEIPT_WIDTH):
+    return left[:width - len(right) - 1].ljust(width - len(right)) + right
+
+def receipt_lines(data, duplicate=False):
+    """Receipt as (style, text) lines; style is 'title', 'center', 'bold' or ''"""
+    rule = '-' * RECEIPT_WIDTH
+    lines = [
+        ('title', current_app.config.get('RECEIPT_HEADER', 'MANI SUPER MART')),
+        ('center', 'DUPLICATE' if duplicate else 'TAX INVOICE'),
+        ('', rule),
+        ('', _columns(f"Bill: {data['bill_number']}", data['created_at'].strftime('%d-%m-%Y %H:%M')))
+    ]
+    if data['customer']:
+        lines.append(('', f"Customer: {data['customer']}"))
+    lines.append(('', rule))
+    
+    for item in data['items']:
+        lines.append(('', item['name'][:RECEIPT_WIDTH]))
+        detail = f"  {item['quantity']} x {item['unit_price']:.2f}"
+        if item['discount']:
+            detail += f" - {item['discount']:.2f}"
+        lines.append(('', _columns(detail, f"{item['total']:.2f}")))
+    
+    lines += [
+        ('', rule),
+        ('', _columns('Subtotal', f"{data['subtotal']:.2f}")),
+        ('', _columns('Discount', f"{data['discount']:.2f}")),
+        ('', _columns('Tax', f"{data['tax']:.2f}")),
+        ('bold', _columns('TOTAL', f"Rs {data['total']:.2f}")),
+        ('', rule)
+    ]
+    
+    # GST breakup, tax split equally between CGST and SGST
+    if data['taxes']:
+        lines.append(('', f"{'GST %':<7}{'Taxable':>11}{'CGST':>12}{'SGST':>12}"))
+        for slab in data['taxes']:
+            half = slab['tax'] / 2
+            lines.append(('', f"{slab['rate']:<7g}{slab['taxable']:>11.2f}{half:>12.2f}{half:>12.2f}"))
+        lines.append(('', rule))
+    
+    # Without posted tenders a completed bill was paid in its payment mode; any other bill is still owed
+    if data['tenders']:
+        for tender in data['tenders']:
+            lines.append(('', _columns(f"Paid {tender['payment_mode'].upper()}", f"{tender['amount']:.2f}")))
+    elif data['status'] == 'completed':
+        lines.append(('', _columns(f"Paid {data['payment_mode'].upper()}", f"{data['total']:.2f}")))
+    else:
+        lines.append(('', _columns('Amount due', f"{data['total']:.2f}")))
+    if data['refunded']:
+        lines.append(('', _columns('Refunded', f"{data['refunded']:.2f}")))
+    if data['status'] == 'returned':
+        lines.append(('center', 'RETURNED'))
+    
+    lines += [('', rule), ('center', 'Thank you for shopping!')]
+    return lines
+
+def render_text(lines):
+    return ('\n'.join(
+        text.center(RECEIPT_WIDTH).rstrip() if style in ('title', 'center') else text for style, text in lines
+    ) + '\n').encode('utf-8')
+
+def render_escpos(lines):
+    out = [ESC_INIT]
+    for style, text in lines:
+        encoded = text.encode('ascii', 'replace') + b'\n'
+        if style == 'title':
+            out += [ESC_ALIGN_CENTER, ESC_DOUBLE_ON, encoded, ESC_DOUBLE_OFF, ESC_ALIGN_LEFT]
+        elif style == 'center':
+            out += [ESC_ALIGN_CENTER, encoded, ESC_ALIGN_LEFT]
+        elif style == 'bold':
+            out += [ESC_BOLD_ON, encoded, ESC_BOLD_OFF]
+        else:
+            out.append(encoded)
+    out.append(ESC_FEED_CUT)
+    return b''.join(out)
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def render_pdf(lines):
+    """Single-page PDF in Courier sized to an 80 mm roll, written without a PDF library"""
+    size, leading, margin = 8, 10, 12
+    width = RECEIPT_WIDTH * size * 0.6 + 2 * margin
+    height = len(lines) * leading + 2 * margin
+    
+    ops = ['BT', f'{leading} TL', f'{margin} {height - margin - size} Td']
+    for style, text in lines:
+        font = 'F2' if style in ('title', 'bold') else 'F1'
+        if style in ('title', 'center'):
+            text = text.center(RECEIPT_WIDTH).rstrip()
+        ops.append(f'/{font} {size} Tf ({_pdf_escape(text.encode("latin-1", "replace").decode("latin-1"))}) Tj T*')
+    ops.append('ET')
+    stream = '\n'.join(ops).encode('latin-1')
+    
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] '
+        f'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>'.encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length ' + str(len(stream)).encode() + b' >>\nstream\n' + stream + b'\nendstream'
+    ]
+    
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(out)
+
+RENDERERS = {'text': render_text, 'escpos': render_escpos, 'pdf': render_pdf}
+
+class ReceiptCache:
+    """Rendered receipts by (bill id, version, format, copy), least recently used evicted first"""
+    def __init__(self, max_entries=RECEIPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return body
+    
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+receipt_cache = StoreLocal(ReceiptCache)
+
+def render_receipt(bill_id, fmt='text', duplicate=False):
+    """Render a bill's receipt, live or archived, from the cache when the bill has not changed.
+    
+    Returns (body, version, cached). Reads only; a reprint writes no rows.
+    """
+    if fmt not in RENDERERS:
+        raise ReceiptError(f"Unknown format '{fmt}', expected one of {', '.join(RENDERERS)}")
+    
+    bill = db.session.get(Bill, bill_id)
+    # Archived bills no longer change
+    version = receipt_version(bill) if bill else 'archived'
+    key = (bill_id, version, fmt, duplicate)
+    
+    body = receipt_cache.get(key)
+    if body is not None:
+        return body, version, True
+    
+    if bill:
+        data = receipt_data(bill)
+    else:
+        archived = find_archived_bill(bill_id)
+        if not archived:
+            raise ReceiptError('Bill not found', 404)
+        data = _archived_data(archived)
+    
+    body = RENDERERS[fmt](receipt_lines(data, duplicate))
+    receipt_cache.put(key, body)
+    return body, version, False
@@ -0,0 +1,361 @@
+from sqlalchemy import event, select, func, or_
+from sqlalchemy.orm import Session
+from models.database import db, Product, Offer, Coupon, BillItem, ChangeLog, CatalogTombstone, ReplicationCursor
+from services.stores import use_store, normalize_store
+from datetime import datetime
+from urllib.error import URLError
+from urllib.parse import urlencode
+import json
+import threading
+import time
+import urllib.request
+
+CATALOG_ENTITIES = ('products', 'offers', 'coupons')
+FEED_BATCH = 1000
+MAX_FEED_BATCH = 5000
+PULL_TIMEOUT = 10
+
+# Catalog attributes only; stock, reorder levels and coupon usage stay local to each node
+FEED_FIELDS = {
+    'products': ['id', 'barcode', 'name', 'category', 'price'],
+    'offers': ['id', 'name', 'offer_type', 'product_barcode', 'category', 'discount_value',
+               'min_quantity', 'valid_from', 'valid_till', 'active'],
+    'coupons': ['id', 'code', 'discount_type', 'discount_value', 'min_purchase', 'max_uses',
+                'valid_from', 'valid_till', 'active']
+}
+DATE_FIELDS = ('valid_from', 'valid_till')
+RETIRED_BARCODE = 'retired:{id}'  # barcode of a deleted product this node has bills for
+
+class ReplicationError(Exception):
+    """Raised when a change feed cannot be fetched or applied"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@event.listens_for(Session, 'after_flush')
+def _record_tombstones(session, flush_context):
+    """Keep the barcode or code of deleted products and coupons for the change feed"""
+    rows = []
+    for obj in session.deleted:
+        table = getattr(obj, '__tablename__', None)
+        if table == 'products':
+            rows.append({'entity': table, 'row_id': obj.id, 'natural_key': obj.barcode})
+        elif table == 'coupons':
+            rows.append({'entity': table, 'row_id': obj.id, 'natural_key': obj.code})
+    
+    if rows:
+        session.connection().execute(CatalogTombstone.__table__.insert(), rows)
+
+def _feed_rows(entity, ids=None):
+    """Current catalog rows of an entity as compact arrays in FEED_FIELDS order, all rows without ids"""
+    if entity == 'products':
+        query = select(Product.id, Product.barcode, Product.name, Product.category, Product.price)
+        model = Product
+    elif entity == 'offers':
+        query = select(
+            Offer.id, Offer.name, Offer.offer_type, Product.barcode, Offer.category, Offer.discount_value,
+            Offer.min_quantity, Offer.valid_from, Offer.valid_till, Offer.active
+        ).outerjoin(Product, Product.id == Offer.product_id)
+        model = Offer
+    else:
+        query = select(
+            Coupon.id, Coupon.code, Coupon.discount_type, Coupon.discount_value, Coupon.min_purchase,
+            Coupon.max_uses, Coupon.valid_from, Coupon.valid_till, Coupon.active
+        )
+        model = Coupon
+    
+    if ids is not None:
+        if not ids:
+            return []
+        query = query.where(model.id.in_(ids))
+    
+    return [[v.isoformat() if isinstance(v, datetime) else v for v in row] for row in db.session.execute(query)]
+
+def changes_since(since, limit=FEED_BATCH):
+    """One page of catalog changes after a change log position.
+    
+    Rows are sent as they are now, once per page however often they changed,
+    so applying a page is idempotent. A cursor of 0, or one past the end of
+    this log (the source was rebuilt), gets the whole catalog instead, with
+    the ids still live so the receiver can drop rows deleted in between.
+    """
+    limit = max(1, min(limit, MAX_FEED_BATCH))
+    head = db.session.execute(select(func.coalesce(func.max(ChangeLog.id), 0))).scalar()
+    
+    if since <= 0 or since > head:
+        upserts = {entity: _feed_rows(entity) for entity in CATALOG_ENTITIES}
+        return {
+            'cursor': head,
+            'has_more': False,
+            'reset': True,
+            'fields': FEED_FIELDS,
+            'upserts': upserts,
+            'deletes': {entity: [] for entity in CATALOG_ENTITIES},
+            'live': {entity: [row[0] for row in rows] for entity, rows in upserts.items()}
+        }
+    
+    rows = db.session.execute(
+        select(ChangeLog.id, ChangeLog.entity, ChangeLog.row_id, ChangeLog.operation)
+        .where(ChangeLog.id > since, ChangeLog.entity.in_(CATALOG_ENTITIES))
+        .order_by(ChangeLog.id)
+        .limit(limit)
+    ).all()
+    
+    # Later operations on the same row win
+    latest = {entity: {} for entity in CATALOG_ENTITIES}
+    for _, entity, row_id, operation in rows:
+        latest[entity][row_id] = operation
+    
+    deleted = [row_id for ops in latest.values() for row_id, op in ops.items() if op == 'delete']
+    natural_keys = dict(db.session.execute(
+        select(CatalogTombstone.row_id, CatalogTombstone.natural_key).where(CatalogTombstone.row_id.in_(deleted))
+    ).all()) if deleted else {}
+    
+    return {
+        # Stock-only product updates share the log, so the cursor can move past changes that were all skipped
+        'cursor': rows[-1].id if rows else since,
+        'has_more': len(rows) == limit,
+        'reset': False,
+        'fields': FEED_FIELDS,
+        'upserts': {entity: _feed_rows(entity, [r for r, op in ops.items() if op != 'delete'])
+                    for entity, ops in latest.items()},
+        'deletes': {entity: [[r, natural_keys.get(r)] for r, op in ops.items() if op == 'delete']
+                    for entity, ops in latest.items()}
+    }
+
+def _assign(obj, values):
+    """Set only the attributes that differ, so unchanged rows are not flushed or versioned"""
+    changed = False
+    for field, value in values.items():
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed = True
+    return changed
+
+def _apply_products(rows, deletes):
+    ids = [r['id'] for r in rows] + [d[0] for d in deletes]
+    barcodes = [r['barcode'] for r in rows] + [d[1] for d in deletes if d[1]]
+    local = Product.query.filter(or_(Product.id.in_(ids), Product.barcode.in_(barcodes))).all() if ids else []
+    by_id = {p.id: p for p in local}
+    by_barcode = {p.barcode: p for p in local}
+    
+    sold = {r[0] for r in db.session.query(BillItem.product_id).filter(
+        BillItem.product_id.in_([p.id for p in local])
+    ).distinct()} if local else set()
+    
+    applied = 0
+    for row_id, barcode in deletes:
+        product = by_id.pop(row_id, None) or by_barcode.get(barcode)
+        if product:
+            by_barcode.pop(product.barcode, None)
+            if product.id in sold:
+                # Its bill lines still point at it; free the barcode instead of deleting the row
+                product.barcode = RETIRED_BARCODE.format(id=product.id)
+            else:
+                db.session.delete(product)
+            applied += 1
+    
+    # Deletes go out first, a new product may reuse a deleted one's barcode
+    db.session.flush()
+    
+    for row in rows:
+        product = by_id.get(row['id']) or by_barcode.get(row['barcode'])
+        values = {k: row[k] for k in ('barcode', 'name', 'category', 'price')}
+        if product is None:
+            product = Product(id=row['id'], quantity=0, **values)
+            db.session.add(product)
+            by_barcode[product.barcode] = product
+            applied += 1
+        elif _assign(product, values):
+            applied += 1
+    
+    db.session.flush()
+    return applied
+
+def _apply_offers(rows, deletes):
+    ids = [r['id'] for r in rows] + [d[0] for d in deletes]
+    local = {o.id: o for o in Offer.query.filter(Offer.id.in_(ids)).all()} if ids else {}
+    barcodes = {r['product_barcode'] for r in rows if r['product_barcode']}
+    products = dict(db.session.query(Product.barcode, Product.id).filter(Product.barcode.in_(barcodes)).all()) if barcodes else {}
+    
+    applied = 0
+    for row_id, _ in deletes:
+        if row_id in local:
+            db.session.delete(local.pop(row_id))
+            applied += 1
+    
+    for row in rows:
+        values = {k: v for k, v in row.items() if k not in ('id', 'product_barcode')}
+        values['product_id'] = products.get(row['product_barcode'])
+        if row['product_barcode'] and values['product_id'] is None:
+            # Offer on a product this node does not carry
+            continue
+        
+        offer = local.get(row['id'])
+        if offer is None:
+            db.session.add(Offer(id=row['id'], **values))
+            applied += 1
+        elif _assign(offer, values):
+            applied += 1
+    
+    return applied
+
+def _apply_coupons(rows, deletes):
+    ids = [r['id'] for r in rows] + [d[0] for d in deletes]
+    codes = [r['code'] for r in rows] + [d[1] for d in deletes if d[1]]
+    local = Coupon.query.filter(or_(Coupon.id.in_(ids), Coupon.code.in_(codes))).all() if ids else []
+    by_id = {c.id: c for c in local}
+    by_code = {c.code: c for c in local}
+    
+    applied = 0
+    for row_id, code in deletes:
+        coupon = by_id.pop(row_id, None) or by_code.get(code)
+        if coupon:
+            by_code.pop(coupon.code, None)
+            db.session.delete(coupon)
+            applied += 1
+    
+    db.session.flush()
+    
+    for row in rows:
+        coupon = by_id.get(row['id']) or by_code.get(row['code'])
+        values = {k: v for k, v in row.items() if k != 'id'}
+        if coupon is None:
+            db.session.add(Coupon(id=row['id'], **values))
+            applied += 1
+        elif _assign(coupon, values):
+            applied += 1
+    
+    return applied
+
+def _stale_rows(entity, live, rows):
+    """[id, natural key] of local rows a full catalog no longer has, matched as upserts are"""
+    live = set(live)
+    if entity == 'offers':
+        return [[row_id, None] for (row_id,) in db.session.query(Offer.id) if row_id not in live]
+    
+    if entity == 'products':
+        keys = {r['barcode'] for r in rows}
+        local = db.session.query(Product.id, Product.barcode).filter(
+            ~Product.barcode.startswith(RETIRED_BARCODE.format(id=''))
+        )
+    else:
+        keys = {r['code'] for r in rows}
+        local = db.session.query(Coupon.id, Coupon.code)
+    
+    return [[row_id, key] for row_id, key in local if row_id not in live and key not in keys]
+
+def apply_changes(feed, source):
+    """Apply one change feed page and move the source's cursor in a single transaction.
+    
+    Rows are matched by id, then by barcode or coupon code, so a node seeded
+    on its own keeps its ids. Only rows whose catalog attributes differ are
+    written, through the ORM, so local versions, lane deltas and offer
+    events follow as for any edit. A reset page replaces the catalog, so
+    local rows it does not list are deleted, or retired if sold. Returns
+    {entity: rows applied}.
+    """
+    decoded = {}
+    for entity in CATALOG_ENTITIES:
+        fields = feed['fields'][entity]
+        decoded[entity] = [dict(zip(fields, row)) for row in feed['upserts'].get(entity, [])]
+        for row in decoded[entity]:
+            for field in DATE_FIELDS:
+                if row.get(field):
+                    row[field] = datetime.fromisoformat(row[field])
+    
+    deletes = feed.get('deletes', {})
+    
+    try:
+        if feed.get('reset'):
+            deletes = {entity: _stale_rows(entity, feed['live'][entity], decoded[entity])
+                       for entity in CATALOG_ENTITIES}
+        
+        # Products first, offers refer to them by barcode
+        counts = {
+            'products': _apply_products(decoded['products'], deletes.get('products', [])),
+            'offers': _apply_offers(decoded['offers'], deletes.get('offers', [])),
+            'coupons': _apply_coupons(decoded['coupons'], deletes.get('coupons', []))
+        }
+        
+        cursor = db.session.get(ReplicationCursor, source)
+        if cursor is None:
+            cursor = ReplicationCursor(source=source, cursor=0, applied=0)
+            db.session.add(cursor)
+        cursor.cursor = feed['cursor']
+        cursor.applied += sum(counts.values())
+        cursor.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise ReplicationError(f'Could not apply changes from {source}: {e}', 500)
+    
+    return counts
+
+def fetch_changes(source, since, limit=FEED_BATCH):
+    """Get a change feed page from another server's URL, or from another store here with store:<id>"""
+    if source.startswith('store:'):
+        with use_store(normalize_store(source[len('store:'):])):
+            return changes_since(since, limit)
+    
+    url = f"{source.rstrip('/')}/api/catalog/changes?{urlencode({'since': since, 'limit': limit})}"
+    try:
+        with urllib.request.urlopen(url, timeout=PULL_TIMEOUT) as response:
+            return json.load(response)['data']
+    except (URLError, ValueError, KeyError) as e:
+        raise ReplicationError(f'Could not fetch changes from {source}: {e}', 502)
+
+def pull_catalog(source, limit=FEED_BATCH):
+    """Fetch and apply pages from a source until caught up; returns pages and rows applied per entity"""
+    cursor = db.session.get(ReplicationCursor, source)
+    since = cursor.cursor if cursor else 0
+    
+    pages = 0
+    totals = dict.fromkeys(CATALOG_ENTITIES, 0)
+    while True:
+        feed = fetch_changes(source, since, limit)
+        if feed['cursor'] == since and not feed['reset']:
+            break
+        
+        for entity, count in apply_changes(feed, source).items():
+            totals[entity] += count
+        pages += 1
+        since = feed['cursor']
+        
+        if not feed['has_more']:
+            break
+    
+    return {'source': source, 'cursor': since, 'pages': pages, 'applied': totals}
+
+def replication_status():
+    return [{
+        'source': c.source,
+        'cursor': c.cursor,
+        'applied': c.applied,
+        'updated_at': c.updated_at.isoformat() if c.updated_at else None
+    } for c in ReplicationCursor.query.order_by(ReplicationCursor.source).all()]
+
+def start_catalog_replicator(app, source, interval_seconds):
+    """Pull the source's catalog changes into every store every interval_seconds on a daemon thread"""
+    source_store = normalize_store(source[len('store:'):]) if source.startswith('store:') else None
+    
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            for store in app.config['STORES']:
+                if store == source_store:
+                    continue
+                with use_store(store, app):
+                    try:
+                        result = pull_catalog(source)
+                        if any(result['applied'].values()):
+                            app.logger.info(f"Catalog replication into {store}: {result['applied']}")
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.error(f'Catalog replication into {store} failed: {e}')
+    
+    thread = threading.Thread(target=run, name='catalog-replicator', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,114 @@
+from flask import current_app
+from models.database import db, Product, Customer
+from services.analytics import top_products, daily_totals
+from services.stores import use_store, current_store
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from collections import namedtuple
+from datetime import datetime
+import threading
+import time
+
+REPORT_WORKERS = 8
+SECTION_TIMEOUT = 2.0
+
+# fn runs with no arguments in its own app context; ttl is how long (seconds) a result is served without rerunning
+ReportSection = namedtuple('ReportSection', 'name fn timeout ttl default', defaults=(SECTION_TIMEOUT, 0, None))
+
+class ReportExecutor:
+    """Runs the independent sections of a report in parallel on a thread pool.
+    
+    Each section gets its own app context, and so its own session and
+    pooled SQLite connection, reading the WAL database alongside checkout
+    writes. A section that misses its timeout is answered from its last
+    result, or its default, and keeps running to refresh that result for
+    the next request; a section already running is joined, not restarted.
+    """
+    def __init__(self, max_workers=REPORT_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._cache = {}  # (store, section, params) -> (result, computed at monotonic, computed at)
+        self._running = {}
+        self._lock = threading.Lock()
+    
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-section')
+            return self._pool
+    
+    def _run(self, app, key, section):
+        try:
+            with use_store(key[0], app):
+                result = section.fn()
+            with self._lock:
+                self._cache[key] = (result, time.monotonic(), datetime.utcnow())
+            return result
+        finally:
+            with self._lock:
+                self._running.pop(key, None)
+    
+    def _submit(self, app, key, section):
+        pool = self._executor()
+        with self._lock:
+            future = self._running.get(key)
+            if future is None:
+                future = self._running[key] = pool.submit(self._run, app, key, section)
+        return future
+    
+    def run(self, sections, params=()):
+        """Run sections for the current store; returns ({name: result}, {name: status and timing})"""
+        app = current_app._get_current_object()
+        store = current_store()
+        started = time.perf_counter()
+        
+        results, meta, pending = {}, {}, {}
+        for section in sections:
+            key = (store, section.name, params)
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[1] < section.ttl:
+                results[section.name] = cached[0]
+                meta[section.name] = {'status': 'cached', 'computed_at': cached[2].isoformat()}
+            else:
+                pending[section.name] = (section, self._submit(app, key, section))
+        
+        for section, future in pending.values():
+            key = (store, section.name, params)
+            try:
+                results[section.name] = future.result(timeout=max(0, started + section.timeout - time.perf_counter()))
+                meta[section.name] = {'status': 'fresh'}
+            except Exception as e:
+                cached = self._cache.get(key)
+                if isinstance(e, FutureTimeout):
+                    meta[section.name] = {'status': 'stale' if cached else 'timeout'}
+                else:
+                    app.logger.error(f'Report section {section.name} failed: {e}')
+                    meta[section.name] = {'status': 'error', 'error': str(e)}
+                
+                results[section.name] = cached[0] if cached else section.default
+                if cached:
+                    meta[section.name]['computed_at'] = cached[2].isoformat()
+            
+            meta[section.name]['ms'] = round((time.perf_counter() - started) * 1000, 1)
+        
+        return {s.name: results[s.name] for s in sections}, {s.name: meta[s.name] for s in sections}
+
+report_executor = ReportExecutor()
+
+def dashboard_sections(start_day, end_day):
+    """Sections of the dashboard stats, each an independent read"""
+    def today():
+        totals = daily_totals(datetime.utcnow().date())
+        return {
+            'sales': totals['sales'],
+            'transactions': totals['bills'],
+            'average_bill': totals['sales'] / totals['bills'] if totals['bills'] > 0 else 0
+        }
+    
+    return [
+        ReportSection('today', today, default={'sales': 0, 'transactions': 0, 'average_bill': 0}),
+        ReportSection('total_products', lambda: db.session.query(db.func.count(Product.id)).scalar(), ttl=30),
+        ReportSection('total_customers', lambda: db.session.query(db.func.count(Customer.id)).scalar(), ttl=30),
+        ReportSection('top_products', lambda: [
+            {'name': p['name'], 'quantity': p['quantity']} for p in top_products(start_day, end_day, limit=5)
+        ], ttl=10, default=[])
+    ]
@@ -0,0 +1,191 @@
+from sqlalchemy import update, insert, case, func
+from models.database import db, Bill, Product, InventoryLog, BillReturn, BillReturnItem, BillTax
+from services.events import queue_event, bill_payload, stock_payload
+from services.analytics import add_daily_sales
+from services.loyalty import add_entry, reverse_bill, accrued_points
+from services.bill_log import append_events, status_event
+from services.tax import load_tax_table, return_credits
+from datetime import datetime
+
+class ReturnError(Exception):
+    """Raised when requested return lines are not valid for the bill"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def returned_quantities(bill_id):
+    """Get {bill_item_id: quantity already returned} for a bill"""
+    rows = db.session.query(BillReturnItem.bill_item_id, func.sum(BillReturnItem.quantity)).join(
+        BillReturn, BillReturn.id == BillReturnItem.return_id
+    ).filter(BillReturn.bill_id == bill_id).group_by(BillReturnItem.bill_item_id).all()
+    
+    return dict(rows)
+
+def resolve_return_lines(bill, lines=None):
+    """Validate requested lines against what is still returnable; no lines means everything left.
+    
+    Lines name a bill_item_id or a product_id and a quantity. Returns a list
+    of (bill_item, quantity).
+    """
+    if bill.status == 'returned':
+        raise ReturnError('Bill already returned')
+    if bill.status != 'completed':
+        raise ReturnError('Only completed bills can be returned')
+    
+    returned = returned_quantities(bill.id)
+    remaining = {item.id: item.quantity - returned.get(item.id, 0) for item in bill.items}
+    
+    if not lines:
+        resolved = [(item, remaining[item.id]) for item in bill.items if remaining[item.id] > 0]
+        if not resolved:
+            raise ReturnError('Bill already returned')
+        return resolved
+    
+    items_by_id = {item.id: item for item in bill.items}
+    items_by_product = {}
+    for item in bill.items:
+        items_by_product.setdefault(item.product_id, []).append(item)
+    
+    resolved = []
+    for line in lines:
+        quantity = int(line.get('quantity', 0))
+        if quantity <= 0:
+            raise ReturnError('Return quantity must be positive')
+        
+        if line.get('bill_item_id'):
+            candidates = [items_by_id[line['bill_item_id']]] if line['bill_item_id'] in items_by_id else []
+        else:
+            candidates = items_by_product.get(line.get('product_id'), [])
+        
+        if not candidates:
+            raise ReturnError(f"Item {line.get('bill_item_id') or line.get('product_id')} is not on this bill", 404)
+        
+        # A product sold on several lines is returned against them in order
+        for item in candidates:
+            take = min(quantity, remaining[item.id])
+            if take:
+                resolved.append((item, take))
+                remaining[item.id] -= take
+                quantity -= take
+        
+        if quantity:
+            raise ReturnError(f'Return quantity exceeds what is left to return for {candidates[0].product.name}')
+    
+    return resolved
+
+def apply_return(bill, resolved, reason=None, exchange_bill=None):
+    """Record a return and restore stock with set-based statements in the current transaction.
+    
+    Stock, inventory logs and the bill status are written with core
+    statements, so the flush hooks do not see them; version bumps, events,
+    daily sales, loyalty entries and the bill log are applied here instead.
+    """
+    # Any pending ORM stock changes (an exchange bill) must land before the increments
+    db.session.flush()
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    
+    # Bill level discount and tax are refunded in proportion to each line
+    ratio = (bill.total / bill.subtotal) if bill.subtotal else 0
+    
+    bill_return = BillReturn(
+        bill_id=bill.id,
+        exchange_bill_id=exchange_bill.id if exchange_bill else None,
+        reason=reason
+    )
+    restock = {}
+    
+    for item, quantity in resolved:
+        amount = round(item.total / item.quantity * quantity * ratio, 2) if item.quantity else 0
+        bill_return.items.append(BillReturnItem(
+            bill_item_id=item.id,
+            product_id=item.product_id,
+            quantity=quantity,
+            amount=amount
+        ))
+        restock[item.product_id] = restock.get(item.product_id, 0) + quantity
+    
+    bill_return.refund_amount = round(sum(i.amount for i in bill_return.items), 2)
+    db.session.add(bill_return)
+    db.session.flush()
+    
+    products = Product.__table__
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(list(restock)))
+        .values(quantity=products.c.quantity + case(restock, value=products.c.id), updated_at=now),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+    
+    connection.execute(insert(InventoryLog.__table__), [{
+        'product_id': product_id,
+        'quantity_change': quantity,
+        'reason': 'return',
+        'bill_id': bill.id,
+        'created_at': now
+    } for product_id, quantity in restock.items()])
+    
+    for product in Product.query.filter(Product.id.in_(list(restock))).all():
+        queue_event(db.session(), 'stock', stock_payload(product))
+    
+    fully_returned = sum(returned_quantities(bill.id).values()) >= sum(item.quantity for item in bill.items)
+    _subtract_daily_sales(connection, bill, resolved)
+    _credit_taxes(connection, bill, resolved, now.date())
+    
+    if fully_returned:
+        connection.execute(update(Bill.__table__).where(Bill.id == bill.id).values(status='returned', updated_at=now))
+        db.session.expire(bill, ['status', 'updated_at'])
+        append_events(connection, [status_event(bill.id, 'completed', 'returned')])
+        
+        payload = bill_payload(bill, 'status')
+        payload['previous_status'] = 'completed'
+        queue_event(db.session(), 'bill', payload)
+    
+    if bill.customer_id:
+        if fully_returned:
+            reverse_bill(connection, bill.id)
+        else:
+            # Take back the points the refunded amount earned
+            refunded = db.session.query(func.sum(BillReturn.refund_amount)).filter(BillReturn.bill_id == bill.id).scalar()
+            before = accrued_points(bill.total - refunded + bill_return.refund_amount)
+            after = accrued_points(bill.total - refunded)
+            add_entry(connection, bill.customer_id, after - before, -bill_return.refund_amount, 'reversal', bill.id)
+    
+    return bill_return
+
+def _credit_taxes(connection, bill, resolved, day):
+    """Negative bill_taxes rows for the returned lines on the return day, so the GST report nets partial returns out"""
+    sold, remaining = {}, {}
+    for rate, taxable in db.session.query(BillTax.rate, BillTax.taxable).filter(BillTax.bill_id == bill.id):
+        if taxable > 0:
+            sold[rate] = sold.get(rate, 0) + taxable
+        remaining[rate] = remaining.get(rate, 0) + taxable
+    
+    line_totals = sum(item.total for item in bill.items)
+    lines = [(item.product.category, item.total / item.quantity * quantity) for item, quantity in resolved if item.quantity]
+    credits = return_credits(sold, remaining, lines, sum(sold.values()) / line_totals if line_totals else 0, load_tax_table())
+    
+    if credits:
+        connection.execute(insert(BillTax.__table__), [dict(credit, bill_id=bill.id, day=day) for credit in credits])
+
+def _subtract_daily_sales(connection, bill, resolved):
+    day = (bill.created_at or datetime.utcnow()).date()
+    returned = returned_quantities(bill.id)
+    sold = {}
+    for item in bill.items:
+        sold.setdefault(item.product_id, [0, 0])
+        sold[item.product_id][0] += item.quantity
+        sold[item.product_id][1] += returned.get(item.id, 0)
+    
+    lines = {}
+    for item, quantity in resolved:
+        quantity_delta, revenue_delta = lines.get(item.product_id, (0, 0.0))
+        revenue = item.total / item.quantity * quantity if item.quantity else 0
+        lines[item.product_id] = (quantity_delta - quantity, revenue_delta - revenue)
+    
+    # A product stops counting toward the bill once all of it has come back
+    add_daily_sales(connection, [
+        (product_id, day, quantity, revenue, -1 if sold[product_id][1] >= sold[product_id][0] else 0)
+        for product_id, (quantity, revenue) in lines.items()
+    ])
@@ -0,0 +1,211 @@
+from flask import request, has_request_context
+from sqlalchemy import event
+from models.database import db
+from services.stores import current_store
+from collections import deque, Counter
+from datetime import datetime
+import os
+import re
+import sys
+import threading
+import time
+
+MAX_FINGERPRINTS = 500
+RECENT_SLOW = 200
+CALL_SITES_KEPT = 5
+EXPLAINED = ('select', 'with', 'update', 'delete', 'insert')
+SORT_KEYS = ('total_ms', 'count', 'max_ms', 'last_seen')
+
+_THIS_FILE = os.path.abspath(__file__)
+_BACKEND_DIR = os.path.dirname(os.path.dirname(_THIS_FILE))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bin\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bvalues\s*(\((?:\s*\?\s*,)*\s*\?\s*\))(?:\s*,\s*\1)+', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+def fingerprint(statement):
+    """Statement with literals, IN lists and repeated VALUES rows collapsed, so one query shape is one entry"""
+    normalized = _STRING.sub('?', statement)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _SPACE.sub(' ', normalized).strip()
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    return _VALUES_LIST.sub(r'VALUES \1, ...', normalized)
+
+def call_site():
+    """First frame in this codebase outside SQLAlchemy and this module, as file:line in function"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_BACKEND_DIR) and filename != _THIS_FILE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, _BACKEND_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+def explain(engine, statement, parameters, executemany):
+    """EXPLAIN QUERY PLAN under the statement's parameters, on a connection of its own; rows of (detail, table scan)"""
+    if statement.split(None, 1)[0].lower() not in EXPLAINED:
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    
+    # A raw pooled connection: outside the caller's transaction, and its own cursor is not timed
+    try:
+        connection = engine.raw_connection()
+    except Exception as e:
+        return [{'detail': f'EXPLAIN failed: {e}', 'table_scan': False}]
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+        rows = cursor.fetchall()
+    except Exception as e:
+        return [{'detail': f'EXPLAIN failed: {e}', 'table_scan': False}]
+    finally:
+        connection.close()
+    
+    # SQLite reports a full table read as "SCAN <table>"; an index walk says USING ... INDEX
+    return [{'detail': row[-1], 'table_scan': row[-1].startswith('SCAN ') and 'INDEX' not in row[-1]} for row in rows]
+
+class SlowQueryLog:
+    """Statements slower than SLOW_QUERY_MS, aggregated by fingerprint.
+    
+    Every statement is timed from the store engines' cursor events. A slow
+    one is folded into its fingerprint's counts and call sites; its query
+    plan is captured the first time the fingerprint is seen slow, with the
+    same parameters on a separate connection. At most MAX_FINGERPRINTS are
+    kept, dropping the one with the least total time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._recent = deque(maxlen=RECENT_SLOW)
+        self.threshold_ms = 50
+        self.explain_plans = True
+        self.started_at = datetime.utcnow()
+    
+    def init_app(self, app):
+        self.threshold_ms = app.config['SLOW_QUERY_MS']
+        self.explain_plans = app.config['SLOW_QUERY_EXPLAIN']
+        
+        # This app's store engines only, once each, not every Engine in the process
+        with app.app_context():
+            for engine in db.engines.values():
+                if not event.contains(engine, 'before_cursor_execute', self._start_timer):
+                    event.listen(engine, 'before_cursor_execute', self._start_timer)
+                    event.listen(engine, 'after_cursor_execute', self._check_duration)
+    
+    def _start_timer(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.slow_query_started = time.perf_counter()
+    
+    def _check_duration(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'slow_query_started', None)
+        if started is None:
+            return
+        
+        milliseconds = (time.perf_counter() - started) * 1000
+        if milliseconds >= self.threshold_ms:
+            # EXPLAIN QUERY PLAN is SQLite's; other databases get timings and call sites only
+            explainable = conn.dialect.name == 'sqlite'
+            self.record(statement, milliseconds, conn.engine if explainable else None, parameters, executemany)
+    
+    def record(self, statement, milliseconds, engine=None, parameters=None, executemany=False):
+        key = fingerprint(statement)
+        site = call_site()
+        endpoint = request.endpoint if has_request_context() else None
+        now = datetime.utcnow()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            needs_plan = entry is None or entry['plan'] is None
+        
+        # Outside the lock: EXPLAIN waits on a pooled connection
+        plan = explain(engine, statement, parameters, executemany) if needs_plan and engine is not None and self.explain_plans else None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= MAX_FINGERPRINTS:
+                    del self._entries[min(self._entries, key=lambda k: self._entries[k]['total_ms'])]
+                entry = self._entries[key] = {
+                    'fingerprint': key,
+                    'statement': statement,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'first_seen': now,
+                    'call_sites': Counter(),
+                    'endpoints': Counter(),
+                    'stores': set(),
+                    'plan': None
+                }
+            
+            entry['count'] += 1
+            entry['total_ms'] += milliseconds
+            entry['last_ms'] = milliseconds
+            entry['last_seen'] = now
+            if milliseconds > entry['max_ms']:
+                entry['max_ms'] = milliseconds
+                entry['statement'] = statement
+            entry['call_sites'][site] += 1
+            if endpoint:
+                entry['endpoints'][endpoint] += 1
+            entry['stores'].add(current_store())
+            if plan is not None and entry['plan'] is None:
+                entry['plan'] = plan
+            
+            self._recent.append({'fingerprint': key, 'ms': round(milliseconds, 2), 'call_site': site,
+                                 'endpoint': endpoint, 'at': now.isoformat()})
+    
+    def report(self, sort='total_ms', limit=50, table_scans_only=False):
+        """Aggregated slow statements, worst first by sort, and the most recent slow calls"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        
+        with self._lock:
+            entries = [dict(e, call_sites=e['call_sites'].most_common(CALL_SITES_KEPT),
+                            endpoints=e['endpoints'].most_common(CALL_SITES_KEPT), stores=sorted(e['stores']))
+                       for e in self._entries.values()]
+            recent = list(self._recent)
+        
+        for entry in entries:
+            entry['table_scan'] = any(step['table_scan'] for step in entry['plan'] or ())
+        if table_scans_only:
+            entries = [e for e in entries if e['table_scan']]
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        
+        return {
+            'threshold_ms': self.threshold_ms,
+            'since': self.started_at.isoformat(),
+            'fingerprints': len(entries),
+            'queries': [{
+                'fingerprint': e['fingerprint'],
+                'statement': e['statement'],
+                'count': e['count'],
+                'total_ms': round(e['total_ms'], 2),
+                'avg_ms': round(e['total_ms'] / e['count'], 2),
+                'max_ms': round(e['max_ms'], 2),
+                'last_ms': round(e['last_ms'], 2),
+                'first_seen': e['first_seen'].isoformat(),
+                'last_seen': e['last_seen'].isoformat(),
+                'call_sites': [{'site': s, 'count': n} for s, n in e['call_sites']],
+                'endpoints': [{'endpoint': s, 'count': n} for s, n in e['endpoints']],
+                'stores': e['stores'],
+                'table_scan': e['table_scan'],
+                'plan': e['plan']
+            } for e in entries[:limit]],
+            'recent': recent[::-1]
+        }
+    
+    def reset(self, threshold_ms=None):
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+            self._recent.clear()
+            self.started_at = datetime.utcnow()
+            if threshold_ms is not None:
+                self.threshold_ms = threshold_ms
+        return cleared
+
+slow_query_log = SlowQueryLog()
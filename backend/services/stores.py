@@ -0,0 +1,116 @@
+from flask import current_app, g, has_app_context
+from models.database import db, DEFAULT_STORE, store_bind_key, store_engine, create_missing_indexes
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import re
+import threading
+
+STORE_HEADER = 'X-Store-Id'
+FAN_OUT_WORKERS = 8
+
+class StoreError(Exception):
+    """Raised when a request names a store that is not configured"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def normalize_store(store):
+    return re.sub(r'[^a-z0-9_-]', '', (store or '').strip().lower())[:20]
+
+def configure_stores(app, stores):
+    """Give every store but the default its own database file; call before db.init_app.
+    
+    The default store keeps supermart.db, so a single-store install is
+    unchanged. Others live in STORE_DB_DIR/supermart-<store>.db.
+    """
+    stores = [normalize_store(s) for s in stores if normalize_store(s)]
+    app.config['STORES'] = [DEFAULT_STORE] + [s for s in dict.fromkeys(stores) if s != DEFAULT_STORE]
+    
+    if len(app.config['STORES']) > 1:
+        os.makedirs(app.config['STORE_DB_DIR'], exist_ok=True)
+    
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for store in app.config['STORES'][1:]:
+        binds[store_bind_key(store)] = 'sqlite:///' + os.path.join(app.config['STORE_DB_DIR'], f'supermart-{store}.db')
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+def store_ids():
+    return current_app.config['STORES']
+
+def current_store():
+    return g.get('store', DEFAULT_STORE) if has_app_context() else DEFAULT_STORE
+
+def select_store(store):
+    """Route the rest of the app context to a store's database"""
+    store = normalize_store(store) or DEFAULT_STORE
+    if store not in store_ids():
+        raise StoreError(f'Unknown store {store}', 404)
+    g.store = store
+    return store
+
+@contextmanager
+def use_store(store, app=None):
+    """Run a block in a fresh app context, and so a fresh session, bound to a store"""
+    app = app or current_app._get_current_object()
+    with app.app_context():
+        select_store(store)
+        yield store
+
+def store_dir(config_key):
+    """Per-store subdirectory of a directory setting; the default store uses the directory itself"""
+    base = current_app.config[config_key]
+    store = current_store()
+    return base if store == DEFAULT_STORE else os.path.join(base, store)
+
+def init_store_schema():
+    """Create missing tables and indexes in the current store's database"""
+    db.metadata.create_all(store_engine())
+    create_missing_indexes()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix='store-fan-out')
+        return _pool
+
+def fan_out(fn, stores=None):
+    """Call fn() once per store in parallel, each in its own store context; returns {store: result}.
+    
+    Each store is a separate SQLite file, so the per-store queries do not
+    contend with each other. An exception in any store is raised here.
+    """
+    app = current_app._get_current_object()
+    stores = list(stores or store_ids())
+    
+    def run(store):
+        with use_store(store, app):
+            return fn()
+    
+    if len(stores) == 1:
+        return {stores[0]: run(stores[0])}
+    
+    return dict(zip(stores, _executor().map(run, stores)))
+
+class StoreLocal:
+    """One instance of an in-memory service per store, picked by the current store on each access"""
+    def __init__(self, factory):
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+    
+    def for_store(self, store=None):
+        store = store or current_store()
+        instance = self._instances.get(store)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.setdefault(store, self._factory())
+        return instance
+    
+    def __getattr__(self, name):
+        return getattr(self.for_store(), name)
@@ -0,0 +1,410 @@
+from sqlalchemy import insert, update, bindparam, Boolean, Date, DateTime
+from models.database import (db, Product, Customer, Bill, BillItem, Transaction, InventoryLog, BillTax,
+                             BillReturn, BillReturnItem, LoyaltyEntry, BillSequence, ChangeLog)
+from services.versioning import bump_version
+from services.analytics import add_daily_sales
+from services.loyalty import accrued_points
+from services.tax import load_tax_table
+from services.bill_log import append_events
+from datetime import datetime, timedelta
+import math
+import random
+import time
+import uuid
+import numpy as np
+
+SYNTHETIC_LANE = 'SYN'
+BARCODE_PREFIX = '89'  # EAN-13 style, clear of the 1001.. sample barcodes
+COMMIT_DAYS = 7
+INSERT_BATCH = 20000
+CACHE_KIB = 512 * 1024  # page cache while generating
+
+# Category, share of the catalog, typical price; shares follow a long tail like a real assortment
+CATEGORIES = [
+    ('Grocery', 0.18, 120), ('Snacks', 0.11, 60), ('Beverages', 0.09, 90), ('Personal Care', 0.09, 180),
+    ('Household', 0.08, 150), ('Dairy', 0.06, 70), ('Bakery', 0.05, 45), ('Spices', 0.05, 55),
+    ('Fruits', 0.04, 90), ('Vegetables', 0.04, 40), ('Frozen', 0.035, 220), ('Baby Care', 0.03, 350),
+    ('Stationery', 0.03, 40), ('Meat', 0.025, 280), ('Pet Care', 0.02, 300), ('Kitchenware', 0.02, 400),
+    ('Grains', 0.02, 75), ('Health', 0.015, 250), ('Electronics', 0.01, 900), ('Toys', 0.01, 450),
+]
+BRANDS = ['Amrut', 'Sunrise', 'Golden Leaf', 'Shakti', 'Nandini', 'Tara', 'Himalaya', 'Kaveri', 'Vasant', 'Royal',
+          'Ganga', 'Everfresh', 'Kisan', 'Lotus', 'Surya', 'Priya', 'Anand', 'Sagar', 'Mahal', 'Nirmal']
+SIZES = ['50 g', '100 g', '200 g', '250 g', '500 g', '1 kg', '2 kg', '5 kg', '100 ml', '250 ml', '500 ml', '1 l',
+         'Pack of 2', 'Pack of 4', 'Pack of 6', 'Single']
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Sai', 'Rohan', 'Karthik', 'Rahul', 'Vikram', 'Suresh',
+               'Ananya', 'Diya', 'Priya', 'Lakshmi', 'Meena', 'Kavya', 'Divya', 'Pooja', 'Sneha', 'Revathi']
+LAST_NAMES = ['Kumar', 'Sharma', 'Reddy', 'Iyer', 'Nair', 'Patel', 'Singh', 'Rao', 'Das', 'Menon',
+              'Pillai', 'Gupta', 'Joshi', 'Shetty', 'Naidu', 'Verma', 'Mani', 'Krishnan', 'Bose', 'Yadav']
+
+# Shopping rhythm: share of a day's bills per hour from 08:00 to 21:00, weekday factors Monday first
+HOURS = np.arange(8, 22)
+HOUR_WEIGHTS = np.array([2, 4, 7, 9, 8, 6, 5, 5, 6, 8, 11, 12, 10, 7], dtype=float)
+WEEKDAY_FACTORS = [0.9, 0.85, 0.9, 0.95, 1.05, 1.3, 1.25]
+PAYMENT_MODES = ['cash', 'upi', 'card']
+PAYMENT_WEIGHTS = [0.45, 0.38, 0.17]
+QUANTITIES = np.array([1, 2, 3, 4, 5])
+QUANTITY_WEIGHTS = np.array([0.62, 0.22, 0.09, 0.04, 0.03])
+
+class GeneratorError(Exception):
+    """Raised when synthetic data cannot be generated into the current store"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def zipf_cdf(n, skew):
+    """Cumulative popularity of n ranked items, rank r weighted 1 / r^skew"""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return np.cumsum(weights / weights.sum())
+
+def storage_format(column_type):
+    """Converter to the value SQLAlchemy would store in SQLite for a column type, None when stored as given"""
+    if isinstance(column_type, DateTime):
+        return lambda value: value.isoformat(' ', 'microseconds')
+    if isinstance(column_type, Date):
+        return lambda value: value.isoformat()
+    if isinstance(column_type, Boolean):
+        return int
+    return None
+
+def day_volume(day, start, bills_per_day, growth):
+    """Expected bills on a day: weekly rhythm, a festive-season peak around late October and yearly growth"""
+    season = 1 + 0.25 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 300) / 365)
+    trend = growth ** ((day - start).days / 365)
+    return bills_per_day * WEEKDAY_FACTORS[day.weekday()] * season * trend
+
+class SyntheticStore:
+    """Writes a catalog, customers and years of trading history with core bulk inserts.
+    
+    Everything the request path would derive is written alongside: bill
+    taxes, daily sales aggregates, loyalty ledger and balances, inventory
+    logs with opening stock that reconciles to the final quantities, the
+    bill log, change log entries and the lane's bill sequence. Runs are
+    reproducible for a given seed.
+    """
+    def __init__(self, products, customers, days, bills_per_day, seed=42, end=None, growth=1.15,
+                 items_per_bill=5.0, member_share=0.45, return_rate=0.015, progress=None):
+        self.products = products
+        self.customers = customers
+        self.days = days
+        self.bills_per_day = bills_per_day
+        self.growth = growth
+        self.items_per_bill = items_per_bill
+        self.member_share = member_share
+        self.return_rate = return_rate
+        self.end = end or (datetime.utcnow().date() - timedelta(days=1))
+        self.start = self.end - timedelta(days=days - 1)
+        self.rng = np.random.default_rng(seed)
+        self.ids = random.Random(seed)
+        self.progress = progress or (lambda message: None)
+        self.counts = dict.fromkeys(('products', 'customers', 'bills', 'bill_items', 'transactions', 'returns',
+                                     'inventory_logs', 'bill_events'), 0)
+    
+    def new_id(self):
+        return str(uuid.UUID(int=self.ids.getrandbits(128), version=4))
+    
+    def new_ids(self, count):
+        """Random ids in sorted order, so a bulk load appends to the primary key index instead of splitting pages"""
+        return sorted(self.new_id() for _ in range(count))
+    
+    def _log_changes(self, connection, entity, row_ids):
+        """One version bump for a bulk load, with its change log rows through the fast insert path"""
+        version = bump_version(connection, entity, [])
+        now = datetime.utcnow()
+        self._insert(connection, ChangeLog.__table__, [{
+            'entity': entity,
+            'row_id': row_id,
+            'version': version,
+            'operation': 'upsert',
+            'created_at': now
+        } for row_id in row_ids])
+    
+    def _insert(self, connection, table, rows):
+        """Batched executemany straight to the driver, with values already in SQLite's storage format"""
+        if not rows:
+            return
+        
+        # SQLAlchemy's per-row bind processing costs more than SQLite's own insert at these volumes
+        columns = list(rows[0])
+        statement = str(insert(table).compile(dialect=connection.dialect, column_keys=columns))
+        converters = [storage_format(table.c[column].type) for column in columns]
+        for offset in range(0, len(rows), INSERT_BATCH):
+            batch = rows[offset:offset + INSERT_BATCH]
+            values = []
+            for column, convert in zip(columns, converters):
+                column_values = [row[column] for row in batch]
+                if convert is not None:
+                    # Timestamps repeat across a bill's lines and logs; format each once
+                    converted = {value: convert(value) for value in set(column_values) if value is not None}
+                    column_values = [converted.get(value) for value in column_values]
+                values.append(column_values)
+            connection.exec_driver_sql(statement, list(zip(*values)))
+    
+    def generate(self):
+        if db.session.get(BillSequence, SYNTHETIC_LANE):
+            raise GeneratorError('This store already has synthetic data; generate into a fresh store')
+        
+        connection = db.session.connection()
+        synchronous = connection.exec_driver_sql('PRAGMA synchronous').scalar()
+        cache_size = connection.exec_driver_sql('PRAGMA cache_size').scalar()
+        # Durability per commit is not needed for a fixture, and random UUID keys need the index pages cached
+        connection.exec_driver_sql('PRAGMA synchronous=OFF')
+        connection.exec_driver_sql(f'PRAGMA cache_size=-{CACHE_KIB}')
+        started = time.perf_counter()
+        
+        try:
+            self._write_products(connection)
+            self._write_customers(connection)
+            db.session.commit()
+            
+            self._write_history()
+            
+            connection = db.session.connection()
+            self._write_closing(connection)
+            db.session.commit()
+        finally:
+            connection = db.session.connection()
+            connection.exec_driver_sql(f'PRAGMA synchronous={int(synchronous)}')
+            connection.exec_driver_sql(f'PRAGMA cache_size={int(cache_size)}')
+        
+        return dict(self.counts, start=self.start.isoformat(), end=self.end.isoformat(),
+                    seconds=round(time.perf_counter() - started, 1))
+    
+    def _write_products(self, connection):
+        rng = self.rng
+        shares = np.array([c[1] for c in CATEGORIES])
+        self.product_category = rng.choice(len(CATEGORIES), size=self.products, p=shares / shares.sum())
+        base = np.array([c[2] for c in CATEGORIES])[self.product_category]
+        self.product_price = np.round(base * rng.lognormal(0, 0.6, self.products), 0).clip(5, None)
+        self.product_ids = self.new_ids(self.products)
+        self.final_stock = rng.integers(0, 300, self.products)
+        reorder = rng.choice([5, 10, 20, 30], size=self.products)
+        
+        # Popularity is independent of catalog order: a few SKUs sell most of the volume
+        self.popularity = zipf_cdf(self.products, 0.9)
+        self.rank_to_product = rng.permutation(self.products)
+        
+        taxes = load_tax_table()
+        self.product_rate = [taxes.slab(CATEGORIES[c][0]).rate for c in self.product_category]
+        
+        now = datetime.utcnow()
+        created = datetime.combine(self.start - timedelta(days=1), datetime.min.time())
+        rows = [{
+            'id': self.product_ids[i],
+            'barcode': f'{BARCODE_PREFIX}{i:011d}',
+            'name': f'{BRANDS[i % len(BRANDS)]} {CATEGORIES[self.product_category[i]][0]} {i} {SIZES[i % len(SIZES)]}',
+            'category': CATEGORIES[self.product_category[i]][0],
+            'price': float(self.product_price[i]),
+            'quantity': int(self.final_stock[i]),
+            'reorder_level': int(reorder[i]),
+            'created_at': created,
+            'updated_at': now
+        } for i in range(self.products)]
+        self._insert(connection, Product.__table__, rows)
+        self._log_changes(connection, 'products', self.product_ids)
+        self.sold = np.zeros(self.products, dtype=np.int64)
+        self.counts['products'] = self.products
+        self.progress(f'{self.products} products')
+    
+    def _write_customers(self, connection):
+        self.customer_ids = self.new_ids(self.customers)
+        # Regulars: a small share of members make most of the member visits
+        self.loyalty = zipf_cdf(self.customers, 0.7) if self.customers else None
+        self.customer_points = np.zeros(self.customers, dtype=np.int64)
+        self.customer_spend = np.zeros(self.customers)
+        
+        created = datetime.combine(self.start - timedelta(days=1), datetime.min.time())
+        mobiles = np.sort(self.rng.choice(3000000000, size=self.customers, replace=False)) + 7000000000
+        for offset in range(0, self.customers, INSERT_BATCH):
+            self._insert(connection, Customer.__table__, [{
+                'id': self.customer_ids[i],
+                'mobile': str(mobiles[i]),
+                'name': f'{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}',
+                'email': f'customer{i}@example.com' if i % 3 == 0 else None,
+                'points': 0,
+                'total_purchases': 0,
+                'created_at': created,
+                'updated_at': created
+            } for i in range(offset, min(offset + INSERT_BATCH, self.customers))])
+        if self.customers:
+            self._log_changes(connection, 'customers', self.customer_ids)
+        self.counts['customers'] = self.customers
+        self.progress(f'{self.customers} customers')
+    
+    def _write_history(self):
+        sequence = 0
+        day = self.start
+        while day <= self.end:
+            connection = db.session.connection()
+            sequence = self._write_day(connection, day, sequence)
+            
+            if (day - self.start).days % COMMIT_DAYS == COMMIT_DAYS - 1 or day == self.end:
+                db.session.commit()
+            if day.day == 1 or day == self.end:
+                self.progress(f"{day.isoformat()}: {self.counts['bills']} bills, {self.counts['bill_items']} items")
+            day += timedelta(days=1)
+        
+        self.last_sequence = sequence
+    
+    def _write_day(self, connection, day, sequence):
+        rng = self.rng
+        count = int(rng.poisson(day_volume(day, self.start, self.bills_per_day, self.growth)))
+        if not count:
+            return sequence
+        
+        # Bill times through the day, in order, so bill numbers follow the clock
+        hours = rng.choice(HOURS, size=count, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+        seconds = np.sort(hours * 3600 + rng.integers(0, 3600, count))
+        day_start = datetime.combine(day, datetime.min.time())
+        
+        lines = 1 + rng.poisson(self.items_per_bill - 1, count)
+        picks = self.rank_to_product[np.searchsorted(self.popularity, rng.random(lines.sum()))]
+        quantities = rng.choice(QUANTITIES, size=lines.sum(), p=QUANTITY_WEIGHTS)
+        line_discounts = rng.random(lines.sum()) < 0.05
+        members = rng.random(count) < self.member_share if self.customers else np.zeros(count, dtype=bool)
+        member_picks = np.searchsorted(self.loyalty, rng.random(count)) if self.customers else None
+        payments = rng.choice(len(PAYMENT_MODES), size=count, p=PAYMENT_WEIGHTS)
+        returned = rng.random(count) < self.return_rate
+        
+        bills, items, transactions, logs, taxes, ledger, events, sales = [], [], [], [], [], [], [], []
+        returns, return_items = [], []
+        offset = 0
+        for b in range(count):
+            sequence += 1
+            bill_id = self.new_id()
+            created_at = day_start + timedelta(seconds=int(seconds[b]))
+            customer = int(member_picks[b]) if members[b] else None
+            status = 'returned' if returned[b] else 'completed'
+            
+            bill_lines, slabs = [], {}
+            for k in range(offset, offset + lines[b]):
+                product = int(picks[k])
+                quantity = int(quantities[k])
+                price = float(self.product_price[product])
+                discount = round(price * quantity * 0.1, 2) if line_discounts[k] else 0.0
+                total = price * quantity - discount
+                bill_lines.append((self.new_id(), product, quantity, price, discount, total))
+                rate = self.product_rate[product]
+                slabs[rate] = slabs.get(rate, 0) + total
+            offset += lines[b]
+            
+            subtotal = sum(line[5] for line in bill_lines)
+            tax = sum(amount * rate / 100 for rate, amount in slabs.items())
+            total = subtotal + tax
+            mode = PAYMENT_MODES[payments[b]]
+            
+            bills.append({
+                'id': bill_id,
+                'bill_number': f'BILL-{SYNTHETIC_LANE}-{sequence:07d}',
+                'customer_id': self.customer_ids[customer] if customer is not None else None,
+                'subtotal': subtotal,
+                'discount': 0.0,
+                'tax': tax,
+                'total': total,
+                'payment_mode': mode,
+                'status': status,
+                'created_at': created_at,
+                'updated_at': created_at
+            })
+            transactions.append({'id': self.new_id(), 'bill_id': bill_id, 'payment_mode': mode, 'amount': round(total, 2),
+                                 'reference_number': None, 'status': 'success', 'created_at': created_at})
+            taxes.extend({'bill_id': bill_id, 'day': day, 'rate': rate, 'taxable': amount, 'tax': amount * rate / 100}
+                         for rate, amount in sorted(slabs.items()))
+            
+            for item_id, product, quantity, price, discount, line_total in bill_lines:
+                items.append({'id': item_id, 'bill_id': bill_id, 'product_id': self.product_ids[product],
+                              'quantity': quantity, 'unit_price': price, 'discount': discount, 'total': line_total})
+                logs.append({'id': self.new_id(), 'product_id': self.product_ids[product], 'quantity_change': -quantity,
+                             'reason': 'sale', 'bill_id': bill_id, 'created_at': created_at})
+                self.sold[product] += quantity
+                if status == 'completed':
+                    sales.append((self.product_ids[product], day, quantity, line_total, 0))
+            
+            refunded = 0
+            if status == 'returned':
+                # Brought back whole within a few days; stock goes back on the shelf
+                returned_at = created_at + timedelta(days=int(rng.integers(0, 4)), hours=1)
+                return_id = self.new_id()
+                ratio = total / subtotal if subtotal else 0
+                refunded = round(sum(round(line[5] * ratio, 2) for line in bill_lines), 2)
+                returns.append({'id': return_id, 'bill_id': bill_id, 'exchange_bill_id': None, 'refund_amount': refunded,
+                                'reason': 'Customer return', 'created_at': returned_at})
+                for item_id, product, quantity, price, discount, line_total in bill_lines:
+                    return_items.append({'id': self.new_id(), 'return_id': return_id, 'bill_item_id': item_id,
+                                         'product_id': self.product_ids[product], 'quantity': quantity,
+                                         'amount': round(line_total * ratio, 2)})
+                    logs.append({'id': self.new_id(), 'product_id': self.product_ids[product], 'quantity_change': quantity,
+                                 'reason': 'return', 'bill_id': bill_id, 'created_at': returned_at})
+                    self.sold[product] -= quantity
+            else:
+                # One bill counts once per product toward the daily aggregates
+                for product_id in {self.product_ids[line[1]] for line in bill_lines}:
+                    sales.append((product_id, day, 0, 0.0, 1))
+                if customer is not None:
+                    points = accrued_points(total)
+                    self.customer_points[customer] += points
+                    self.customer_spend[customer] += total
+                    ledger.append({'customer_id': self.customer_ids[customer], 'bill_id': bill_id, 'points': points,
+                                   'amount': total, 'reason': 'accrual', 'applied': True, 'created_at': created_at})
+            
+            events.append((bill_id, 'snapshot', {
+                'bill_number': bills[-1]['bill_number'],
+                'customer_id': bills[-1]['customer_id'],
+                'status': status,
+                'payment_mode': mode,
+                'subtotal': subtotal,
+                'discount': 0.0,
+                'tax': tax,
+                'total': total,
+                'created_at': created_at.isoformat(),
+                'items': [[self.product_ids[p], q, u, d, t] for _, p, q, u, d, t in bill_lines],
+                'paid': round(total, 2),
+                'refunded': refunded,
+                'tenders': 1,
+                'returns': 1 if refunded else 0
+            }))
+        
+        for table, rows in ((Bill.__table__, bills), (BillItem.__table__, items), (Transaction.__table__, transactions),
+                            (BillTax.__table__, taxes), (InventoryLog.__table__, logs), (BillReturn.__table__, returns),
+                            (BillReturnItem.__table__, return_items), (LoyaltyEntry.__table__, ledger)):
+            if rows:
+                self._insert(connection, table, rows)
+        add_daily_sales(connection, sales)
+        append_events(connection, events)
+        
+        self.counts['bills'] += count
+        self.counts['bill_items'] += len(items)
+        self.counts['transactions'] += len(transactions)
+        self.counts['returns'] += len(returns)
+        self.counts['inventory_logs'] += len(logs)
+        self.counts['bill_events'] += len(events)
+        return sequence
+    
+    def _write_closing(self, connection):
+        """Opening stock that the logged sales and returns bring down to each product's quantity, balances and the lane sequence"""
+        opened = datetime.combine(self.start - timedelta(days=1), datetime.min.time())
+        self._insert(connection, InventoryLog.__table__, [{
+            'id': self.new_id(),
+            'product_id': self.product_ids[i],
+            'quantity_change': int(self.final_stock[i] + self.sold[i]),
+            'reason': 'opening',
+            'bill_id': None,
+            'created_at': opened
+        } for i in range(self.products)])
+        self.counts['inventory_logs'] += self.products
+        
+        customers = Customer.__table__
+        members = np.nonzero(self.customer_points)[0] if self.customers else []
+        statement = update(customers).where(customers.c.id == bindparam('customer_id')).values(
+            points=bindparam('new_points'), total_purchases=bindparam('spend')
+        )
+        for offset in range(0, len(members), INSERT_BATCH):
+            connection.execute(statement, [{
+                'customer_id': self.customer_ids[i],
+                'new_points': int(self.customer_points[i]),
+                'spend': float(self.customer_spend[i])
+            } for i in members[offset:offset + INSERT_BATCH]])
+        
+        connection.execute(insert(BillSequence.__table__).values(
+            lane=SYNTHETIC_LANE, high=self.last_sequence, updated_at=datetime.utcnow()
+        ))
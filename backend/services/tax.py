@@ -0,0 +1,103 @@
+from sqlalchemy import select, func, union_all
+from models.database import db, TaxRate, BillTax, Bill, ArchivedBill
+from collections import namedtuple
+
+DEFAULT_TAX_RATE = 5.0  # percent, for categories without a slab
+GST_SLABS = (0, 0.25, 3, 5, 12, 18, 28)
+
+TaxSlab = namedtuple('TaxSlab', 'rate hsn_code')
+
+class TaxError(Exception):
+    """Raised when a tax rate cannot be saved"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class TaxTable:
+    """Category to GST slab lookup, compiled once per tax_rates version"""
+    def __init__(self, slabs=None, default_rate=DEFAULT_TAX_RATE):
+        self.slabs = slabs or {}
+        self.default = TaxSlab(default_rate, None)
+    
+    def slab(self, category):
+        return self.slabs.get(category, self.default)
+
+def load_tax_table():
+    return TaxTable({category: TaxSlab(rate, hsn_code) for category, rate, hsn_code in db.session.execute(
+        select(TaxRate.category, TaxRate.rate, TaxRate.hsn_code)
+    )})
+
+def tax_breakup(slab_totals, taxable_factor):
+    """Per-slab taxable value and tax from line totals summed by rate.
+    
+    Bill level discounts come off every slab in proportion, as
+    taxable_factor = (subtotal - discount) / subtotal.
+    """
+    return [{
+        'rate': rate,
+        'taxable': amount * taxable_factor,
+        'tax': amount * taxable_factor * rate / 100
+    } for rate, amount in sorted(slab_totals.items())]
+
+def return_credits(sold, remaining, lines, taxable_factor, table):
+    """Negative per-slab breakup for returned lines, taxed as the sale was.
+    
+    sold and remaining are {rate: taxable} of the bill's stored breakup,
+    before and after earlier credits. Lines are (category, value), the
+    refunded share of each line total, and taxable_factor is the share of
+    line totals the sale was taxed on. A category whose rate changed since
+    the sale is credited to the bill's largest slab, and no slab is credited
+    more than it still holds.
+    """
+    if not sold:
+        return []
+    
+    largest = max(sold, key=sold.get)
+    by_rate = {}
+    for category, value in lines:
+        rate = table.slab(category).rate
+        rate = rate if rate in sold else largest
+        by_rate[rate] = by_rate.get(rate, 0) + value * taxable_factor
+    
+    return tax_breakup({rate: -min(amount, max(remaining.get(rate, 0), 0)) for rate, amount in by_rate.items()}, 1)
+
+def validate_rate(rate):
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        raise TaxError('rate must be a number')
+    if rate not in GST_SLABS:
+        raise TaxError(f"rate must be one of the GST slabs: {', '.join(f'{s:g}' for s in GST_SLABS)}")
+    return rate
+
+def gst_summary(start_day, end_day):
+    """Taxable value and tax per slab over completed bills, live and archived, from the stored breakups"""
+    completed = union_all(
+        select(Bill.id).where(Bill.status == 'completed'),
+        select(ArchivedBill.bill_id).where(ArchivedBill.status == 'completed')
+    )
+    
+    query = select(
+        BillTax.rate,
+        func.sum(BillTax.taxable),
+        func.sum(BillTax.tax),
+        func.count(func.distinct(BillTax.bill_id))
+    ).where(BillTax.day <= end_day, BillTax.bill_id.in_(completed)).group_by(BillTax.rate).order_by(BillTax.rate)
+    if start_day:
+        query = query.where(BillTax.day >= start_day)
+    
+    slabs = [{
+        'rate': rate,
+        'taxable': round(taxable, 2),
+        'cgst': round(tax / 2, 2),
+        'sgst': round(tax / 2, 2),
+        'tax': round(tax, 2),
+        'bills': bills
+    } for rate, taxable, tax, bills in db.session.execute(query)]
+    
+    return {
+        'slabs': slabs,
+        'taxable': round(sum(s['taxable'] for s in slabs), 2),
+        'tax': round(sum(s['tax'] for s in slabs), 2)
+    }
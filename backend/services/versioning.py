@@ -0,0 +1,143 @@
+from flask import request, Response
+from sqlalchemy import event, select, update, insert, inspect
+from sqlalchemy.orm import Session
+from models.database import db, EntityVersion, ChangeLog
+from datetime import datetime, timezone
+import hashlib
+import uuid
+
+# Tables whose rows are versioned for conditional GET and delta sync
+TRACKED_ENTITIES = ('products', 'customers', 'coupons', 'offers', 'tax_rates')
+
+# Columns every sale moves; they are read live, so checkout does not bump the catalog version
+UNVERSIONED_COLUMNS = {'products': {'quantity', 'updated_at'}}
+
+def _tracked_table(obj):
+    table = getattr(obj, '__tablename__', None)
+    return table if table in TRACKED_ENTITIES else None
+
+@event.listens_for(Session, 'before_flush')
+def _assign_ids(session, flush_context, instances):
+    """Give new tracked rows their id up front so the change log can reference them"""
+    for obj in session.new:
+        if _tracked_table(obj) and obj.id is None:
+            obj.id = str(uuid.uuid4())
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    """Bump entity versions and write change log rows in the flushing transaction"""
+    changes = {}
+    
+    for obj in session.new:
+        if _tracked_table(obj):
+            changes.setdefault(_tracked_table(obj), []).append((obj.id, 'upsert'))
+    
+    for obj in session.dirty:
+        if _tracked_table(obj) and _versioned_change(obj):
+            changes.setdefault(_tracked_table(obj), []).append((obj.id, 'upsert'))
+    
+    for obj in session.deleted:
+        if _tracked_table(obj):
+            changes.setdefault(_tracked_table(obj), []).append((obj.id, 'delete'))
+    
+    if changes:
+        connection = session.connection()
+        for entity, rows in changes.items():
+            bump_version(connection, entity, rows)
+
+def _versioned_change(obj):
+    """Whether a dirty row changed any column other than its unversioned ones"""
+    state = inspect(obj)
+    skip = UNVERSIONED_COLUMNS.get(_tracked_table(obj), ())
+    return any(state.attrs[column.key].history.has_changes()
+               for column in state.mapper.column_attrs if column.key not in skip)
+
+def bump_version(connection, entity, rows):
+    """Increment the version counter of an entity and log the changed row ids"""
+    versions = EntityVersion.__table__
+    now = datetime.utcnow()
+    
+    result = connection.execute(
+        update(versions)
+        .where(versions.c.entity == entity)
+        .values(version=versions.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(versions).values(entity=entity, version=1, updated_at=now))
+    
+    version = connection.execute(
+        select(versions.c.version).where(versions.c.entity == entity)
+    ).scalar()
+    
+    if rows:
+        connection.execute(insert(ChangeLog.__table__), [{
+            'entity': entity,
+            'row_id': row_id,
+            'version': version,
+            'operation': operation,
+            'created_at': now
+        } for row_id, operation in rows])
+    
+    return version
+
+def get_versions(*entities):
+    """Get (version, updated_at) for each entity, (0, None) if never written"""
+    rows = db.session.execute(
+        select(EntityVersion.entity, EntityVersion.version, EntityVersion.updated_at)
+        .where(EntityVersion.entity.in_(entities))
+    ).all()
+    found = {r.entity: (r.version, r.updated_at) for r in rows}
+    
+    return {e: found.get(e, (0, None)) for e in entities}
+
+def get_changes_since(entity, since):
+    """Get (changed_ids, deleted_ids) for an entity after the given version"""
+    rows = db.session.execute(
+        select(ChangeLog.row_id, ChangeLog.operation)
+        .where(ChangeLog.entity == entity, ChangeLog.version > since)
+        .order_by(ChangeLog.version, ChangeLog.id)
+    ).all()
+    
+    # Later operations on the same row win
+    latest = {}
+    for row_id, operation in rows:
+        latest[row_id] = operation
+    
+    changed = [row_id for row_id, op in latest.items() if op != 'delete']
+    deleted = [row_id for row_id, op in latest.items() if op == 'delete']
+    
+    return changed, deleted
+
+def conditional_get(entities, build_response, valid_until=None):
+    """Serve a GET with ETag/Last-Modified, returning 304 without building the body when unchanged.
+    
+    valid_until is when a body filtered by the clock next changes, such as
+    an offer starting or ending; it is part of the ETag, since no version
+    moves at that moment.
+    """
+    versions = get_versions(*entities)
+    
+    tag_source = request.full_path + '|' + ','.join(f'{e}:{versions[e][0]}' for e in entities)
+    if valid_until:
+        tag_source += f'|until:{valid_until.isoformat()}'
+    etag = hashlib.sha1(tag_source.encode()).hexdigest()
+    
+    timestamps = [ts for _, ts in versions.values() if ts]
+    last_modified = max(timestamps).replace(tzinfo=timezone.utc, microsecond=0) if timestamps else None
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+    
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = build_response({e: v for e, (v, _) in versions.items()})
+    
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    
+    return response
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+
+# One scratch data directory for the session, with a second store to replicate into
+os.environ['SUPERMART_DATA_DIR'] = tempfile.mkdtemp(prefix='supermart-tests-')
+os.environ['SUPERMART_STORES'] = 'north'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app
+from models.database import db
+
+@pytest.fixture(scope='session')
+def app():
+    client = flask_app.test_client()
+    for store in flask_app.config['STORES']:
+        assert client.post('/api/init-db', headers={'X-Store-Id': store}).status_code in (200, 201)
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_product(client):
+    """Create a product with a fresh barcode; tests share the database, so each makes its own rows"""
+    def make(store='main', **fields):
+        payload = {'barcode': uuid.uuid4().hex[:12], 'name': 'Test product', 'category': 'Grocery',
+                   'price': 100, 'quantity': 50, **fields}
+        response = client.post('/api/products/', json=payload, headers={'X-Store-Id': store})
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['data']
+    return make
+
+@pytest.fixture
+def make_bill(client):
+    def make(items, store='main', **fields):
+        payload = {'items': items, 'payment_mode': 'cash', **fields}
+        response = client.post('/api/bills/', json=payload, headers={'X-Store-Id': store})
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['data']
+    return make
+
+@pytest.fixture
+def db_session(app):
+    with app.app_context():
+        yield db.session
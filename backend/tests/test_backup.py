@@ -0,0 +1,71 @@
+from services.backup import create_backup, verify_backup, database_path, backup_metrics, BackupError, _backup_locks
+from services.stores import use_store
+import pytest
+import sqlite3
+import threading
+import time
+
+def test_backup_completes_while_lanes_write(app, db_session, tmp_path):
+    path = database_path()
+    setup = sqlite3.connect(path)
+    # Several MB, so a stepped copy would need many steps for writes to land between
+    setup.execute('CREATE TABLE IF NOT EXISTS backup_filler (id INTEGER PRIMARY KEY, body BLOB)')
+    setup.executemany('INSERT INTO backup_filler (body) VALUES (?)', [(b'x' * 4000,) for _ in range(2000)])
+    setup.execute('CREATE TABLE IF NOT EXISTS backup_writes (id INTEGER PRIMARY KEY, at REAL)')
+    setup.commit()
+    setup.close()
+    
+    stop = threading.Event()
+    writes = []
+    
+    def write():
+        connection = sqlite3.connect(path, timeout=5)
+        while not stop.is_set():
+            connection.execute('INSERT INTO backup_writes (at) VALUES (?)', (time.time(),))
+            connection.commit()
+            writes.append(time.perf_counter())
+            time.sleep(0.001)
+        connection.close()
+    
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        result = {}
+        
+        def back_up():
+            with app.app_context():
+                result.update(create_backup(str(tmp_path)))
+        
+        backup = threading.Thread(target=back_up, daemon=True)
+        started = time.perf_counter()
+        backup.start()
+        backup.join(timeout=30)
+        finished = time.perf_counter()
+        assert not backup.is_alive(), 'backup never finished under concurrent writes'
+    finally:
+        stop.set()
+        writer.join()
+    
+    assert any(started <= at <= finished for at in writes), 'writer was blocked for the whole backup'
+    report = verify_backup(str(tmp_path), result['name'])
+    assert report['ok'], report
+
+def test_backup_of_one_store_does_not_block_another(app, tmp_path):
+    # A backup of main is in progress
+    main_lock = _backup_locks.for_store('main')
+    main_lock.acquire()
+    backup_metrics.backup_started('main')
+    try:
+        with use_store('north', app):
+            assert not backup_metrics.running
+            manifest = create_backup(str(tmp_path / 'north'))
+            assert verify_backup(str(tmp_path / 'north'), manifest['name'])['ok']
+        
+        with use_store('main', app):
+            assert backup_metrics.running
+            with pytest.raises(BackupError) as error:
+                create_backup(str(tmp_path / 'main'))
+            assert error.value.status == 409
+    finally:
+        backup_metrics.backup_finished('main')
+        main_lock.release()
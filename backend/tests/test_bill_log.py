@@ -0,0 +1,74 @@
+from datetime import datetime
+from models.database import Bill, BillEvent
+from sqlalchemy import text, update
+
+def verify(client):
+    response = client.post('/api/admin/bill-log/verify')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+def audit_today(client):
+    response = client.get(f'/api/admin/bill-log/audit/{datetime.utcnow().date().isoformat()}')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+def test_chain_verifies_and_finds_a_rewritten_event(client, db_session, make_product, make_bill):
+    product = make_product()
+    bill = make_bill([{'product_id': product['id'], 'quantity': 1}])
+    result = verify(client)
+    assert result['ok'] and result['broken_at'] is None
+    assert result['events'] == client.get('/api/admin/bill-log').get_json()['data']['events']
+    
+    event = db_session.query(BillEvent).filter_by(bill_id=bill['bill_id'], event='created').one()
+    seq, payload = event.seq, event.payload
+    # The log is append-only; lift the trigger for the length of the test, as a hand edit of the file could
+    trigger = db_session.execute(
+        text("SELECT sql FROM sqlite_master WHERE name = 'bill_events_no_update'")
+    ).scalar()
+    db_session.execute(text('DROP TRIGGER bill_events_no_update'))
+    try:
+        forged = payload.replace('"total"', '"total_"')
+        db_session.execute(update(BillEvent).where(BillEvent.seq == seq).values(payload=forged))
+        db_session.commit()
+        
+        result = verify(client)
+        assert not result['ok']
+        assert result['broken_at'] == seq
+    finally:
+        db_session.execute(update(BillEvent).where(BillEvent.seq == seq).values(payload=payload))
+        db_session.execute(text(trigger))
+        db_session.commit()
+    
+    assert verify(client)['ok']
+
+def test_log_refuses_updates(db_session, make_product, make_bill):
+    product = make_product()
+    bill = make_bill([{'product_id': product['id'], 'quantity': 1}])
+    
+    try:
+        db_session.execute(update(BillEvent).where(BillEvent.bill_id == bill['bill_id']).values(event='forged'))
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        assert 'append-only' in str(e)
+    else:
+        raise AssertionError('bill_events accepted an update')
+
+def test_audit_matches_the_log_until_a_bill_is_edited_behind_it(client, db_session, make_product, make_bill):
+    product = make_product(price=40)
+    bill = make_bill([{'product_id': product['id'], 'quantity': 2}])
+    client.post(f"/api/bills/{bill['bill_id']}/return", json={'items': [{'product_id': product['id'], 'quantity': 1}]})
+    
+    result = audit_today(client)
+    assert bill['bill_id'] not in [m['bill_id'] for m in result['mismatches']]
+    assert bill['bill_id'] not in result['unlogged']
+    
+    # A write that skips the ORM leaves no event
+    db_session.execute(update(Bill).where(Bill.id == bill['bill_id']).values(total=1))
+    db_session.commit()
+    
+    mismatch = next(m for m in audit_today(client)['mismatches'] if m['bill_id'] == bill['bill_id'])
+    assert mismatch['differences'] == {'total': {'log': bill['total'], 'bill': 1}}
+
+def test_audit_rejects_a_bad_date(client):
+    assert client.get('/api/admin/bill-log/audit/yesterday').status_code == 400
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+import time
+
+def snapshot_offer_ids(response):
+    data = response.get_json()['data']
+    return {offer[0] for offer in data['offers']}
+
+def test_snapshot_etag_changes_when_an_offer_starts(client, make_product):
+    product = make_product()
+    starts = datetime.utcnow() + timedelta(seconds=1)
+    offer = client.post('/api/discounts/offers', json={
+        'name': 'Starts soon', 'offer_type': 'percentage', 'discount_value': 10, 'product_id': product['id'],
+        'valid_from': starts.isoformat(), 'valid_till': (starts + timedelta(days=1)).isoformat()
+    }).get_json()['data']
+    
+    before = client.get('/api/catalog/snapshot')
+    assert offer['id'] not in snapshot_offer_ids(before)
+    
+    # Nothing is written when the offer starts, yet the lane must not be told 304
+    time.sleep(max((starts - datetime.utcnow()).total_seconds(), 0) + 0.1)
+    after = client.get('/api/catalog/snapshot', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert offer['id'] in snapshot_offer_ids(after)
+
+def test_snapshot_unchanged_is_not_modified(client):
+    first = client.get('/api/catalog/snapshot')
+    again = client.get('/api/catalog/snapshot', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+def test_snapshot_carries_tax_slabs_and_changes_with_them(client):
+    first = client.get('/api/catalog/snapshot')
+    assert first.get_json()['data']['default_tax_rate'] == 5
+    
+    assert client.put('/api/taxes/Test Footwear', json={'rate': 12}).status_code == 200
+    after = client.get('/api/catalog/snapshot', headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['data']['tax_rates']['Test Footwear'] == 12
@@ -0,0 +1,26 @@
+from services.columnar import ColumnarStore
+from datetime import datetime, timedelta
+import uuid
+
+def test_closed_day_is_exported_again_after_a_return(client, db_session, make_product, tmp_path):
+    product = make_product()
+    day = (datetime.utcnow() - timedelta(days=10)).date()
+    sold_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=12)
+    [result] = client.post('/api/bills/bulk', json={'bills': [{
+        'client_id': str(uuid.uuid4()), 'items': [{'product_id': product['id'], 'quantity': 1}],
+        'payment_mode': 'cash', 'created_at': sold_at.isoformat()
+    }]}).get_json()['data']
+    
+    store = ColumnarStore(str(tmp_path))
+    store.export_pending()
+    before = store.report(day, day)['bills']
+    assert before >= 1
+    
+    assert client.post(f"/api/bills/{result['bill_id']}/return", json={}).status_code == 200
+    
+    exported = store.export_pending()
+    assert day.isoformat() in [d['day'] for d in exported]
+    assert store.report(day, day)['bills'] == before - 1
+    
+    # Nothing changed since, so the day is not written a third time
+    assert day.isoformat() not in [d['day'] for d in store.export_pending()]
@@ -0,0 +1,54 @@
+from services.events import EventBus
+import queue
+
+def drain(subscription):
+    entries = []
+    while True:
+        try:
+            entries.append(subscription.get(timeout=0))
+        except queue.Empty:
+            return entries
+
+def test_reconnect_within_history_replays_missed_events():
+    bus = EventBus(history_size=10, max_queue=10)
+    for n in range(5):
+        bus.publish('bill', {'n': n}, store='main')
+    
+    subscription = bus.subscribe(['bill'], last_event_id=3)
+    assert [e['data']['n'] for e in drain(subscription)] == [3, 4]
+    assert not subscription.overflowed
+
+def test_reconnect_after_history_rolled_over_resyncs():
+    bus = EventBus(history_size=3, max_queue=10)
+    for n in range(6):
+        bus.publish('bill', {'n': n}, store='main')
+    
+    assert bus.subscribe(['bill'], last_event_id=1).overflowed
+
+def test_reconnect_after_restart_resyncs():
+    # The client last saw id 40 from the previous process; this one has only issued 1 and 2
+    bus = EventBus()
+    bus.publish('stock', {}, store='main')
+    bus.publish('stock', {}, store='main')
+    
+    assert bus.subscribe(['stock'], last_event_id=40).overflowed
+    assert EventBus().subscribe(['stock'], last_event_id=40).overflowed
+
+def test_missed_events_beyond_queue_resync():
+    bus = EventBus(history_size=100, max_queue=5)
+    for n in range(20):
+        bus.publish('bill', {'n': n}, store='main')
+    
+    subscription = bus.subscribe(['bill'], last_event_id=1)
+    assert subscription.overflowed
+    assert len(drain(subscription)) == 5
+
+def test_stream_sends_resync_to_a_client_from_before_a_restart(client):
+    response = client.get('/api/events/stream?topics=bill', headers={'Last-Event-ID': '999999999'})
+    try:
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry:')
+        # Sent before waiting on the queue; without it the next chunk would be a keepalive
+        assert next(chunks).startswith(b'event: resync')
+    finally:
+        response.close()
@@ -0,0 +1,46 @@
+import pytest
+from services.held_carts import held_carts
+
+@pytest.mark.parametrize('items', [
+    None,
+    [],
+    [{'quantity': 1}],
+    [{'product_id': 1}],
+    [{'product_id': 1, 'quantity': 'two'}],
+    [{'product_id': 1, 'quantity': -1}],
+    [{'product_id': 1, 'quantity': 1, 'discount': 'none'}],
+    ['not an item']
+])
+def test_park_rejects_malformed_items(client, items):
+    response = client.post('/api/bills/held', json={'items': items})
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+def test_park_holds_a_valid_basket(client, make_product):
+    product = make_product()
+    response = client.post('/api/bills/held', json={'items': [{'product_id': product['id'], 'quantity': '2'}]})
+    assert response.status_code == 201
+    assert response.get_json()['data']['total'] == product['price'] * 2
+
+@pytest.mark.parametrize('ttl', ['soon', -5, 0])
+def test_park_rejects_bad_ttl(client, make_product, ttl):
+    product = make_product()
+    response = client.post('/api/bills/held', json={'items': [{'product_id': product['id'], 'quantity': 1}], 'ttl_minutes': ttl})
+    assert response.status_code == 400
+
+def test_failed_finalize_keeps_the_basket(client, make_product, monkeypatch):
+    product = make_product()
+    cart = client.post('/api/bills/held', json={'items': [{'product_id': product['id'], 'quantity': 1}]}).get_json()['data']
+    
+    def fail(connection, cart_id):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(held_carts.for_store(), 'delete_row', fail)
+    
+    assert client.post(f"/api/bills/held/{cart['id']}/finalize", json={}).status_code == 500
+    
+    assert client.get(f"/api/bills/held/{cart['id']}").status_code == 200
+
+def test_legacy_hold_routes_are_gone(client, make_product, make_bill):
+    bill = make_bill([{'product_id': make_product()['id'], 'quantity': 1}])
+    assert client.post(f"/api/bills/{bill['bill_id']}/hold").status_code in (404, 405)
+    assert client.post(f"/api/bills/{bill['bill_id']}/resume").status_code in (404, 405)
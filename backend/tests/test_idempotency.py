@@ -0,0 +1,44 @@
+import uuid
+
+def post_bill(client, product, key, lane='L7'):
+    return client.post('/api/bills/', json={'items': [{'product_id': product['id'], 'quantity': 2}], 'payment_mode': 'cash'},
+                       headers={'Idempotency-Key': key, 'X-Lane-Id': lane})
+
+def stock(client, product):
+    return client.get(f"/api/products/barcode/{product['barcode']}").get_json()['data']['quantity']
+
+def test_retry_with_same_key_replays_the_bill(client, make_product):
+    product = make_product(quantity=10)
+    key = str(uuid.uuid4())
+    
+    first = post_bill(client, product, key)
+    again = post_bill(client, product, key)
+    
+    assert first.status_code == again.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert again.get_json()['data'] == first.get_json()['data']
+    assert stock(client, product) == 8
+
+def test_new_key_makes_a_new_bill_numbered_on_the_lane(client, make_product):
+    product = make_product(quantity=10)
+    
+    first = post_bill(client, product, str(uuid.uuid4())).get_json()['data']
+    second = post_bill(client, product, str(uuid.uuid4())).get_json()['data']
+    
+    assert first['bill_id'] != second['bill_id']
+    assert first['bill_number'].startswith('BILL-L7-')
+    assert int(second['bill_number'].rsplit('-', 1)[1]) > int(first['bill_number'].rsplit('-', 1)[1])
+    assert stock(client, product) == 6
+
+def test_offline_bill_resent_is_reported_duplicate(client, make_product):
+    product = make_product(quantity=10)
+    bill = {'client_id': str(uuid.uuid4()), 'items': [{'product_id': product['id'], 'quantity': 1}], 'payment_mode': 'cash'}
+    
+    first = client.post('/api/bills/bulk', json={'bills': [bill]}).get_json()['data'][0]
+    again = client.post('/api/bills/bulk', json={'bills': [bill]}).get_json()['data'][0]
+    
+    assert first['status'] == 'created'
+    assert again['status'] == 'duplicate'
+    assert again['bill_id'] == first['bill_id']
+    assert stock(client, product) == 9
@@ -0,0 +1,32 @@
+from models.database import db, Product
+from services.inventory import reconcile_stock, take_snapshot
+from sqlalchemy import update
+import uuid
+
+def drift_of(result, product_id):
+    return next((m['drift'] for m in result['mismatches'] if m['product_id'] == product_id), 0)
+
+def test_product_with_opening_entry_is_checked_before_any_snapshot(db_session, make_product, make_bill):
+    product = make_product(quantity=20)
+    make_bill([{'product_id': product['id'], 'quantity': 3}])
+    assert drift_of(reconcile_stock(), product['id']) == 0
+    
+    # A change that bypassed the ledger
+    db_session.execute(update(Product).where(Product.id == product['id']).values(quantity=Product.quantity + 5))
+    db_session.commit()
+    
+    result = reconcile_stock()
+    assert drift_of(result, product['id']) == 5
+    assert product['id'] not in result['unanchored']
+
+def test_product_without_ledger_history_is_unanchored_until_snapshot(db_session):
+    product = Product(barcode=uuid.uuid4().hex[:12], name='Pre-ledger stock', category='Grocery', price=10, quantity=7)
+    db_session.add(product)
+    db_session.commit()
+    
+    result = reconcile_stock()
+    assert product.id in result['unanchored']
+    assert drift_of(result, product.id) == 0
+    
+    take_snapshot()
+    assert product.id not in reconcile_stock()['unanchored']
@@ -0,0 +1,56 @@
+from models.database import Customer, LoyaltyEntry
+from services.loyalty import reconcile_balances
+import pytest
+import uuid
+
+@pytest.fixture
+def make_customer(client):
+    def make(points=0):
+        response = client.post('/api/customers/', json={'mobile': uuid.uuid4().hex[:10], 'name': 'Test customer'})
+        customer = response.get_json()['data']
+        if points:
+            client.post(f"/api/customers/{customer['id']}/add-points", json={'points': points})
+        return customer
+    return make
+
+def balance(client, customer):
+    return client.get(f"/api/customers/{customer['id']}").get_json()['data']['points']
+
+def sell(client, product, customer, redeem_points):
+    return client.post('/api/bills/', json={'items': [{'product_id': product['id'], 'quantity': 1}], 'payment_mode': 'cash',
+                                            'customer_id': customer['id'], 'redeem_points': redeem_points})
+
+def test_over_redemption_deducts_only_the_points_used(client, make_product, make_customer):
+    product = make_product(price=100)
+    customer = make_customer(points=5000)
+    
+    response = sell(client, product, customer, 5000)
+    assert response.status_code == 201
+    assert response.get_json()['data']['discount'] == 100
+    
+    # ₹100 is 1000 points; the other 4000 stay with the customer
+    assert balance(client, customer) == 4000
+
+def test_redemption_beyond_balance_is_refused(client, make_product, make_customer):
+    product = make_product(price=100, quantity=5)
+    customer = make_customer(points=300)
+    
+    response = sell(client, product, customer, 500)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Insufficient points'
+    assert balance(client, customer) == 300
+    assert client.get(f"/api/products/barcode/{product['barcode']}").get_json()['data']['quantity'] == 5
+
+def test_reconciliation_folds_the_ledger_into_balances(client, db_session, make_product, make_customer):
+    product = make_product(price=1000)
+    customer = make_customer(points=50)
+    assert sell(client, product, customer, 20).status_code == 201
+    expected = balance(client, customer)
+    
+    reconcile_balances()
+    
+    row = db_session.get(Customer, customer['id'])
+    db_session.refresh(row)
+    assert row.points == expected
+    assert balance(client, customer) == expected
+    assert not db_session.query(LoyaltyEntry).filter_by(customer_id=customer['id'], applied=False).count()
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import uuid
+
+def ingest(client, *bills):
+    response = client.post('/api/bills/bulk', json={'bills': list(bills)})
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+def offline_bill(product, **fields):
+    return {'client_id': str(uuid.uuid4()), 'items': [{'product_id': product['id'], 'quantity': 1}],
+            'payment_mode': 'cash', **fields}
+
+def test_online_bill_ignores_client_number_and_time(client, make_product, make_bill):
+    product = make_product()
+    bill = make_bill([{'product_id': product['id'], 'quantity': 1}],
+                     bill_number='CHOSEN-1', created_at='2020-01-01T10:00:00')
+    
+    details = client.get(f"/api/bills/{bill['bill_id']}").get_json()['data']
+    assert details['bill_number'] != 'CHOSEN-1'
+    assert details['created_at'] > '2020-01-02'
+
+def test_offline_bill_keeps_lane_number_and_time(client, make_product):
+    product = make_product()
+    sold_at = (datetime.utcnow() - timedelta(hours=3)).replace(microsecond=0)
+    number = f'OFF-{uuid.uuid4().hex[:10].upper()}'
+    
+    [result] = ingest(client, offline_bill(product, bill_number=number, created_at=sold_at.isoformat()))
+    assert result['status'] == 'created'
+    
+    details = client.get(f"/api/bills/{result['bill_id']}").get_json()['data']
+    assert details['bill_number'] == number
+    assert details['created_at'] == sold_at.isoformat()
+
+def test_offline_bill_with_bad_time_is_rejected_alone(client, make_product):
+    product = make_product()
+    future = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    
+    results = ingest(client, offline_bill(product, created_at='yesterday'), offline_bill(product, created_at=future),
+                     offline_bill(product))
+    assert [r['status'] for r in results] == ['error', 'error', 'created']
+    assert 'created_at' in results[0]['error']
+
+def test_offline_bill_number_reused_is_an_error_not_a_crash(client, make_product):
+    product = make_product()
+    number = f'OFF-{uuid.uuid4().hex[:10].upper()}'
+    
+    results = ingest(client, offline_bill(product, bill_number=number), offline_bill(product, bill_number=number))
+    assert [r['status'] for r in results] == ['created', 'error']
@@ -0,0 +1,71 @@
+from models.database import Transaction, create_missing_indexes
+from sqlalchemy import text
+import uuid
+
+def pay(client, bill, *tenders):
+    return client.post(f"/api/bills/{bill['bill_id']}/payment", json={'tenders': list(tenders)})
+
+def test_tender_retried_with_its_reference_is_replayed(client, make_product, make_bill):
+    bill = make_bill([{'product_id': make_product(price=100)['id'], 'quantity': 1}])
+    reference = f'UPI-{uuid.uuid4().hex[:12]}'
+    tender = {'payment_mode': 'upi', 'amount': 40, 'reference_number': reference}
+    
+    first = pay(client, bill, tender).get_json()['data']
+    again = pay(client, bill, tender).get_json()['data']
+    
+    assert first['paid'] == again['paid'] == 40
+    assert [t['replayed'] for t in again['transactions']] == [True]
+
+def test_reference_of_another_bill_is_a_conflict(client, make_product, make_bill):
+    product = make_product(price=100)
+    first, second = (make_bill([{'product_id': product['id'], 'quantity': 1}]) for _ in range(2))
+    tender = {'payment_mode': 'card', 'amount': 10, 'reference_number': f'CARD-{uuid.uuid4().hex[:12]}'}
+    
+    assert pay(client, first, tender).status_code == 200
+    assert pay(client, second, tender).status_code == 409
+
+def test_over_tender_is_change_for_cash_only(client, make_product, make_bill):
+    bill = make_bill([{'product_id': make_product(price=100)['id'], 'quantity': 1}])
+    total = bill['total']
+    
+    response = pay(client, bill, {'payment_mode': 'card', 'amount': total + 50})
+    assert response.status_code == 400
+    
+    data = pay(client, bill, {'payment_mode': 'card', 'amount': 20}, {'payment_mode': 'cash', 'amount': total}).get_json()['data']
+    assert data['paid'] == round(total, 2)
+    assert data['change'] == 20
+    assert data['payment_mode'] == 'split'
+
+def test_malformed_tenders_are_rejected(client, make_product, make_bill):
+    bill = make_bill([{'product_id': make_product()['id'], 'quantity': 1}])
+    
+    assert pay(client, bill, {'payment_mode': 'cash', 'amount': 'ten'}).status_code == 400
+    assert pay(client, bill, {'payment_mode': 'cash', 'amount': None}).status_code == 400
+    assert client.post(f"/api/bills/{bill['bill_id']}/payment", json={'tenders': 'cash'}).status_code == 400
+
+def test_returned_bill_takes_no_payment(client, make_product, make_bill):
+    bill = make_bill([{'product_id': make_product()['id'], 'quantity': 1}])
+    assert client.post(f"/api/bills/{bill['bill_id']}/return", json={}).status_code == 200
+    
+    assert pay(client, bill, {'payment_mode': 'cash', 'amount': 10}).status_code == 409
+
+def test_reference_index_migration_keeps_duplicates(db_session, make_product, make_bill):
+    product = make_product()
+    bills = [make_bill([{'product_id': product['id'], 'quantity': 1}])['bill_id'] for _ in range(2)]
+    reference = f'OLD-{uuid.uuid4().hex[:8]}'
+    
+    # A database from before the unique index, with a reference used twice and a blank one
+    db_session.execute(text('DROP INDEX ix_transactions_reference'))
+    rows = [Transaction(bill_id=bill_id, payment_mode='upi', amount=1, reference_number=reference) for bill_id in bills]
+    rows.append(Transaction(bill_id=bills[0], payment_mode='cash', amount=1, reference_number=''))
+    db_session.add_all(rows)
+    db_session.commit()
+    
+    create_missing_indexes()
+    
+    db_session.expire_all()
+    references = [db_session.get(Transaction, row.id).reference_number for row in rows]
+    assert references[0] == reference
+    assert references[1] == f'{reference}#{rows[1].id}'
+    assert references[2] is None
+    assert 'ix_transactions_reference' in {r[1] for r in db_session.execute(text("PRAGMA index_list('transactions')"))}
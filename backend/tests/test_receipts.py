@@ -0,0 +1,26 @@
+from models.database import Bill
+from sqlalchemy import update
+
+def receipt_text(client, bill_id):
+    response = client.get(f'/api/bills/{bill_id}/receipt?format=text')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+def test_unpaid_bill_receipt_shows_amount_due(client, db_session, make_product, make_bill):
+    product = make_product(price=40)
+    bill = make_bill([{'product_id': product['id'], 'quantity': 2}])
+    # Bills held as bill rows before held baskets existed
+    db_session.execute(update(Bill).where(Bill.id == bill['bill_id']).values(status='hold'))
+    db_session.commit()
+    
+    text = receipt_text(client, bill['bill_id'])
+    assert 'Amount due' in text
+    assert 'Paid' not in text
+
+def test_completed_bill_receipt_shows_payment(client, make_product, make_bill):
+    product = make_product(price=40)
+    bill = make_bill([{'product_id': product['id'], 'quantity': 2}])
+    
+    text = receipt_text(client, bill['bill_id'])
+    assert 'Paid CASH' in text
+    assert 'Amount due' not in text
@@ -0,0 +1,73 @@
+from models.database import db, Product, ReplicationCursor
+from services.replication import pull_catalog
+from services.stores import use_store
+
+SOURCE = 'store:main'
+
+def pull(app):
+    with use_store('north', app):
+        return pull_catalog(SOURCE)
+
+def sell_on_north(client, make_bill, product_id, quantity):
+    # Stock stays local to each node; receive some before selling
+    client.post(f'/api/products/{product_id}/adjust-stock', json={'quantity_change': quantity, 'reason': 'purchase'},
+                headers={'X-Store-Id': 'north'})
+    make_bill([{'product_id': product_id, 'quantity': quantity}], store='north')
+
+def north_product(app, product_id):
+    with use_store('north', app):
+        product = db.session.get(Product, product_id)
+        return product and (product.barcode, product.name)
+
+def test_delete_of_sold_product_retires_it(app, client, make_product, make_bill):
+    product = make_product()
+    pull(app)
+    sell_on_north(client, make_bill, product['id'], 2)
+    
+    assert client.delete(f"/api/products/{product['id']}").status_code == 200
+    result = pull(app)
+    
+    assert result['applied']['products'] == 1
+    assert north_product(app, product['id']) == (f"retired:{product['id']}", product['name'])
+    
+    # The cursor moved on: a later change still replicates
+    other = make_product()
+    pull(app)
+    assert north_product(app, other['id']) == (other['barcode'], other['name'])
+
+def test_retired_barcode_can_be_reused(app, client, make_product, make_bill):
+    product = make_product()
+    pull(app)
+    sell_on_north(client, make_bill, product['id'], 1)
+    
+    client.delete(f"/api/products/{product['id']}")
+    replacement = make_product(barcode=product['barcode'], name='Replacement')
+    pull(app)
+    
+    assert north_product(app, replacement['id']) == (product['barcode'], 'Replacement')
+
+def test_delete_of_unsold_product_removes_it(app, client, make_product):
+    product = make_product()
+    pull(app)
+    
+    client.delete(f"/api/products/{product['id']}")
+    pull(app)
+    
+    assert north_product(app, product['id']) is None
+
+def test_reset_drops_rows_deleted_since_the_last_pull(app, client, make_product, make_bill):
+    kept, sold, unsold = make_product(), make_product(), make_product()
+    pull(app)
+    sell_on_north(client, make_bill, sold['id'], 1)
+    
+    client.delete(f"/api/products/{sold['id']}")
+    client.delete(f"/api/products/{unsold['id']}")
+    # The source was rebuilt: north's cursor is past its log, so the next pull is a full reset
+    with use_store('north', app):
+        db.session.get(ReplicationCursor, SOURCE).cursor = 10 ** 9
+        db.session.commit()
+    pull(app)
+    
+    assert north_product(app, kept['id']) == (kept['barcode'], kept['name'])
+    assert north_product(app, sold['id']) == (f"retired:{sold['id']}", sold['name'])
+    assert north_product(app, unsold['id']) is None
@@ -0,0 +1,40 @@
+from models.database import Product
+from services.slow_queries import slow_query_log
+from sqlalchemy import create_engine, text
+import pytest
+import uuid
+
+@pytest.fixture
+def log_everything():
+    threshold = slow_query_log.threshold_ms
+    slow_query_log.reset(threshold_ms=0)
+    yield slow_query_log
+    slow_query_log.reset(threshold_ms=threshold)
+
+def entry_for(log, marker):
+    return next((q for q in log.report(limit=500)['queries'] if marker in q['statement']), None)
+
+def test_table_scan_is_explained_outside_the_callers_transaction(db_session, log_everything):
+    product = Product(barcode=uuid.uuid4().hex[:12], name='Uncommitted', category='Grocery', price=10, quantity=1)
+    db_session.add(product)
+    db_session.flush()
+    
+    # products.category has no index, so SQLite scans the table
+    rows = db_session.execute(text("SELECT id FROM products WHERE category = :category /* scan-probe */"),
+                              {'category': 'Grocery'}).scalars().all()
+    assert product.id in rows
+    
+    entry = entry_for(log_everything, 'scan-probe')
+    assert entry['table_scan'] is True
+    assert any(step['detail'].startswith('SCAN products') for step in entry['plan'])
+    
+    # The caller's transaction is still open and still its own to roll back
+    assert db_session().in_transaction()
+    db_session.rollback()
+    assert db_session.get(Product, product.id) is None
+
+def test_other_engines_are_not_timed(app, log_everything):
+    engine = create_engine('sqlite://')
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1 /* foreign-probe */'))
+    assert entry_for(log_everything, 'foreign-probe') is None
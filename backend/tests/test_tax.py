@@ -0,0 +1,34 @@
+from datetime import date
+
+def gst_slab(client, rate):
+    today = date.today().isoformat()
+    report = client.get(f'/api/reports/gst?start={today}&end={today}').get_json()['data']
+    return next((s for s in report['slabs'] if s['rate'] == rate), None)
+
+def test_partial_return_credits_its_gst(client, make_product, make_bill):
+    assert client.put('/api/taxes/Test Luxury', json={'rate': 28}).status_code == 200
+    product = make_product(category='Test Luxury', price=100)
+    bill = make_bill([{'product_id': product['id'], 'quantity': 3}])
+    assert gst_slab(client, 28)['taxable'] == 300
+    assert gst_slab(client, 28)['tax'] == 84
+    
+    response = client.post(f"/api/bills/{bill['bill_id']}/return", json={'items': [{'product_id': product['id'], 'quantity': 1}]})
+    assert response.get_json()['data']['status'] == 'completed'
+    
+    slab = gst_slab(client, 28)
+    assert slab['taxable'] == 200
+    assert slab['tax'] == 56
+    
+    details = client.get(f"/api/bills/{bill['bill_id']}").get_json()['data']
+    assert details['taxes'] == [{'rate': 28, 'taxable': 300, 'tax': 84}]
+    assert details['tax_credits'] == [{'rate': 28, 'taxable': -100, 'tax': -28, 'day': date.today().isoformat()}]
+
+def test_full_return_after_partial_drops_the_bill(client, make_product, make_bill):
+    assert client.put('/api/taxes/Test Jewellery', json={'rate': 3}).status_code == 200
+    product = make_product(category='Test Jewellery', price=1000)
+    bill = make_bill([{'product_id': product['id'], 'quantity': 2}])
+    
+    client.post(f"/api/bills/{bill['bill_id']}/return", json={'items': [{'product_id': product['id'], 'quantity': 1}]})
+    client.post(f"/api/bills/{bill['bill_id']}/return", json={})
+    
+    assert gst_slab(client, 3) is None
@@ -0,0 +1,44 @@
+from models.database import ChangeLog
+from sqlalchemy import func
+
+def products_etag(client):
+    response = client.get('/api/products/?per_page=1')
+    assert response.status_code == 200
+    return response.headers['ETag'], response.get_json()['version']
+
+def change_log_rows(db_session, product_id):
+    return db_session.query(func.count(ChangeLog.id)).filter(ChangeLog.row_id == product_id).scalar()
+
+def test_sale_leaves_catalog_version_alone(client, db_session, make_product, make_bill):
+    product = make_product(quantity=10)
+    etag, version = products_etag(client)
+    logged = change_log_rows(db_session, product['id'])
+    
+    make_bill([{'product_id': product['id'], 'quantity': 2}])
+    
+    response = client.get('/api/products/?per_page=1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert change_log_rows(db_session, product['id']) == logged
+
+def test_price_change_bumps_version_and_delta(client, make_product):
+    product = make_product(price=10)
+    etag, version = products_etag(client)
+    
+    assert client.put(f"/api/products/{product['id']}", json={'price': 12}).status_code == 200
+    
+    response = client.get('/api/products/?per_page=1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['version'] > version
+    
+    delta = client.get(f'/api/products/?since={version}').get_json()
+    assert [p['id'] for p in delta['data']] == [product['id']]
+    assert delta['data'][0]['price'] == 12
+
+def test_delete_is_sent_as_a_tombstone(client, make_product):
+    product = make_product(quantity=0)
+    _, version = products_etag(client)
+    
+    assert client.delete(f"/api/products/{product['id']}").status_code == 200
+    
+    delta = client.get(f'/api/products/?since={version}').get_json()
+    assert delta['deleted'] == [product['id']]
@@ -1,5 +1,6 @@
 // Configuration
 const API_BASE_URL = 'http://localhost:5000/api';
+const LANE_ID = localStorage.getItem('laneId') || 'L1';
 
 // State Management
 let currentBill = {
@@ -8,6 +9,7 @@ let currentBill = {
     customerName: 'Walk-in Customer',
     paymentMode: 'cash',
     discount: 0,
+    couponDiscount: 0,
     couponCode: null
 };
 
@@ -15,20 +17,43 @@ let allProducts = [];
 let allCustomers = [];
 let allCoupons = [];
 let allOffers = [];
+let taxRates = {};
+let defaultTaxRate = 5;
 let heldBills = [];
+let productsVersion = null;
+let productsByBarcode = new Map();
+let dashboardStats = null;
+let lowStockProducts = new Map();
+
+// Server-sent events keep reports current without polling
+let eventSource = null;
+let liveUpdates = false;
+let reportsLoaded = false;
+
+// Offline lane storage (IndexedDB)
+const LANE_DB_NAME = 'supermart-lane';
+let laneDbPromise = null;
+
+// Conditional GET cache: url -> { etag, data }
+const responseCache = new Map();
 
 // Initialize App
 document.addEventListener('DOMContentLoaded', function() {
     updateClock();
     setInterval(updateClock, 1000);
     
-    // Load initial data
-    loadProducts();
+    // Load initial data: local catalog first so scanning works without the server
+    loadLocalCatalog().then(refreshCatalog);
     loadCustomers();
     loadCoupons();
-    loadOffers();
     loadDashboardStats();
     initializeDatabase();
+    connectEventStream();
+    
+    // Push bills sold while offline
+    syncOutbox();
+    setInterval(syncOutbox, 30000);
+    window.addEventListener('online', syncOutbox);
 });
 
 // Clock Update
@@ -65,9 +90,10 @@ function showTab(tabName) {
         loadAllCoupons();
         loadAllOffers();
     } else if (tabName === 'reports') {
-        loadDashboardStats();
-        loadHeldBills();
-        loadLowStockProducts();
+        // With live updates the loaded reports are already current
+        if (!liveUpdates || !reportsLoaded) {
+            loadReports();
+        }
     }
 }
 
@@ -121,7 +147,7 @@ function filterByCategory(category) {
 function handleBarcodeInput(event) {
     if (event.key === 'Enter') {
         const barcode = event.target.value;
-        const product = allProducts.find(p => p.barcode === barcode);
+        const product = productsByBarcode.get(barcode);
         
         if (product) {
             addProductToBill(product.id, product.name, product.price, product.quantity);
@@ -207,16 +233,58 @@ function removeItemFromBill(index) {
 }
 
 // Update Bill Summary
+let quoteSequence = 0;
+
 function updateBillSummary() {
+    // Local estimate first; the server quote (offers, coupon) replaces it when it arrives
     let subtotal = 0;
     currentBill.items.forEach(item => {
         subtotal += (item.unit_price * item.quantity) - item.discount;
     });
     
-    let discount = currentBill.discount;
-    let tax = (subtotal - discount) * 0.05;
-    let total = subtotal - discount + tax;
+    let discount = currentBill.discount + (currentBill.couponDiscount || 0);
+    let tax = estimateTax(currentBill.items, subtotal, discount);
+    renderBillSummary(subtotal, discount, tax, subtotal - discount + tax);
+    
+    if (currentBill.items.length === 0 || !navigator.onLine) {
+        return;
+    }
+    
+    const sequence = ++quoteSequence;
+    fetch(`${API_BASE_URL}/bills/quote`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            items: currentBill.items,
+            discount: currentBill.discount,
+            coupon_code: currentBill.couponCode
+        })
+    })
+        .then(res => res.json())
+        .then(data => {
+            // Ignore quotes for a cart that has changed since
+            if (data.success && sequence === quoteSequence) {
+                renderBillSummary(data.data.subtotal, data.data.discount, data.data.tax, data.data.total);
+            }
+        })
+        .catch(err => console.error(err));
+}
+
+// Tax per GST slab from the catalog snapshot, with the bill discount off every slab in proportion
+function estimateTax(items, subtotal, discount) {
+    if (subtotal <= 0) {
+        return 0;
+    }
     
+    const taxableFactor = Math.max(subtotal - discount, 0) / subtotal;
+    return items.reduce((tax, item) => {
+        const product = allProducts.find(p => p.id === item.product_id);
+        const rate = product && product.category in taxRates ? taxRates[product.category] : defaultTaxRate;
+        return tax + (item.unit_price * item.quantity - item.discount) * taxableFactor * rate / 100;
+    }, 0);
+}
+
+function renderBillSummary(subtotal, discount, tax, total) {
     document.getElementById('subtotal').textContent = '₹' + subtotal.toFixed(2);
     document.getElementById('tax').textContent = '₹' + tax.toFixed(2);
     document.getElementById('total').textContent = '₹' + total.toFixed(2);
@@ -272,7 +340,8 @@ function applyCoupon() {
         .then(res => res.json())
         .then(data => {
             if (data.success) {
-                currentBill.discount = data.data.discount_amount;
+                // The server applies the coupon itself; the amount is only the offline estimate
+                currentBill.couponDiscount = data.data.discount_amount;
                 currentBill.couponCode = couponCode;
                 updateBillSummary();
                 showToast(`Coupon applied! Discount: ₹${data.data.discount_amount.toFixed(2)}`, 'success');
@@ -313,6 +382,7 @@ function completeBill() {
     }
     
     const billData = {
+        client_id: newClientId(),
         customer_id: currentBill.customerId,
         items: currentBill.items,
         discount: currentBill.discount,
@@ -320,9 +390,14 @@ function completeBill() {
         payment_mode: currentBill.paymentMode
     };
     
+    // Retries of the same bill reuse its client_id, so the server never bills twice
     fetch(`${API_BASE_URL}/bills/`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': billData.client_id,
+            'X-Lane-Id': LANE_ID
+        },
         body: JSON.stringify(billData)
     })
         .then(res => res.json())
@@ -336,8 +411,9 @@ function completeBill() {
             }
         })
         .catch(err => {
-            showToast('Error creating bill', 'error');
+            // Backend unreachable: finish the sale locally and sync it later
             console.error(err);
+            completeBillOffline(billData);
         });
 }
 
@@ -361,9 +437,10 @@ function printBill(billData) {
             <hr>
             <p>Subtotal: ₹${billData.subtotal.toFixed(2)}</p>
             <p>Discount: ₹${billData.discount.toFixed(2)}</p>
-            <p>Tax: ₹${billData.tax.toFixed(2)}</p>
+            <p>Tax: ₹${billData.tax.toFixed(2)}${billData.provisional ? ' (provisional)' : ''}</p>
             <h3>Total: ₹${billData.total.toFixed(2)}</h3>
             <p>Payment Mode: ${currentBill.paymentMode.toUpperCase()}</p>
+            ${billData.provisional ? '<p>Offline bill: offers, coupons and tax are settled when it syncs</p>' : ''}
             <hr>
             <p>Thank you for shopping!</p>
         </div>
@@ -392,7 +469,7 @@ function holdBill() {
     
     fetch(`${API_BASE_URL}/bills/`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Lane-Id': LANE_ID },
         body: JSON.stringify(billData)
     })
         .then(res => res.json())
@@ -410,6 +487,42 @@ function holdBill() {
         });
 }
 
+// Resume a parked basket into the current bill
+function resumeHeldBill(holdId) {
+    if (currentBill.items.length > 0) {
+        showToast('Complete or clear the current bill first', 'warning');
+        return;
+    }
+    
+    fetch(`${API_BASE_URL}/bills/held/${holdId}/resume`, {
+        method: 'POST',
+        headers: { 'X-Lane-Id': LANE_ID }
+    })
+        .then(res => res.json())
+        .then(data => {
+            if (!data.success) {
+                showToast(data.error, 'error');
+                return;
+            }
+            
+            const cart = data.data;
+            currentBill.items = cart.items;
+            currentBill.customerId = cart.customer_id;
+            currentBill.discount = cart.discount || 0;
+            currentBill.couponCode = cart.coupon_code;
+            
+            heldBills = heldBills.filter(b => b.id !== holdId);
+            displayHeldBills(heldBills);
+            document.querySelector(`.nav-btn[onclick="showTab('billing')"]`).click();
+            updateBillDisplay();
+            showToast('Bill resumed', 'success');
+        })
+        .catch(err => {
+            showToast('Error resuming bill', 'error');
+            console.error(err);
+        });
+}
+
 // Clear Bill
 function clearBill() {
     currentBill = {
@@ -418,6 +531,7 @@ function clearBill() {
         customerName: 'Walk-in Customer',
         paymentMode: 'cash',
         discount: 0,
+        couponDiscount: 0,
         couponCode: null
     };
     
@@ -472,8 +586,7 @@ function saveCustomer(event) {
 }
 
 function loadCustomers() {
-    fetch(`${API_BASE_URL}/customers/`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/customers/`)
         .then(data => {
             if (data.success) {
                 allCustomers = data.data;
@@ -483,8 +596,7 @@ function loadCustomers() {
 }
 
 function loadAllCustomers() {
-    fetch(`${API_BASE_URL}/customers/`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/customers/`)
         .then(data => {
             if (data.success) {
                 displayCustomers(data.data);
@@ -577,26 +689,31 @@ function saveProduct(event) {
         });
 }
 
+// Full load once, then only rows changed since the last seen catalog version
 function loadProducts() {
-    fetch(`${API_BASE_URL}/products/`)
-        .then(res => res.json())
+    const url = productsVersion === null
+        ? `${API_BASE_URL}/products/`
+        : `${API_BASE_URL}/products/?since=${productsVersion}`;
+    
+    return fetchCached(url)
         .then(data => {
-            if (data.success) {
-                allProducts = data.data;
+            if (!data.success) {
+                return;
+            }
+            
+            if (productsVersion === null) {
+                setProducts(data.data);
+            } else {
+                const stale = new Set(data.deleted.concat(data.data.map(p => p.id)));
+                setProducts(allProducts.filter(p => !stale.has(p.id)).concat(data.data));
             }
+            productsVersion = data.version;
         })
         .catch(err => console.error(err));
 }
 
 function loadAllProducts() {
-    fetch(`${API_BASE_URL}/products/`)
-        .then(res => res.json())
-        .then(data => {
-            if (data.success) {
-                displayProducts(data.data);
-            }
-        })
-        .catch(err => console.error(err));
+    loadProducts().then(() => displayProducts(allProducts));
 }
 
 function displayProducts(products) {
@@ -644,8 +761,7 @@ function searchProductsTab() {
 // ==================== DISCOUNT FUNCTIONS ====================
 
 function loadCoupons() {
-    fetch(`${API_BASE_URL}/discounts/coupons`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/discounts/coupons`)
         .then(data => {
             if (data.success) {
                 allCoupons = data.data;
@@ -655,8 +771,7 @@ function loadCoupons() {
 }
 
 function loadOffers() {
-    fetch(`${API_BASE_URL}/discounts/offers`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/discounts/offers`)
         .then(data => {
             if (data.success) {
                 allOffers = data.data;
@@ -709,8 +824,7 @@ function saveCoupon(event) {
 }
 
 function loadAllCoupons() {
-    fetch(`${API_BASE_URL}/discounts/coupons`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/discounts/coupons`)
         .then(data => {
             if (data.success) {
                 displayCoupons(data.data);
@@ -787,8 +901,7 @@ function saveOffer(event) {
 }
 
 function loadAllOffers() {
-    fetch(`${API_BASE_URL}/discounts/offers`)
-        .then(res => res.json())
+    fetchCached(`${API_BASE_URL}/discounts/offers`)
         .then(data => {
             if (data.success) {
                 displayOffers(data.data);
@@ -826,28 +939,40 @@ function displayOffers(offers) {
 
 // ==================== REPORTS FUNCTIONS ====================
 
+function loadReports() {
+    loadDashboardStats();
+    loadHeldBills();
+    loadLowStockProducts();
+    reportsLoaded = true;
+}
+
 function loadDashboardStats() {
     fetch(`${API_BASE_URL}/dashboard/stats`)
         .then(res => res.json())
         .then(data => {
             if (data.success) {
-                const stats = data.data;
-                document.getElementById('today-sales').textContent = '₹' + stats.today.sales.toFixed(2);
-                document.getElementById('today-count').textContent = stats.today.transactions;
-                document.getElementById('avg-bill').textContent = '₹' + stats.today.average_bill.toFixed(2);
-                document.getElementById('total-customers').textContent = stats.total_customers;
-                document.getElementById('total-products').textContent = stats.total_products;
+                dashboardStats = data.data;
+                displayDashboardStats(dashboardStats);
             }
         })
         .catch(err => console.error(err));
 }
 
+function displayDashboardStats(stats) {
+    document.getElementById('today-sales').textContent = '₹' + stats.today.sales.toFixed(2);
+    document.getElementById('today-count').textContent = stats.today.transactions;
+    document.getElementById('avg-bill').textContent = '₹' + stats.today.average_bill.toFixed(2);
+    document.getElementById('total-customers').textContent = stats.total_customers;
+    document.getElementById('total-products').textContent = stats.total_products;
+}
+
 function loadHeldBills() {
     fetch(`${API_BASE_URL}/bills/hold-list`)
         .then(res => res.json())
         .then(data => {
             if (data.success) {
-                displayHeldBills(data.data);
+                heldBills = data.data;
+                displayHeldBills(heldBills);
             }
         })
         .catch(err => console.error(err));
@@ -865,12 +990,12 @@ function displayHeldBills(bills) {
         const date = new Date(bill.created_at);
         return `
             <tr>
-                <td>${bill.bill_number}</td>
+                <td>${bill.bill_number || bill.lane}</td>
                 <td>${bill.customer_id ? 'Customer' : 'Walk-in'}</td>
                 <td>₹${bill.total.toFixed(2)}</td>
                 <td>${date.toLocaleDateString()}</td>
                 <td>
-                    <button class="btn btn-primary" style="padding: 6px 10px; font-size: 12px;">Resume</button>
+                    <button class="btn btn-primary" style="padding: 6px 10px; font-size: 12px;" onclick="resumeHeldBill('${bill.id}')">Resume</button>
                 </td>
             </tr>
         `;
@@ -882,7 +1007,8 @@ function loadLowStockProducts() {
         .then(res => res.json())
         .then(data => {
             if (data.success) {
-                displayLowStock(data.data);
+                lowStockProducts = new Map(data.data.map(p => [p.id, p]));
+                displayLowStock(Array.from(lowStockProducts.values()));
             }
         })
         .catch(err => console.error(err));
@@ -906,6 +1032,104 @@ function displayLowStock(products) {
     `).join('');
 }
 
+// ==================== LIVE UPDATES ====================
+
+function connectEventStream() {
+    if (!window.EventSource) {
+        return;
+    }
+    
+    // EventSource reconnects by itself and resumes from the last event id
+    eventSource = new EventSource(`${API_BASE_URL}/events/stream`);
+    eventSource.onopen = () => { liveUpdates = true; };
+    eventSource.onerror = () => { liveUpdates = false; };
+    
+    eventSource.addEventListener('bill', e => applyBillEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('stock', e => applyStockEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('offer', e => applyOfferEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('low_stock', e => {
+        const alert = JSON.parse(e.data);
+        if (alert.crossed === 'below') {
+            showToast(`Low stock: ${alert.name} (${alert.quantity} left)`, 'warning');
+        }
+    });
+    eventSource.addEventListener('resync', () => {
+        reportsLoaded = false;
+        refreshCatalog();
+        if (document.getElementById('reports-tab').classList.contains('active')) {
+            loadReports();
+        }
+    });
+}
+
+function applyBillEvent(bill) {
+    const today = new Date().toISOString().slice(0, 10);
+    
+    if (dashboardStats && bill.created_at.slice(0, 10) === today) {
+        let count = 0;
+        if (bill.status === 'completed' && (bill.action === 'created' || bill.previous_status !== 'completed')) {
+            count = 1;
+        } else if (bill.action === 'status' && bill.previous_status === 'completed') {
+            count = -1;
+        }
+        
+        const stats = dashboardStats.today;
+        stats.sales += count * bill.total;
+        stats.transactions += count;
+        stats.average_bill = stats.transactions > 0 ? stats.sales / stats.transactions : 0;
+        displayDashboardStats(dashboardStats);
+    }
+    
+    heldBills = heldBills.filter(b => b.id !== bill.id);
+    if (bill.status === 'hold') {
+        heldBills.push({
+            id: bill.id,
+            bill_number: bill.bill_number,
+            customer_id: bill.customer_id,
+            total: bill.total,
+            created_at: bill.created_at
+        });
+    }
+    if (reportsLoaded) {
+        displayHeldBills(heldBills);
+    }
+}
+
+function applyStockEvent(stock) {
+    const product = allProducts.find(p => p.id === stock.product_id);
+    
+    if (stock.deleted) {
+        setProducts(allProducts.filter(p => p.id !== stock.product_id));
+        lowStockProducts.delete(stock.product_id);
+    } else {
+        if (product) {
+            product.quantity = stock.quantity;
+        }
+        
+        if (stock.low) {
+            lowStockProducts.set(stock.product_id, {
+                id: stock.product_id,
+                name: stock.name,
+                quantity: stock.quantity,
+                reorder_level: stock.reorder_level
+            });
+        } else {
+            lowStockProducts.delete(stock.product_id);
+        }
+    }
+    
+    if (reportsLoaded) {
+        displayLowStock(Array.from(lowStockProducts.values()));
+    }
+}
+
+function applyOfferEvent(offer) {
+    allOffers = allOffers.filter(o => o.id !== offer.id);
+    if (offer.action !== 'delete' && offer.active) {
+        allOffers.push(offer);
+    }
+}
+
 // ==================== RETURN DIALOG ====================
 
 function showReturnDialog() {
@@ -921,6 +1145,149 @@ function searchBillsForReturn() {
     // Search bills implementation
 }
 
+// ==================== OFFLINE LANE ====================
+
+function laneDb() {
+    if (!laneDbPromise) {
+        laneDbPromise = new Promise((resolve, reject) => {
+            const request = indexedDB.open(LANE_DB_NAME, 1);
+            
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                db.createObjectStore('meta', { keyPath: 'key' });
+                db.createObjectStore('outbox', { keyPath: 'client_id' });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+    
+    return laneDbPromise;
+}
+
+// Run fn against one object store and resolve with its request result
+function laneStore(storeName, mode, fn) {
+    return laneDb().then(db => new Promise((resolve, reject) => {
+        const tx = db.transaction(storeName, mode);
+        const request = fn(tx.objectStore(storeName));
+        
+        tx.oncomplete = () => resolve(request ? request.result : undefined);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+function newClientId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+}
+
+function setProducts(products) {
+    allProducts = products;
+    productsByBarcode = new Map(products.map(p => [p.barcode, p]));
+}
+
+function rowsToObjects(fields, rows) {
+    return rows.map(row => Object.fromEntries(fields.map((field, i) => [field, row[i]])));
+}
+
+function applyCatalogSnapshot(snapshot) {
+    setProducts(rowsToObjects(snapshot.product_fields, snapshot.products));
+    allOffers = rowsToObjects(snapshot.offer_fields, snapshot.offers);
+    taxRates = snapshot.tax_rates || {};
+    defaultTaxRate = 'default_tax_rate' in snapshot ? snapshot.default_tax_rate : 5;
+    productsVersion = snapshot.version.products;
+}
+
+function loadLocalCatalog() {
+    return laneStore('meta', 'readonly', store => store.get('catalog'))
+        .then(record => {
+            if (record && allProducts.length === 0) {
+                applyCatalogSnapshot(record.snapshot);
+            }
+        })
+        .catch(err => console.error(err));
+}
+
+function refreshCatalog() {
+    return fetchCached(`${API_BASE_URL}/catalog/snapshot`)
+        .then(data => {
+            if (data.success) {
+                applyCatalogSnapshot(data.data);
+                return laneStore('meta', 'readwrite', store => store.put({ key: 'catalog', snapshot: data.data }));
+            }
+        })
+        .catch(err => console.error(err));
+}
+
+function completeBillOffline(billData) {
+    let subtotal = 0;
+    billData.items.forEach(item => {
+        subtotal += (item.unit_price * item.quantity) - item.discount;
+    });
+    const tax = estimateTax(billData.items, subtotal, billData.discount);
+    
+    billData.bill_number = 'OFF-' + billData.client_id.slice(0, 13).toUpperCase();
+    billData.created_at = new Date().toISOString().replace('Z', '');
+    
+    laneStore('outbox', 'readwrite', store => store.put(billData))
+        .then(() => {
+            // Keep local stock roughly right until the next snapshot
+            billData.items.forEach(item => {
+                const product = allProducts.find(p => p.id === item.product_id);
+                if (product) {
+                    product.quantity -= item.quantity;
+                }
+            });
+            
+            showToast('Offline: bill saved and will sync later', 'warning');
+            printBill({
+                bill_number: billData.bill_number,
+                subtotal: subtotal,
+                discount: billData.discount,
+                tax: tax,
+                total: subtotal - billData.discount + tax,
+                provisional: true
+            });
+            clearBill();
+        })
+        .catch(err => {
+            showToast('Error saving offline bill', 'error');
+            console.error(err);
+        });
+}
+
+function syncOutbox() {
+    return laneStore('outbox', 'readonly', store => store.getAll())
+        .then(bills => {
+            if (!bills || bills.length === 0) {
+                return;
+            }
+            
+            return fetch(`${API_BASE_URL}/bills/bulk`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ bills: bills })
+            })
+                .then(res => res.json())
+                .then(data => {
+                    if (!data.success) {
+                        return;
+                    }
+                    
+                    // Created and duplicate bills are on the server; errors stay queued
+                    const synced = data.data.filter(r => r.status !== 'error').map(r => r.client_id);
+                    data.data.filter(r => r.status === 'error').forEach(r => console.error('Sync failed', r));
+                    
+                    return laneStore('outbox', 'readwrite', store => {
+                        synced.forEach(id => store.delete(id));
+                    });
+                });
+        })
+        .catch(err => console.error(err));
+}
+
 // ==================== SETTINGS ====================
 
 function initializeDatabase() {
@@ -930,10 +1297,9 @@ function initializeDatabase() {
         .then(res => res.json())
         .then(data => {
             if (data.success) {
-                loadProducts();
+                refreshCatalog();
                 loadCustomers();
                 loadCoupons();
-                loadOffers();
             }
         })
         .catch(err => console.error(err));
@@ -946,6 +1312,27 @@ function saveSettings() {
 
 // ==================== UTILITY FUNCTIONS ====================
 
+// GET with If-None-Match; a 304 is answered from the local copy
+function fetchCached(url) {
+    const cached = responseCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    
+    return fetch(url, { headers })
+        .then(res => {
+            if (res.status === 304 && cached) {
+                return cached.data;
+            }
+            
+            return res.json().then(data => {
+                const etag = res.headers.get('ETag');
+                if (etag && data.success) {
+                    responseCache.set(url, { etag, data });
+                }
+                return data;
+            });
+        });
+}
+
 function showToast(message, type = 'success') {
     const toast = document.getElementById('toast');
     toast.textContent = message;